@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Tienda.settings')
+# Bajo ASGI el ORM de cada request corre en un hilo nuevo: una conexión persistente
+# quedaría abierta en un hilo que ya no existe
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
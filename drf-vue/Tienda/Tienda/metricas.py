@@ -0,0 +1,318 @@
+"""
+Métricas por request: cantidad y tiempo de SQL, tiempo de serialización y de
+render, y latencia total.
+
+  - Header Server-Timing en cada respuesta (db, serializer, app, render y total, en ms),
+    visible en la pestaña de red del navegador
+  - /metrics en formato de texto de Prometheus, acumulado por vista y método
+  - Presupuesto de consultas por vista (METRICAS['PRESUPUESTO_CONSULTAS'],
+    por nombre de ruta, p. ej. 'products-list' o 'POST cart-list'):
+    al pasarse se loguea un warning, o se levanta PresupuestoExcedido con
+    METRICAS['ESTRICTO'] (así corren los tests)
+
+Las consultas se cuentan con connection.execute_wrapper(), sin depender de
+DEBUG ni guardar el SQL. Las respuestas en streaming (products/export) se miden
+hasta que empiezan a enviarse. "serializer" es el serializer.data de las vistas
+que usan SerializacionMedidaMixin (o medir_serializacion), sin el SQL que dispare;
+"render" es el JSON/HTML de la respuesta y "app" el resto (total menos lo anterior).
+Los acumulados viven en la memoria del proceso: con varios workers cada uno
+expone los suyos y Prometheus los distingue por instancia.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Límites (en segundos) del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIN_RUTA = 'sin_ruta'
+VISTA_METRICAS = 'metrics'
+
+
+def configuracion():
+    return getattr(settings, 'METRICAS', {})
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+# -----------------------------
+# Medición de un request
+# -----------------------------
+class Medicion:
+    """execute_wrapper que cuenta y cronometra las consultas del request"""
+    __slots__ = ('consultas', 'sql', 'serializer', 'render', 'serializando')
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.serializer = 0.0
+        self.render = 0.0
+        self.serializando = False
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+@contextmanager
+def medir_serializacion(request):
+    """Suma el tiempo del bloque (menos su SQL) al serializer del request; anidado se cuenta una vez"""
+    medicion = getattr(request, '_medicion', None)
+    if medicion is None or medicion.serializando:
+        yield
+        return
+    medicion.serializando = True
+    sql = medicion.sql
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.serializer += max(time.perf_counter() - inicio - (medicion.sql - sql), 0)
+        medicion.serializando = False
+
+
+def server_timing(medicion, total):
+    app = max(total - medicion.sql - medicion.serializer - medicion.render, 0)
+    return ', '.join([
+        f'db;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas"',
+        f'serializer;dur={medicion.serializer * 1000:.1f}',
+        f'app;dur={app * 1000:.1f}',
+        f'render;dur={medicion.render * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+# -----------------------------
+# Acumulados del proceso
+# -----------------------------
+class Serie:
+    __slots__ = ('cantidad', 'latencia', 'buckets', 'consultas', 'sql', 'serializer', 'render', 'excedidos')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.latencia = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.consultas = 0
+        self.sql = 0.0
+        self.serializer = 0.0
+        self.render = 0.0
+        self.excedidos = 0
+
+
+class Registro:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self.lock:
+            self.respuestas = defaultdict(int)
+            self.series = defaultdict(Serie)
+
+    def registrar(self, vista, metodo, estado, medicion, total, excedido):
+        with self.lock:
+            self.respuestas[vista, metodo, estado] += 1
+            serie = self.series[vista, metodo]
+            serie.cantidad += 1
+            serie.latencia += total
+            for i, limite in enumerate(BUCKETS):
+                if total <= limite:
+                    serie.buckets[i] += 1
+                    break
+            serie.consultas += medicion.consultas
+            serie.sql += medicion.sql
+            serie.serializer += medicion.serializer
+            serie.render += medicion.render
+            serie.excedidos += excedido
+
+    def prometheus(self):
+        """Texto en el formato de exposición de Prometheus (version 0.0.4)"""
+        with self.lock:
+            respuestas = sorted(self.respuestas.items())
+            series = sorted(
+                (clave, (serie.cantidad, serie.latencia, list(serie.buckets), serie.consultas,
+                         serie.sql, serie.serializer, serie.render, serie.excedidos))
+                for clave, serie in self.series.items()
+            )
+
+        lineas = [
+            '# HELP tienda_http_requests_total Requests atendidos por vista, método y estado',
+            '# TYPE tienda_http_requests_total counter',
+        ]
+        for (vista, metodo, estado), cantidad in respuestas:
+            lineas.append(f'tienda_http_requests_total{_etiquetas(view=vista, method=metodo, status=estado)} {cantidad}')
+
+        lineas += [
+            '# HELP tienda_http_request_duration_seconds Latencia total del request',
+            '# TYPE tienda_http_request_duration_seconds histogram',
+        ]
+        for (vista, metodo), (cantidad, latencia, buckets, *_) in series:
+            acumulado = 0
+            for limite, cantidad_bucket in zip(BUCKETS, buckets):
+                acumulado += cantidad_bucket
+                lineas.append(
+                    f'tienda_http_request_duration_seconds_bucket{_etiquetas(view=vista, method=metodo, le=limite)} {acumulado}'
+                )
+            etiquetas = _etiquetas(view=vista, method=metodo)
+            lineas += [
+                f'tienda_http_request_duration_seconds_bucket{_etiquetas(view=vista, method=metodo, le="+Inf")} {cantidad}',
+                f'tienda_http_request_duration_seconds_sum{etiquetas} {latencia:.6f}',
+                f'tienda_http_request_duration_seconds_count{etiquetas} {cantidad}',
+            ]
+
+        for nombre, indice, tipo, ayuda in (
+            ('tienda_db_queries_total', 3, 'counter', 'Consultas SQL ejecutadas'),
+            ('tienda_db_query_duration_seconds_total', 4, 'counter', 'Tiempo en consultas SQL'),
+            ('tienda_serializer_duration_seconds_total', 5, 'counter', 'Tiempo de serializer.data (sin SQL)'),
+            ('tienda_render_duration_seconds_total', 6, 'counter', 'Tiempo de render de la respuesta'),
+            ('tienda_query_budget_exceeded_total', 7, 'counter', 'Requests que superaron el presupuesto de consultas'),
+        ):
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+            for (vista, metodo), valores in series:
+                valor = valores[indice]
+                valor = f'{valor:.6f}' if isinstance(valor, float) else valor
+                lineas.append(f'{nombre}{_etiquetas(view=vista, method=metodo)} {valor}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiquetas(**etiquetas):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nombre}="{escapar(valor)}"' for nombre, valor in etiquetas.items()) + '}'
+
+
+registro = Registro()
+
+
+# -----------------------------
+# Presupuesto de consultas
+# -----------------------------
+def presupuesto(vista, metodo):
+    """Límite de 'MÉTODO vista', si no el de 'vista', si no PRESUPUESTO_POR_DEFECTO (None: sin límite)"""
+    config = configuracion()
+    presupuestos = config.get('PRESUPUESTO_CONSULTAS', {})
+    return presupuestos.get(f'{metodo} {vista}', presupuestos.get(vista, config.get('PRESUPUESTO_POR_DEFECTO')))
+
+
+def controlar_presupuesto(vista, request, medicion):
+    """True si el request se pasó del presupuesto de su vista"""
+    limite = presupuesto(vista, request.method)
+    if limite is None or medicion.consultas <= limite:
+        return False
+    mensaje = (
+        f'{request.method} {request.get_full_path()} ({vista}): '
+        f'{medicion.consultas} consultas, presupuesto {limite}'
+    )
+    if configuracion().get('ESTRICTO'):
+        raise PresupuestoExcedido(mensaje)
+    logger.warning('Presupuesto de consultas excedido: %s', mensaje)
+    return True
+
+
+# -----------------------------
+# Middleware y vista
+# -----------------------------
+def instalar_medicion(wrappers, medicion):
+    for conexion in connections.all():
+        wrappers.enter_context(conexion.execute_wrapper(medicion))
+
+
+class MetricasMiddleware:
+    """
+    Va primero en MIDDLEWARE para medir también al resto de los middlewares.
+    Es sync y async: bajo ASGI no obliga a correr la cadena en un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = request._medicion = Medicion()
+        inicio = time.perf_counter()
+        with ExitStack() as wrappers:
+            instalar_medicion(wrappers, medicion)
+            response = self.get_response(request)
+        return self.registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion = request._medicion = Medicion()
+        inicio = time.perf_counter()
+        # Las conexiones son por hilo: el wrapper se instala en el hilo donde corre
+        # el ORM async de este request (sync_to_async thread_sensitive)
+        wrappers = ExitStack()
+        await sync_to_async(instalar_medicion)(wrappers, medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    def registrar(self, request, response, medicion, total):
+        response['Server-Timing'] = server_timing(medicion, total)
+        vista = request.resolver_match.view_name if request.resolver_match else SIN_RUTA
+        if vista != VISTA_METRICAS:
+            excedido = controlar_presupuesto(vista, request, medicion)
+            registro.registrar(vista, request.method, response.status_code, medicion, total, excedido)
+        return response
+
+    def process_template_response(self, request, response):
+        # Las Response de DRF se renderizan después de este hook
+        medicion = getattr(request, '_medicion', None)
+        if medicion is not None:
+            inicio = time.perf_counter()
+
+            def fin_render(response):
+                medicion.render += time.perf_counter() - inicio
+
+            response.add_post_render_callback(fin_render)
+        return response
+
+
+class SerializacionMedidaMixin:
+    """
+    list y retrieve de DRF con el serializer.data medido aparte. Las @action que
+    serializan a mano usan self.serializar(serializer) en lugar de serializer.data.
+    """
+
+    def serializar(self, serializer):
+        with medir_serializacion(self.request):
+            return serializer.data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serializar(self.get_serializer(page, many=True)))
+        return Response(self.serializar(self.get_serializer(queryset, many=True)))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serializar(self.get_serializer(self.get_object())))
+
+
+def metrics(request):
+    """Acumulados del proceso para Prometheus; con METRICAS['TOKEN'] pide Authorization: Bearer <token>"""
+    token = configuracion().get('TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(registro.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+# -----------------------------
+# Tamaño de página común a todos los endpoints
+# -----------------------------
+class PageSizeMixin:
+    """El cliente puede pedir ?page_size=, pero nunca más que MAX_PAGE_SIZE"""
+    page_size_query_param = 'page_size'
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE', 100)
+
+
+class StandardPageNumberPagination(PageSizeMixin, PageNumberPagination):
+    """Paginación por número de página (tablas chicas: categorías, materiales)"""
+    pass
+
+
+# -----------------------------
+# Paginación por cursor (keyset)
+# -----------------------------
+class ProductCursorPagination(PageSizeMixin, CursorPagination):
+    """Catálogo ordenado por (name, id): cada página es un rango indexado, sin OFFSET"""
+    ordering = ('name', 'id')
+
+
+class OrderCursorPagination(PageSizeMixin, CursorPagination):
+    """Pedidos del más nuevo al más viejo"""
+    ordering = ('-creado_en', 'id')
+
+
+class CartCursorPagination(PageSizeMixin, CursorPagination):
+    """Carritos e items, del más nuevo al más viejo (sin COUNT(*) por página)"""
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,192 @@
+"""
+Lecturas del catálogo en réplicas de solo lectura.
+
+Las réplicas se declaran en DATABASES con 'REPLICA_DE': 'default' (settings las
+arma desde SQLITE_REPLICAS). Son copias que mantiene otro proceso (litestream,
+sqlite3_rsync, la replicación del motor): Django nunca escribe ni migra en ellas.
+
+  - Solo van a una réplica los GET de las acciones en replica_actions (list y
+    retrieve) de los viewsets con LecturaEnReplicaMixin: productos, categorías y
+    materiales. Todo lo demás, incluidos checkout y stock, usa la primaria
+  - Se elige una réplica por request, así todas sus consultas ven el mismo estado,
+    según REPLICAS['SELECCION']: 'round_robin', o 'menor_retraso' (la menos
+    atrasada; si ninguna está dentro de RETRASO_MAXIMO se lee de la primaria)
+  - Read-after-write: si el request ya escribió, lo que sigue lee de la primaria;
+    y después de un POST/PUT/PATCH/DELETE exitoso la cookie COOKIE fija al
+    cliente a la primaria por REPLICAS['FIJAR_PRIMARIA'] segundos
+
+El retraso de una réplica es cuánto más vieja es su última modificación de
+producto (Product.actualizado_en) que la de la primaria; se mide cada
+INTERVALO_RETRASO segundos por proceso.
+"""
+import itertools
+import math
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models import Max
+from rest_framework.permissions import SAFE_METHODS
+
+COOKIE = 'tienda_primaria'
+
+
+class Estado:
+    """Réplica elegida para el request (None: primaria) y si ya escribió"""
+    __slots__ = ('replica', 'escribio')
+
+    def __init__(self):
+        self.replica = None
+        self.escribio = False
+
+
+_estado = ContextVar('replicas_estado', default=None)
+_turno = itertools.count()
+_retrasos = {}
+_lock = threading.Lock()
+
+
+def configuracion():
+    return getattr(settings, 'REPLICAS', {})
+
+
+def replicas():
+    return [alias for alias, config in settings.DATABASES.items() if config.get('REPLICA_DE')]
+
+
+def activas():
+    return configuracion().get('ACTIVAS', True) and bool(replicas())
+
+
+def replica_actual():
+    estado = _estado.get()
+    return estado.replica if estado is not None else None
+
+
+# -----------------------------
+# Selección
+# -----------------------------
+def medir_retraso(alias):
+    """Segundos de atraso de la réplica (inf si no responde o está vacía)"""
+    Product = apps.get_model('products', 'Product')
+    try:
+        primaria = Product.objects.using(DEFAULT_DB_ALIAS).aggregate(maximo=Max('actualizado_en'))['maximo']
+        copia = Product.objects.using(alias).aggregate(maximo=Max('actualizado_en'))['maximo']
+    except DatabaseError:
+        return math.inf
+    if primaria is None or (copia is not None and copia >= primaria):
+        return 0.0
+    if copia is None:
+        return math.inf
+    return (primaria - copia).total_seconds()
+
+
+def retraso(alias):
+    intervalo = configuracion().get('INTERVALO_RETRASO', 5)
+    ahora = time.monotonic()
+    with _lock:
+        medido = _retrasos.get(alias)
+    if medido is not None and ahora - medido[0] < intervalo:
+        return medido[1]
+    segundos = medir_retraso(alias)
+    with _lock:
+        _retrasos[alias] = (ahora, segundos)
+    return segundos
+
+
+def elegir_replica():
+    """Alias de la réplica para un request de lectura, o None para leer de la primaria"""
+    disponibles = replicas()
+    if not disponibles or not configuracion().get('ACTIVAS', True):
+        return None
+    if configuracion().get('SELECCION', 'round_robin') == 'menor_retraso':
+        segundos, alias = min((retraso(alias), alias) for alias in disponibles)
+        return alias if segundos <= configuracion().get('RETRASO_MAXIMO', 5) else None
+    return disponibles[next(_turno) % len(disponibles)]
+
+
+def vigencia_respuesta():
+    """
+    Timeout para cachear la respuesta del request: la de una réplica puede estar
+    atrasada respecto de la versión de la clave, así que dura a lo sumo RETRASO_MAXIMO
+    """
+    return DEFAULT_TIMEOUT if replica_actual() is None else configuracion().get('RETRASO_MAXIMO', 5)
+
+
+# -----------------------------
+# Router, mixin y middleware
+# -----------------------------
+class RouterReplicas:
+    def db_for_read(self, model, **hints):
+        # None: la primaria (o la base de la instancia relacionada)
+        return replica_actual()
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            # Lo que el request lea después tiene que ver esta escritura
+            estado.replica = None
+            estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *replicas()}
+        return True if {obj1._state.db, obj2._state.db} <= bases else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
+
+
+class LecturaEnReplicaMixin:
+    """Las acciones en replica_actions leen de una réplica (salvo read-after-write)"""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        # Autenticación y permisos antes, contra la primaria
+        super().initial(request, *args, **kwargs)
+        estado = _estado.get()
+        if (
+            estado is not None and not estado.escribio and self.action in self.replica_actions
+            and request.method in SAFE_METHODS and COOKIE not in request.COOKIES
+        ):
+            estado.replica = elegir_replica()
+
+
+class ReplicasMiddleware:
+    """Estado de réplicas por request y cookie de read-after-write. Sync y async, como MetricasMiddleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _estado.set(Estado())
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.fijar_primaria(request, response)
+
+    async def __acall__(self, request):
+        token = _estado.set(Estado())
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self.fijar_primaria(request, response)
+
+    def fijar_primaria(self, request, response):
+        segundos = configuracion().get('FIJAR_PRIMARIA', 5)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and segundos and activas():
+            response.set_cookie(COOKIE, '1', max_age=segundos, httponly=True, samesite='Lax')
+        return response
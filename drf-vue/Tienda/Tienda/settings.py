@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,12 +48,18 @@ THIRD_APPS = [
 OWNS_APPS = [
     'products',
     'cart',
-    'order'
+    'order',
+    'reports',
+    # Catálogo sintético y benchmarks (comandos sembrar_catalogo y benchmark)
+    'bench',
 ]
 
 INSTALLED_APPS = BASE_APPS + THIRD_APPS + OWNS_APPS
 
 MIDDLEWARE = [
+    # Primero: mide SQL y latencia de todo lo que sigue (Tienda/metricas.py)
+    'Tienda.metricas.MetricasMiddleware',
+    'Tienda.replicas.ReplicasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -78,6 +85,50 @@ CORS_ALLOWED_METHODS = (
     'PUT',
 )
 
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'Tienda.pagination.StandardPageNumberPagination',
+    'PAGE_SIZE': 24,
+    # Tope para ?page_size=, así un request nunca trae la tabla entera
+    'MAX_PAGE_SIZE': 100,
+}
+
+# Métricas por request (Tienda/metricas.py): Server-Timing, /metrics y presupuesto
+# de consultas por ruta. Los listados y detalles tienen una cantidad fija de consultas,
+# sin importar cuántas filas devuelvan; el margen cubre la sesión y el usuario logueado.
+METRICAS = {
+    'PRESUPUESTO_CONSULTAS': {
+        'products-list': 12,
+        'products-detail': 8,
+        'products-by-category': 7,
+        'products-on-sale': 7,
+        'products-new-arrivals': 7,
+        # El índice de texto hace dos: el COUNT del total y los ids de la página
+        'products-search': 11,
+        'categories-list': 5,
+        'categories-products': 8,
+        'categories-with-products': 5,
+        'materials-products': 8,
+        # Lectura async (products/async_views.py): las mismas consultas que la versión sync
+        'async-products-list': 12,
+        'async-products-detail': 8,
+        'async-categories-list': 5,
+        'async-categories-products': 8,
+        'async-materials-products': 8,
+        'GET cart-list': 9,
+        'POST cart-list': 17,
+        'cart-detail': 9,
+        'cartitem-list': 8,
+        'GET order-list': 10,
+        'POST order-list': 30,
+        'GET order-detail': 10,
+        'stock-bulk': 32,
+    },
+    # En los tests pasarse del presupuesto es un error; en producción, un warning en el log
+    'ESTRICTO': 'test' in sys.argv[1:2],
+    # Si está definido, /metrics pide Authorization: Bearer <token>
+    'TOKEN': os.environ.get('METRICAS_TOKEN'),
+}
+
 ROOT_URLCONF = 'Tienda.urls'
 
 TEMPLATES = [
@@ -101,13 +152,109 @@ WSGI_APPLICATION = 'Tienda.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfiles de conexión de SQLite (SQLITE_PERFIL):
+#   'produccion': WAL (los lectores no esperan a las escrituras), synchronous=NORMAL
+#     (seguro con WAL), mmap y cache de páginas, busy timeout, BEGIN IMMEDIATE en los
+#     atomic (toman el lock de escritura al empezar: sin "database is locked" al pasar
+#     de leer a escribir) y conexiones persistentes con health check
+#   'basico': la configuración por defecto de Django (el perfil por defecto; los
+#     despliegues eligen 'produccion' con la variable de entorno SQLITE_PERFIL)
+SQLITE_PERFILES = {
+    'basico': {},
+    'produccion': {
+        'OPTIONS': {
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_MB', 256)) * 1024 * 1024}",
+                # Negativo: en KiB
+                f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_MB', 64)) * 1024}",
+                'PRAGMA temp_store=MEMORY',
+            ]),
+            # Segundos que una conexión espera un lock antes de fallar
+            'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+SQLITE_PERFIL = os.environ.get('SQLITE_PERFIL', 'basico')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH: otra base, p. ej. la que deja sembrar_catalogo para medir con un servidor real
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'TEST': {
+            # En archivo y no en memoria: los tests de concurrencia abren una conexión por hilo
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+        **SQLITE_PERFILES[SQLITE_PERFIL],
+    }
+}
+
+# Réplicas de solo lectura para el catálogo (Tienda/replicas.py): SQLITE_REPLICAS=ruta1,ruta2
+# Las mantiene otro proceso (litestream, sqlite3_rsync); Django no las migra ni escribe.
+# En los tests hay una, sincronizada a mano por los tests de réplicas.
+REPLICAS_SQLITE = [ruta for ruta in os.environ.get('SQLITE_REPLICAS', '').split(',') if ruta]
+if not REPLICAS_SQLITE and 'test' in sys.argv[1:2]:
+    REPLICAS_SQLITE = [BASE_DIR / 'replica1.sqlite3']
+for numero, ruta in enumerate(REPLICAS_SQLITE, 1):
+    DATABASES[f'replica{numero}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ruta,
+        'REPLICA_DE': 'default',
+        'TEST': {'NAME': BASE_DIR / f'test_replica{numero}.sqlite3'},
+        **SQLITE_PERFILES[SQLITE_PERFIL],
     }
+
+DATABASE_ROUTERS = ['Tienda.replicas.RouterReplicas']
+
+REPLICAS = {
+    # En los tests las lecturas van a la primaria salvo en los tests de réplicas
+    'ACTIVAS': 'test' not in sys.argv[1:2],
+    # 'round_robin' o 'menor_retraso'
+    'SELECCION': os.environ.get('REPLICAS_SELECCION', 'round_robin'),
+    # Segundos: una réplica más atrasada no se usa (con 'menor_retraso') y es lo
+    # máximo que se cachea una respuesta armada en una réplica
+    'RETRASO_MAXIMO': float(os.environ.get('REPLICAS_RETRASO_MAXIMO', 5)),
+    'INTERVALO_RETRASO': float(os.environ.get('REPLICAS_INTERVALO_RETRASO', 5)),
+    # Segundos que un cliente lee de la primaria después de escribir
+    'FIJAR_PRIMARIA': float(os.environ.get('REPLICAS_FIJAR_PRIMARIA', 5)),
 }
 
+# JSON precalculado del detalle y listado de productos (products/documentos.py)
+DOCUMENTOS_PRODUCTO = {
+    # En los tests solo los usan los tests de documentos
+    'ACTIVOS': os.environ.get('DOCUMENTOS_PRODUCTO', '1') != '0' and 'test' not in sys.argv[1:2],
+    # Regenerar en un hilo después del commit; en los tests, en el on_commit mismo
+    'ASINCRONO': 'test' not in sys.argv[1:2],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'catalogo' guarda las respuestas de la API de productos (products/cache.py).
+# En producción se puede apuntar a Redis o a archivos con las variables de entorno, ej:
+#   CATALOGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CATALOGO_CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogo': {
+        'BACKEND': os.environ.get('CATALOGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOGO_CACHE_LOCATION', 'catalogo'),
+        'TIMEOUT': int(os.environ.get('CATALOGO_CACHE_TIMEOUT', 60 * 15)),
+    },
+}
+
+# Cache de respuestas de los viewsets del catálogo (products/cache.py). Apagarlo
+# deja ETag/Last-Modified y sirve para medir el trabajo real de las vistas.
+CATALOGO_CACHE_RESPUESTAS = os.environ.get('CATALOGO_CACHE_RESPUESTAS', '1') != '0'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
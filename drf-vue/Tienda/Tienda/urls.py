@@ -3,9 +3,15 @@ from django.contrib import admin
 from django.conf import settings
 from django.urls import path, include
 
+from . import metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metricas.metrics, name=metricas.VISTA_METRICAS),
     path('api/', include('products.urls')),
+    path('', include('cart.urls')),
+    path('', include('order.urls')),
+    path('api/', include('reports.urls')),
 ]
 
 if settings.DEBUG:
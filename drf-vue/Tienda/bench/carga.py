@@ -0,0 +1,231 @@
+"""
+Prueba de carga WSGI vs ASGI de la lectura del catálogo, sobre la misma base sembrada.
+
+En proceso (por defecto) se llama directamente a los handlers de Django, sin red:
+  - WSGI: get_wsgi_application() con N hilos, contra los viewsets sync (/api/...)
+  - ASGI: get_asgi_application() con N corrutinas en un event loop, contra las
+    vistas async (/api/async/...). Cada request corre en su ThreadSensitiveContext,
+    como bajo uvicorn.
+Con servidores reales se usa un cliente HTTP con N hilos y conexiones
+persistentes (ver el comando benchmark_carga).
+
+Se mide requests por segundo y latencias p50/p99. El cache de respuestas de los
+viewsets se apaga salvo con_cache=True: las vistas async no lo usan y se compara
+el mismo trabajo.
+"""
+import asyncio
+import http.client
+import io
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test.utils import override_settings
+
+from products.models import Category, Material, Product
+from .runner import percentil
+
+PREFIJO_WSGI = '/api/'
+PREFIJO_ASGI = '/api/async/'
+HOST = 'testserver'
+
+
+def rutas():
+    """GET de lectura del catálogo (relativos al prefijo de cada versión) con ids de la base sembrada"""
+    productos = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:20])
+    categoria = Category.objects.order_by('pk').values_list('pk', flat=True).first()
+    material = Material.objects.order_by('pk').values_list('pk', flat=True).first()
+    return [
+        'products/',
+        'products/?page_size=48',
+        *[f'products/{pk}/' for pk in productos[:5]],
+        f'categories/{categoria}/products/',
+        f'materials/{material}/products/',
+        'categories/',
+        'materials/',
+    ]
+
+
+def resumen(latencias, errores, duracion):
+    latencias_ms = [latencia * 1000 for latencia in latencias]
+    return {
+        'requests': len(latencias),
+        'errores': errores,
+        'rps': round(len(latencias) / duracion, 1) if duracion else None,
+        'p50_ms': round(percentil(latencias_ms, 50), 3) if latencias_ms else None,
+        'p99_ms': round(percentil(latencias_ms, 99), 3) if latencias_ms else None,
+    }
+
+
+def _separar(ruta):
+    camino, _, query = ruta.partition('?')
+    return camino, query
+
+
+# -----------------------------
+# En proceso
+# -----------------------------
+def _pedir_wsgi(aplicacion, ruta):
+    camino, query = _separar(ruta)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': camino, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    estado = []
+    cuerpo = aplicacion(environ, lambda status, headers, exc_info=None: estado.append(int(status.split()[0])))
+    try:
+        for _ in cuerpo:
+            pass
+    finally:
+        # close() dispara request_finished (cierre de conexiones), como un servidor real
+        cuerpo.close()
+    return estado[0]
+
+
+def carga_wsgi(rutas_relativas, concurrencia, total):
+    aplicacion = get_wsgi_application()
+    urls = itertools.cycle([PREFIJO_WSGI + ruta for ruta in rutas_relativas])
+    lock = threading.Lock()
+    latencias, errores = [], [0]
+
+    def trabajador(cantidad):
+        try:
+            for _ in range(cantidad):
+                with lock:
+                    url = next(urls)
+                inicio = time.perf_counter()
+                estado = _pedir_wsgi(aplicacion, url)
+                latencia = time.perf_counter() - inicio
+                with lock:
+                    latencias.append(latencia)
+                    errores[0] += estado >= 400
+        finally:
+            # Con CONN_MAX_AGE la conexión del hilo sigue abierta, como en un worker
+            connections.close_all()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as hilos:
+        for futuro in [hilos.submit(trabajador, cantidad) for cantidad in _repartir(total, concurrencia)]:
+            futuro.result()
+    return resumen(latencias, errores[0], time.perf_counter() - inicio)
+
+
+async def _pedir_asgi(aplicacion, ruta):
+    camino, query = _separar(ruta)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': camino, 'raw_path': camino.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', HOST.encode())], 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+    }
+    cuerpo_leido = False
+    fin = asyncio.Event()
+    estado = []
+
+    async def receive():
+        nonlocal cuerpo_leido
+        if not cuerpo_leido:
+            cuerpo_leido = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # El cliente no se desconecta: Django cancela esta espera al terminar la respuesta
+        await fin.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    await aplicacion(scope, receive, send)
+    return estado[0]
+
+
+def carga_asgi(rutas_relativas, concurrencia, total):
+    aplicacion = get_asgi_application()
+    urls = itertools.cycle([PREFIJO_ASGI + ruta for ruta in rutas_relativas])
+    latencias, errores = [], [0]
+
+    async def trabajador(cantidad):
+        for _ in range(cantidad):
+            inicio = time.perf_counter()
+            estado = await _pedir_asgi(aplicacion, next(urls))
+            latencias.append(time.perf_counter() - inicio)
+            errores[0] += estado >= 400
+
+    async def correr():
+        await asyncio.gather(*[trabajador(cantidad) for cantidad in _repartir(total, concurrencia)])
+
+    inicio = time.perf_counter()
+    with sin_conexiones_persistentes():
+        asyncio.run(correr())
+    return resumen(latencias, errores[0], time.perf_counter() - inicio)
+
+
+@contextmanager
+def sin_conexiones_persistentes():
+    """CONN_MAX_AGE=0, como lo deja Tienda/asgi.py: cada request corre el ORM en un hilo nuevo"""
+    anteriores = {alias: connections.settings[alias]['CONN_MAX_AGE'] for alias in connections}
+    for alias in anteriores:
+        connections.settings[alias]['CONN_MAX_AGE'] = 0
+    try:
+        yield
+    finally:
+        for alias, valor in anteriores.items():
+            connections.settings[alias]['CONN_MAX_AGE'] = valor
+
+
+def _repartir(total, partes):
+    return [total // partes + (i < total % partes) for i in range(partes)]
+
+
+def comparar_en_proceso(concurrencia, total, con_cache=False):
+    rutas_relativas = rutas()
+    with override_settings(CATALOGO_CACHE_RESPUESTAS=con_cache):
+        # Un request de cada ruta antes de medir (imports, cachés de Django)
+        carga_wsgi(rutas_relativas, 1, len(rutas_relativas))
+        carga_asgi(rutas_relativas, 1, len(rutas_relativas))
+        return {
+            'wsgi': carga_wsgi(rutas_relativas, concurrencia, total),
+            'asgi': carga_asgi(rutas_relativas, concurrencia, total),
+        }
+
+
+# -----------------------------
+# Contra un servidor
+# -----------------------------
+def carga_http(base_url, prefijo, rutas_relativas, concurrencia, total):
+    """N hilos, cada uno con su conexión HTTP/1.1 persistente"""
+    destino = urlsplit(base_url)
+    urls = itertools.cycle([destino.path.rstrip('/') + prefijo + ruta for ruta in rutas_relativas])
+    lock = threading.Lock()
+    latencias, errores = [], [0]
+
+    def trabajador(cantidad):
+        conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=30)
+        try:
+            for _ in range(cantidad):
+                with lock:
+                    url = next(urls)
+                inicio = time.perf_counter()
+                conexion.request('GET', url)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                latencia = time.perf_counter() - inicio
+                with lock:
+                    latencias.append(latencia)
+                    errores[0] += respuesta.status >= 400
+        finally:
+            conexion.close()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as hilos:
+        for futuro in [hilos.submit(trabajador, cantidad) for cantidad in _repartir(total, concurrencia)]:
+            futuro.result()
+    return resumen(latencias, errores[0], time.perf_counter() - inicio)
@@ -0,0 +1,158 @@
+"""
+Catálogo sintético para benchmarks.
+
+generar_catalogo() arma los datos en memoria a partir de una semilla: la misma
+semilla (y el mismo día de referencia) produce siempre los mismos productos,
+stock, carritos y pedidos. sembrar() los escribe con bulk_create y recalcula lo
+que normalmente mantienen las señales (total_stock/etiqueta, índice de
+búsqueda, documentos JSON de productos, líneas congeladas de los pedidos y
+rollups de reportes).
+"""
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from order.models import Order
+from products import documentos, search
+from products.cache import TABLAS_PRODUCTO, invalidar
+from products.models import (
+    Category, Color, Material, Product, ProductImage, ProductoColor, ProductoTalle, Talle, refresco_diferido,
+)
+from reports import rollups
+
+CATEGORIAS = ['Remeras', 'Pantalones', 'Vestidos', 'Camperas', 'Buzos', 'Faldas', 'Camisas', 'Accesorios']
+MATERIALES = ['Algodón', 'Lino', 'Jean', 'Seda', 'Lana', 'Poliéster']
+TALLES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+COLORES = ['Negro', 'Blanco', 'Rojo', 'Azul', 'Verde', 'Gris', 'Beige', 'Rosa']
+ADJETIVOS = ['Clásica', 'Oversize', 'Básica', 'Estampada', 'Rayada', 'Lisa', 'Vintage', 'Deportiva']
+METODOS_ENVIO = [metodo for metodo, _ in Order.METODOS_ENVIO]
+METODOS_PAGO = [metodo for metodo, _ in Order.METODOS_PAGO]
+
+# Fechas de creación y de pedidos, hacia atrás desde el día de referencia
+DIAS_CATALOGO = 120
+DIAS_PEDIDOS = 30
+
+
+def generar_catalogo(productos=1000, imagenes=3, carritos=200, pedidos=100, semilla=42, hoy=None):
+    """
+    Datos del catálogo sintético, sin tocar la base. hoy (fecha) fija las
+    fechas relativas (nuevos ingresos, pedidos del último mes); por defecto es hoy.
+    """
+    rng = random.Random(semilla)
+    referencia = timezone.make_aware(datetime.combine(hoy or timezone.localdate(), time.min))
+
+    filas = []
+    for i in range(productos):
+        precio = Decimal(rng.randrange(5000, 60000, 500))
+        filas.append({
+            'name': f'{CATEGORIAS[i % len(CATEGORIAS)][:-1]} {rng.choice(ADJETIVOS)} {i:05d}',
+            'description': f'{rng.choice(ADJETIVOS)} de {rng.choice(MATERIALES).lower()}, modelo {i}',
+            'category': CATEGORIAS[i % len(CATEGORIAS)],
+            'material': rng.choice(MATERIALES),
+            'price': precio,
+            'price_cost': (precio * Decimal('0.45')).quantize(Decimal('1')),
+            'sale_price': (precio * Decimal('0.8')).quantize(Decimal('1')) if rng.random() < 0.3 else None,
+            'fecha_creacion': referencia - timedelta(hours=rng.randrange(DIAS_CATALOGO * 24)),
+            'images': [f'https://img.bench/{i}-{j}.jpg' for j in range(imagenes)],
+            'talles': {talle: rng.randint(0, 20) for talle in sorted(rng.sample(TALLES, 3))},
+            'colores': {color: rng.randint(0, 20) for color in sorted(rng.sample(COLORES, 2))},
+        })
+
+    lista_carritos = []
+    for _ in range(carritos if productos else 0):
+        items = []
+        for _ in range(rng.randint(1, 5)):
+            indice = rng.randrange(productos)
+            items.append((
+                indice, rng.choice(list(filas[indice]['talles'])),
+                rng.choice(list(filas[indice]['colores'])), rng.randint(1, 3),
+            ))
+        lista_carritos.append(items)
+
+    # Cada pedido usa un carrito distinto (relación uno a uno)
+    lista_pedidos = [
+        {
+            'carrito': indice, 'completado': rng.random() < 0.7,
+            'metodo_envio': rng.choice(METODOS_ENVIO), 'metodo_pago': rng.choice(METODOS_PAGO),
+            'creado_en': referencia - timedelta(minutes=rng.randrange(DIAS_PEDIDOS * 24 * 60)),
+        }
+        for indice in range(min(pedidos, len(lista_carritos)))
+    ]
+    return {'productos': filas, 'carritos': lista_carritos, 'pedidos': lista_pedidos}
+
+
+def sembrar(catalogo, lote=1000):
+    """Escribe el catálogo generado; devuelve la cantidad de filas por tabla"""
+    with transaction.atomic():
+        cantidades = _escribir(catalogo, lote)
+    # Los documentos JSON se regeneran después del commit: se mide con todos al día
+    documentos.esperar()
+    return cantidades
+
+
+def _escribir(catalogo, lote):
+    categorias = {c.name: c.pk for c in Category.objects.bulk_create([Category(name=n) for n in CATEGORIAS])}
+    materiales = {m.name: m.pk for m in Material.objects.bulk_create([Material(name=n) for n in MATERIALES])}
+    talles = {t.name: t.pk for t in Talle.objects.bulk_create([Talle(name=n) for n in TALLES])}
+    colores = {c.name: c.pk for c in Color.objects.bulk_create([Color(name=n) for n in COLORES])}
+
+    filas = catalogo['productos']
+    productos = Product.objects.bulk_create([
+        Product(
+            name=fila['name'], description=fila['description'], category_id=categorias[fila['category']],
+            material_id=materiales[fila['material']], price=fila['price'], price_cost=fila['price_cost'],
+            sale_price=fila['sale_price'], fecha_creacion=fila['fecha_creacion'],
+        )
+        for fila in filas
+    ], batch_size=lote)
+    ProductImage.objects.bulk_create([
+        ProductImage(product=producto, image=url, order=orden)
+        for producto, fila in zip(productos, filas) for orden, url in enumerate(fila['images'])
+    ], batch_size=lote)
+    # total_stock/etiqueta de todos los productos se recalculan una vez al salir
+    with refresco_diferido():
+        ProductoTalle.objects.bulk_create([
+            ProductoTalle(producto=producto, talle_id=talles[talle], stock=stock)
+            for producto, fila in zip(productos, filas) for talle, stock in fila['talles'].items()
+        ], indexar=False, batch_size=lote)
+        ProductoColor.objects.bulk_create([
+            ProductoColor(producto=producto, color_id=colores[color], stock=stock)
+            for producto, fila in zip(productos, filas) for color, stock in fila['colores'].items()
+        ], indexar=False, batch_size=lote)
+    search.reconstruir_indice()
+
+    items = CartItem.objects.bulk_create([
+        CartItem(product=productos[indice], talle_id=talles[talle], color_id=colores[color], quantity=cantidad)
+        for carrito in catalogo['carritos'] for indice, talle, color, cantidad in carrito
+    ], batch_size=lote)
+    completados = {pedido['carrito'] for pedido in catalogo['pedidos'] if pedido['completado']}
+    carritos = Cart.objects.bulk_create([
+        Cart(completed=indice in completados) for indice in range(len(catalogo['carritos']))
+    ], batch_size=lote)
+    items_por_carrito = iter(items)
+    Cart.items.through.objects.bulk_create([
+        Cart.items.through(cart=carrito, cartitem=next(items_por_carrito))
+        for carrito, lineas in zip(carritos, catalogo['carritos']) for _ in lineas
+    ], batch_size=lote)
+
+    Order.objects.bulk_create([
+        Order(
+            cliente_nombre=f'Cliente {indice}', metodo_envio=pedido['metodo_envio'],
+            metodo_pago=pedido['metodo_pago'], carrito=carritos[pedido['carrito']],
+            creado_en=pedido['creado_en'], completado=pedido['completado'],
+        )
+        for indice, pedido in enumerate(catalogo['pedidos'])
+    ], batch_size=lote)
+    # Lo que hacen el checkout y las señales de Order: líneas congeladas y rollups
+    Order.objects.congelar()
+    rollups.reconstruir(lote=lote)
+    invalidar(*TABLAS_PRODUCTO)
+
+    return {
+        'productos': len(productos), 'imagenes': ProductImage.objects.count(),
+        'carritos': len(carritos), 'items': len(items), 'pedidos': len(catalogo['pedidos']),
+    }
@@ -0,0 +1,130 @@
+"""
+Carga mixta de lecturas y escrituras concurrentes sobre SQLite, por perfil de
+conexión (settings.SQLITE_PERFILES).
+
+Cada perfil corre sobre una base nueva en un directorio temporal, con una tabla
+de stock y una de pedidos: los lectores leen páginas del catálogo y los
+escritores hacen un checkout (leer stock, descontarlo y crear el pedido en un
+atomic), como /api/orders/. Entre operación y operación se llama a
+close_if_unusable_or_obsolete(), lo mismo que hace Django al terminar cada
+request: con CONN_MAX_AGE=0 la conexión se vuelve a abrir en cada una.
+
+Se cuentan operaciones por segundo y errores de la base ("database is locked").
+"""
+import copy
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+ALIAS = 'bench_concurrencia'
+PRODUCTOS = 1000
+PAGINA = 24
+
+
+@contextmanager
+def base_temporal(perfil):
+    """Alias ALIAS apuntando a una base vacía con el perfil dado; se borra al salir"""
+    directorio = tempfile.mkdtemp(prefix='tienda-concurrencia-')
+    config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directorio, 'carga.sqlite3')}
+    config.update(copy.deepcopy(perfil))
+    # configure_settings completa las claves que Django espera en cada entrada de DATABASES
+    connections.settings[ALIAS] = connections.configure_settings({DEFAULT_DB_ALIAS: config})[DEFAULT_DB_ALIAS]
+    try:
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE producto (id INTEGER PRIMARY KEY, nombre TEXT NOT NULL, stock INTEGER NOT NULL)')
+            cursor.execute(
+                'CREATE TABLE pedido (id INTEGER PRIMARY KEY, producto_id INTEGER NOT NULL REFERENCES producto(id), '
+                'cantidad INTEGER NOT NULL)'
+            )
+            cursor.executemany(
+                'INSERT INTO producto (id, nombre, stock) VALUES (%s, %s, %s)',
+                [(i, f'Producto {i:05d}', 1000) for i in range(1, PRODUCTOS + 1)],
+            )
+        yield
+    finally:
+        connections[ALIAS].close()
+        # La conexión del hilo principal queda cacheada en el handler: otro perfil abriría una nueva
+        del connections[ALIAS]
+        del connections.settings[ALIAS]
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def leer(rng):
+    desde = rng.randrange(1, PRODUCTOS - PAGINA)
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute(
+            'SELECT id, nombre, stock FROM producto WHERE id >= %s ORDER BY id LIMIT %s', [desde, PAGINA]
+        )
+        cursor.fetchall()
+        cursor.execute('SELECT COUNT(*) FROM producto WHERE stock > 0')
+        cursor.fetchone()
+
+
+def comprar(rng):
+    producto = rng.randrange(1, PRODUCTOS + 1)
+    with transaction.atomic(using=ALIAS), connections[ALIAS].cursor() as cursor:
+        cursor.execute('SELECT stock FROM producto WHERE id = %s', [producto])
+        if cursor.fetchone()[0] > 0:
+            cursor.execute('UPDATE producto SET stock = stock - 1 WHERE id = %s', [producto])
+            cursor.execute('INSERT INTO pedido (producto_id, cantidad) VALUES (%s, 1)', [producto])
+
+
+def carga_mixta(perfil, lectores=8, escritores=4, segundos=3.0, semilla=0):
+    """Operaciones por segundo y errores con lectores y escritores en paralelo durante segundos"""
+    totales = {'lecturas': 0, 'escrituras': 0, 'errores': 0}
+    lock = threading.Lock()
+
+    def trabajador(operacion, clave, indice, fin):
+        rng = random.Random(semilla * 1000 + indice)
+        hechas = errores = 0
+        try:
+            while time.perf_counter() < fin:
+                try:
+                    operacion(rng)
+                    hechas += 1
+                except OperationalError:
+                    errores += 1
+                connections[ALIAS].close_if_unusable_or_obsolete()
+        finally:
+            connections[ALIAS].close()
+        with lock:
+            totales[clave] += hechas
+            totales['errores'] += errores
+
+    with base_temporal(perfil):
+        fin = time.perf_counter() + segundos
+        hilos = [
+            threading.Thread(target=trabajador, args=(leer, 'lecturas', i, fin)) for i in range(lectores)
+        ] + [
+            threading.Thread(target=trabajador, args=(comprar, 'escrituras', lectores + i, fin))
+            for i in range(escritores)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM pedido')
+            pedidos = cursor.fetchone()[0]
+
+    return {
+        **totales,
+        'lecturas_s': round(totales['lecturas'] / duracion, 1),
+        'escrituras_s': round(totales['escrituras'] / duracion, 1),
+        # Cada escritura confirmada dejó exactamente un pedido
+        'pedidos': pedidos,
+    }
+
+
+def comparar_perfiles(perfiles=None, **parametros):
+    nombres = perfiles or list(settings.SQLITE_PERFILES)
+    return {nombre: carga_mixta(settings.SQLITE_PERFILES[nombre], **parametros) for nombre in nombres}
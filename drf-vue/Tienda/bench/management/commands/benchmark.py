@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bench.catalogo import generar_catalogo, sembrar
+from bench.runner import REPETICIONES, TOLERANCIA, base_descartable, comparar, correr
+from .sembrar_catalogo import agregar_argumentos_catalogo, parametros_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia p50/p95, consultas por request y pico de memoria de cada endpoint de '
+        'products, cart y order sobre un catálogo sintético en una base descartable. '
+        'Escribe los resultados en JSON y falla si hay regresiones respecto de --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        agregar_argumentos_catalogo(parser)
+        parser.add_argument('--reusar', action='store_true',
+                            help='Usar la base que dejó sembrar_catalogo (sin volver a sembrar)')
+        parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+        parser.add_argument('--con-cache', action='store_true', help='No vaciar el cache de respuestas entre requests')
+        parser.add_argument('--solo', nargs='+', help='Solo los endpoints cuyo nombre contiene alguno de estos textos')
+        parser.add_argument('--salida', default='bench_resultados.json', help='Archivo JSON de resultados')
+        parser.add_argument('--baseline', help='Resultados anteriores contra los que comparar')
+        parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                            help='Aumento relativo de p50/memoria tolerado (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        base = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la línea base: {e}')
+
+        parametros = parametros_catalogo(options)
+        with base_descartable(reusar=options['reusar'], borrar=not options['reusar']):
+            if not options['reusar']:
+                sembrar(generar_catalogo(**parametros))
+            resultados = correr(
+                options['repeticiones'], options['con_cache'], options['solo'],
+                parametros=None if options['reusar'] else parametros,
+            )
+
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            archivo.write('\n')
+
+        self.stdout.write(f'{"endpoint":<26} {"p50 ms":>8} {"p95 ms":>8} {"consultas":>9} {"memoria KB":>10}')
+        for nombre, fila in resultados['endpoints'].items():
+            self.stdout.write(
+                f'{nombre:<26} {fila["p50_ms"]:>8.1f} {fila["p95_ms"]:>8.1f} '
+                f'{fila["consultas"]:>9} {fila["memoria_pico_kb"]:>10.0f}'
+            )
+        self.stdout.write(f'Resultados en {options["salida"]}')
+
+        if base is not None:
+            regresiones = comparar(resultados, base, options['tolerancia'])
+            if regresiones:
+                raise CommandError('Regresiones respecto de la línea base:\n  ' + '\n  '.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto de la línea base'))
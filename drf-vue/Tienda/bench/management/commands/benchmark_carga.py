@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bench.carga import PREFIJO_ASGI, PREFIJO_WSGI, carga_http, comparar_en_proceso, rutas
+from bench.catalogo import generar_catalogo, sembrar
+from bench.runner import base_descartable
+from .sembrar_catalogo import agregar_argumentos_catalogo, parametros_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga concurrente sobre la lectura del catálogo: requests/s y latencia p50/p99 de la '
+        'versión WSGI (/api/) contra la ASGI (/api/async/) sobre la misma base sembrada. '
+        'Por defecto llama a los handlers en proceso; con --wsgi-url/--asgi-url mide servidores '
+        'reales levantados sobre la base de sembrar_catalogo, p. ej.: '
+        'SQLITE_PATH=test_db.sqlite3 CATALOGO_CACHE_RESPUESTAS=0 gunicorn -w 4 Tienda.wsgi y '
+        'SQLITE_PATH=test_db.sqlite3 uvicorn --workers 4 Tienda.asgi:application.'
+    )
+
+    def add_arguments(self, parser):
+        agregar_argumentos_catalogo(parser)
+        parser.add_argument('--reusar', action='store_true',
+                            help='Usar la base que dejó sembrar_catalogo (sin volver a sembrar)')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Hilos (WSGI) o corrutinas (ASGI) en paralelo')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests por versión')
+        parser.add_argument('--con-cache', action='store_true', help='Dejar prendido el cache de respuestas (en proceso)')
+        parser.add_argument('--wsgi-url', help='Servidor WSGI a medir, p. ej. http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', help='Servidor ASGI a medir, p. ej. http://127.0.0.1:8001')
+        parser.add_argument('--salida', default='bench_carga.json', help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] < 1 or options['requests'] < options['concurrencia']:
+            raise CommandError('--requests tiene que ser al menos --concurrencia (y esta, al menos 1)')
+        externo = options['wsgi_url'] or options['asgi_url']
+        # Los servidores leen la base de sembrar_catalogo: hay que reusarla
+        reusar = options['reusar'] or bool(externo)
+        concurrencia, total = options['concurrencia'], options['requests']
+
+        parametros = parametros_catalogo(options)
+        with base_descartable(reusar=reusar, borrar=not reusar):
+            if not reusar:
+                sembrar(generar_catalogo(**parametros))
+            if externo:
+                rutas_relativas = rutas()
+                resultados = {}
+                for version, url, prefijo in (
+                    ('wsgi', options['wsgi_url'], PREFIJO_WSGI), ('asgi', options['asgi_url'], PREFIJO_ASGI),
+                ):
+                    if url:
+                        resultados[version] = carga_http(url, prefijo, rutas_relativas, concurrencia, total)
+            else:
+                resultados = comparar_en_proceso(concurrencia, total, options['con_cache'])
+
+        salida = {
+            'meta': {
+                'concurrencia': concurrencia, 'requests': total, 'en_proceso': not externo,
+                'con_cache': options['con_cache'], 'catalogo': None if reusar else parametros,
+            },
+            'versiones': resultados,
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(salida, archivo, indent=2, ensure_ascii=False)
+            archivo.write('\n')
+
+        self.stdout.write(f'{"versión":<8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errores":>8}')
+        for version, fila in resultados.items():
+            self.stdout.write(
+                f'{version:<8} {fila["rps"]:>8.1f} {fila["p50_ms"]:>8.1f} {fila["p99_ms"]:>8.1f} {fila["errores"]:>8}'
+            )
+        self.stdout.write(f'Resultados en {options["salida"]}')
+        if any(fila['errores'] for fila in resultados.values()):
+            raise CommandError('Hubo respuestas con error')
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bench.concurrencia import comparar_perfiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga mixta de lecturas y checkouts concurrentes sobre una base SQLite temporal con cada '
+        'perfil de settings.SQLITE_PERFILES (por defecto todos): lecturas/s, escrituras/s y errores '
+        '("database is locked"). No toca la base configurada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', nargs='+', help='Perfiles a comparar')
+        parser.add_argument('--lectores', type=int, default=8)
+        parser.add_argument('--escritores', type=int, default=4)
+        parser.add_argument('--segundos', type=float, default=5.0, help='Duración de cada corrida')
+        parser.add_argument('--salida', help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['perfiles'] or []) - set(settings.SQLITE_PERFILES)
+        if desconocidos:
+            raise CommandError(f'Perfiles desconocidos: {", ".join(sorted(desconocidos))}')
+
+        resultados = comparar_perfiles(
+            options['perfiles'], lectores=options['lectores'], escritores=options['escritores'],
+            segundos=options['segundos'],
+        )
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+                archivo.write('\n')
+
+        self.stdout.write(f'{"perfil":<12} {"lecturas/s":>11} {"escrituras/s":>13} {"errores":>8}')
+        for nombre, fila in resultados.items():
+            self.stdout.write(
+                f'{nombre:<12} {fila["lecturas_s"]:>11.1f} {fila["escrituras_s"]:>13.1f} {fila["errores"]:>8}'
+            )
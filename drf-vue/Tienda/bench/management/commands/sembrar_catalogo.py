@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from bench.catalogo import generar_catalogo, sembrar
+from bench.runner import base_descartable
+
+
+def agregar_argumentos_catalogo(parser):
+    parser.add_argument('--productos', type=int, default=2000)
+    parser.add_argument('--imagenes', type=int, default=3, help='Imágenes por producto')
+    parser.add_argument('--carritos', type=int, default=500)
+    parser.add_argument('--pedidos', type=int, default=300, help='Pedidos (uno por carrito, hasta --carritos)')
+    parser.add_argument('--semilla', type=int, default=42)
+
+
+def parametros_catalogo(options):
+    return {nombre: options[nombre] for nombre in ('productos', 'imagenes', 'carritos', 'pedidos', 'semilla')}
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra un catálogo sintético determinístico (productos, imágenes, stock, carritos y pedidos) '
+        'en la base de prueba, nunca en la base configurada. La base queda para "benchmark --reusar".'
+    )
+
+    def add_arguments(self, parser):
+        agregar_argumentos_catalogo(parser)
+
+    def handle(self, *args, **options):
+        parametros = parametros_catalogo(options)
+        inicio = time.monotonic()
+        with base_descartable(borrar=False):
+            cantidades = sembrar(generar_catalogo(**parametros))
+            nombre = connection.settings_dict['NAME']
+        resumen = ', '.join(f'{cantidad} {tabla}' for tabla, cantidad in cantidades.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen} en {nombre} ({time.monotonic() - inicio:.1f}s)'
+        ))
@@ -0,0 +1,247 @@
+"""
+Benchmark de los endpoints de products, cart y order con el test client de Django.
+
+Para cada endpoint mide, sobre N repeticiones (después de un request de
+calentamiento): latencia p50/p95, consultas SQL por request y pico de memoria
+de Python (tracemalloc, en un request aparte para no inflar los tiempos).
+Por defecto se invalida el cache de respuestas antes de cada request (como
+después de una escritura), así se mide el trabajo real de la vista;
+con_cache=True mide la respuesta cacheada.
+
+Los resultados se guardan en JSON y se comparan contra una línea base: más
+consultas que la base es una regresión siempre; latencia (p50) y memoria, cuando
+superan la base por más de la tolerancia. Las consultas no dependen de la
+máquina; los tiempos sí, así que la línea base se genera donde se compara.
+"""
+import itertools
+import json
+import math
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cart.models import Cart, CartItem
+from order.models import Order
+from products.cache import invalidar
+from products.models import Category, Material, Product, ProductoTalle
+from Tienda.metricas import Medicion
+
+REPETICIONES = 20
+TOLERANCIA = 0.25
+# Debajo de esta diferencia una latencia no se considera regresión (ruido del reloj)
+MINIMO_MS = 1.0
+
+
+# -----------------------------
+# Base descartable
+# -----------------------------
+@contextmanager
+def base_descartable(reusar=False, borrar=True):
+    """
+    Apunta la conexión a la base de prueba (DATABASES['default']['TEST']), nunca
+    a la configurada. Se crea y migra desde cero salvo reusar=True (la que dejó
+    una corrida anterior), y se borra al salir salvo borrar=False.
+    """
+    setup_test_environment()
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=reusar)
+    try:
+        yield
+    finally:
+        # keepdb=True solo cierra la conexión y vuelve a la base configurada
+        connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=not borrar)
+        teardown_test_environment()
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+class Endpoint:
+    """datos: dict o callable sin argumentos que arma el cuerpo de cada request (fuera del tiempo medido)"""
+
+    def __init__(self, nombre, url, metodo='GET', datos=None, admin=False):
+        self.nombre = nombre
+        self.url = url
+        self.metodo = metodo
+        self.datos = datos
+        self.admin = admin
+
+    def cuerpo(self):
+        return self.datos() if callable(self.datos) else self.datos
+
+
+def endpoints():
+    """Un caso por ruta de products/urls.py, cart/urls.py y order/urls.py, con ids de la base sembrada"""
+    producto = Product.objects.order_by('pk').first()
+    categoria = Category.objects.order_by('pk').first()
+    material = Material.objects.order_by('pk').first()
+    carrito = Cart.objects.order_by('pk').first()
+    item = CartItem.objects.order_by('pk').first()
+    pedido = Order.objects.order_by('pk').first()
+    stock = ProductoTalle.objects.select_related('talle').order_by('pk').first()
+    contador = itertools.count()
+
+    def carrito_nuevo():
+        items = [
+            {'product_id': fila.producto_id, 'talle_id': fila.talle_id, 'quantity': 1}
+            for fila in ProductoTalle.objects.filter(stock__gt=0).order_by('pk')[:3]
+        ]
+        return {'items': items}
+
+    def checkout():
+        fila = ProductoTalle.objects.filter(stock__gt=0).order_by('-stock', 'pk').first()
+        nuevo = Cart.objects.create()
+        nuevo.items.add(CartItem.objects.create(product_id=fila.producto_id, talle_id=fila.talle_id, quantity=1))
+        return {'cliente_nombre': 'Bench', 'metodo_envio': 'olmos', 'metodo_pago': 'efectivo', 'carrito_id': nuevo.pk}
+
+    def lote_stock():
+        numero = next(contador)
+        return {
+            'batch_id': f'bench-{time.time_ns()}-{numero}',
+            # Alterna el valor para que cada lote escriba
+            'items': [{'product_id': stock.producto_id, 'talle': stock.talle.name, 'stock': 10 + numero % 2}],
+        }
+
+    return [
+        Endpoint('products-list', '/api/products/'),
+        Endpoint('products-list-facets', '/api/products/?facets=true'),
+        Endpoint('products-detail', f'/api/products/{producto.pk}/'),
+        Endpoint('products-by-category', f'/api/products/by_category/?category={categoria.pk}'),
+        Endpoint('products-on-sale', '/api/products/on_sale/'),
+        Endpoint('products-new-arrivals', '/api/products/new_arrivals/'),
+        Endpoint('products-search', '/api/products/search/?q=remera'),
+        Endpoint('products-export', '/api/products/export/'),
+        Endpoint('categories-list', '/api/categories/'),
+        Endpoint('categories-detail', f'/api/categories/{categoria.pk}/'),
+        Endpoint('categories-products', f'/api/categories/{categoria.pk}/products/'),
+        Endpoint('categories-with-products', '/api/categories/with_products/'),
+        Endpoint('materials-list', '/api/materials/'),
+        Endpoint('materials-detail', f'/api/materials/{material.pk}/'),
+        Endpoint('materials-products', f'/api/materials/{material.pk}/products/'),
+        Endpoint('cache-stats', '/api/cache/stats/'),
+        Endpoint('stock-bulk', '/api/stock/bulk/', 'POST', lote_stock, admin=True),
+        Endpoint('cart-list', '/api/carts/'),
+        Endpoint('cart-detail', f'/api/carts/{carrito.pk}/'),
+        Endpoint('cart-create', '/api/carts/', 'POST', carrito_nuevo),
+        Endpoint('cartitem-list', '/api/cart-items/'),
+        Endpoint('cartitem-detail', f'/api/cart-items/{item.pk}/'),
+        Endpoint('order-list', '/api/orders/'),
+        Endpoint('order-list-summary', '/api/orders/?view=summary'),
+        Endpoint('order-detail', f'/api/orders/{pedido.pk}/'),
+        Endpoint('order-create', '/api/orders/', 'POST', checkout),
+    ]
+
+
+# -----------------------------
+# Medición
+# -----------------------------
+def percentil(valores, p):
+    """Percentil por rango más cercano"""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def _pedir(cliente, endpoint, con_cache):
+    if not con_cache:
+        # Invalidar y no vaciar: vaciar también borra las marcas de última
+        # modificación y cada request pagaría reconstruirlas. Alcanza con la
+        # tabla de productos (todas las respuestas del catálogo dependen de ella);
+        # invalidar también las de referencia haría releerlas en cada request
+        invalidar(Product._meta.label_lower)
+    datos = endpoint.cuerpo()
+    medicion = Medicion()
+    with connection.execute_wrapper(medicion):
+        inicio = time.perf_counter()
+        response = cliente.generic(
+            endpoint.metodo, endpoint.url, json.dumps(datos) if datos is not None else '',
+            content_type='application/json',
+        )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        duracion = time.perf_counter() - inicio
+    return response.status_code, duracion, medicion.consultas
+
+
+def medir(endpoint, cliente, repeticiones=REPETICIONES, con_cache=False):
+    _pedir(cliente, endpoint, con_cache)
+    estados, tiempos, consultas = set(), [], []
+    for _ in range(repeticiones):
+        estado, duracion, cantidad = _pedir(cliente, endpoint, con_cache)
+        estados.add(estado)
+        tiempos.append(duracion * 1000)
+        consultas.append(cantidad)
+
+    tracemalloc.start()
+    try:
+        _pedir(cliente, endpoint, con_cache)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'metodo': endpoint.metodo,
+        'url': endpoint.url,
+        'estados': sorted(estados),
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'consultas': max(consultas),
+        'memoria_pico_kb': round(pico / 1024, 1),
+    }
+
+
+def correr(repeticiones=REPETICIONES, con_cache=False, solo=None, parametros=None):
+    """Mide todos los endpoints (o los que contienen alguno de los textos de solo)"""
+    anonimo = Client()
+    admin = Client()
+    usuario, _ = User.objects.get_or_create(username='bench', defaults={'is_staff': True, 'is_superuser': True})
+    admin.force_login(usuario)
+
+    resultados = {}
+    for endpoint in endpoints():
+        if solo and not any(texto in endpoint.nombre for texto in solo):
+            continue
+        cliente = admin if endpoint.admin else anonimo
+        resultados[endpoint.nombre] = medir(endpoint, cliente, repeticiones, con_cache)
+    return {
+        'meta': {
+            'python': platform.python_version(), 'django': django.get_version(),
+            'base': connection.vendor, 'repeticiones': repeticiones, 'con_cache': con_cache,
+            'catalogo': parametros or {},
+        },
+        'endpoints': resultados,
+    }
+
+
+# -----------------------------
+# Comparación con la línea base
+# -----------------------------
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    """Lista de regresiones (textos) de resultados respecto de base"""
+    regresiones = []
+    actuales = resultados['endpoints']
+    for nombre, anterior in sorted(base['endpoints'].items()):
+        actual = actuales.get(nombre)
+        if actual is None:
+            continue
+        if any(estado >= 400 for estado in actual['estados']):
+            regresiones.append(f'{nombre}: respondió {actual["estados"]}')
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append(f'{nombre}: {actual["consultas"]} consultas (base {anterior["consultas"]})')
+        # La mediana: con pocas repeticiones el p95 es una sola muestra y varía mucho
+        limite = anterior['p50_ms'] * (1 + tolerancia)
+        if actual['p50_ms'] > limite and actual['p50_ms'] - anterior['p50_ms'] > MINIMO_MS:
+            regresiones.append(f'{nombre}: p50 {actual["p50_ms"]:.1f} ms (base {anterior["p50_ms"]:.1f} ms)')
+        if actual['memoria_pico_kb'] > anterior['memoria_pico_kb'] * (1 + tolerancia):
+            regresiones.append(
+                f'{nombre}: memoria {actual["memoria_pico_kb"]:.0f} KB (base {anterior["memoria_pico_kb"]:.0f} KB)'
+            )
+    return regresiones
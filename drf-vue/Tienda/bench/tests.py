@@ -0,0 +1,128 @@
+import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from cart.models import Cart
+from order.models import Order, OrderLine
+from products.models import Product, ProductoTalle
+from reports.models import VentaDiaria
+from .carga import comparar_en_proceso
+from .concurrencia import ALIAS, base_temporal, carga_mixta
+from .catalogo import generar_catalogo, sembrar
+from .runner import comparar, correr, percentil
+
+HOY = datetime.date(2026, 1, 15)
+
+
+class CatalogoSinteticoTest(TestCase):
+    def test_determinista(self):
+        self.assertEqual(generar_catalogo(50, semilla=7, hoy=HOY), generar_catalogo(50, semilla=7, hoy=HOY))
+        self.assertNotEqual(generar_catalogo(50, semilla=7, hoy=HOY), generar_catalogo(50, semilla=8, hoy=HOY))
+
+    def test_sembrar(self):
+        catalogo = generar_catalogo(productos=30, imagenes=2, carritos=10, pedidos=6, hoy=HOY)
+        cantidades = sembrar(catalogo)
+        self.assertEqual(cantidades['productos'], 30)
+        self.assertEqual(cantidades['imagenes'], 60)
+        self.assertEqual(Cart.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 6)
+
+        # Lo que mantienen las señales quedó calculado
+        producto = Product.objects.order_by('pk').first()
+        self.assertEqual(producto.total_stock, sum(catalogo['productos'][0]['talles'].values()))
+        self.assertFalse(Order.objects.filter(importe_total__isnull=True).exists())
+        self.assertTrue(OrderLine.objects.exists())
+        completados = [p for p in catalogo['pedidos'] if p['completado']]
+        self.assertEqual(sum(VentaDiaria.objects.values_list('pedidos', flat=True)), len(completados))
+        self.assertEqual(ProductoTalle.objects.count(), 30 * 3)
+
+
+class RunnerTest(TestCase):
+    def test_todos_los_endpoints_responden(self):
+        # Confirmado: las versiones del cache y las tablas de referencia cambian al commit
+        with self.captureOnCommitCallbacks(execute=True):
+            sembrar(generar_catalogo(productos=20, imagenes=2, carritos=6, pedidos=3, hoy=HOY))
+        resultados = correr(repeticiones=2)
+        endpoints = resultados['endpoints']
+        self.assertIn('products-export', endpoints)
+        self.assertIn('order-create', endpoints)
+        for nombre, fila in endpoints.items():
+            with self.subTest(endpoint=nombre):
+                self.assertTrue(all(estado < 400 for estado in fila['estados']), fila['estados'])
+                self.assertGreater(fila['memoria_pico_kb'], 0)
+        self.assertEqual(endpoints['order-list-summary']['consultas'], 1)
+        self.assertEqual(comparar(resultados, resultados), [])
+
+        solo = correr(repeticiones=1, solo=['categories'])
+        self.assertTrue(solo['endpoints'] and all('categories' in nombre for nombre in solo['endpoints']))
+
+    def test_comparar(self):
+        def resultado(p50, consultas, memoria=100):
+            return {'endpoints': {'products-list': {
+                'estados': [200], 'p50_ms': p50, 'p95_ms': p50, 'consultas': consultas, 'memoria_pico_kb': memoria,
+            }}}
+
+        base = resultado(10.0, 4)
+        self.assertEqual(comparar(resultado(12.0, 4), base), [])
+        self.assertEqual(len(comparar(resultado(10.0, 5), base)), 1)
+        self.assertEqual(len(comparar(resultado(20.0, 4, memoria=200), base)), 2)
+        # Diferencias de menos de un milisegundo son ruido
+        self.assertEqual(comparar(resultado(0.9, 4), resultado(0.5, 4)), [])
+
+    def test_percentil(self):
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 95), 95)
+        self.assertEqual(percentil([3.0], 95), 3.0)
+
+
+class CargaTest(TransactionTestCase):
+    # Los hilos de la versión WSGI abren sus propias conexiones: los datos tienen que estar commiteados
+
+    def test_wsgi_y_asgi_responden(self):
+        sembrar(generar_catalogo(productos=20, imagenes=1, carritos=2, pedidos=1, hoy=HOY))
+        resultados = comparar_en_proceso(concurrencia=3, total=12)
+        for version in ('wsgi', 'asgi'):
+            with self.subTest(version=version):
+                fila = resultados[version]
+                self.assertEqual(fila['requests'], 12)
+                self.assertEqual(fila['errores'], 0)
+                self.assertGreater(fila['rps'], 0)
+                self.assertLessEqual(fila['p50_ms'], fila['p99_ms'])
+
+
+class PerfilSqliteTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El perfil se prueba en una base aparte: los tests corren con el de SQLITE_PERFIL
+        cls.databases = cls.databases | {ALIAS}
+
+    def test_pragmas_del_perfil(self):
+        with base_temporal(settings.SQLITE_PERFILES['produccion']):
+            conexion = connections[ALIAS]
+            with conexion.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conexion.transaction_mode, 'IMMEDIATE')
+            self.assertTrue(conexion.settings_dict['CONN_HEALTH_CHECKS'])
+
+
+class CargaMixtaTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # carga_mixta() crea su propia base con el alias ALIAS, que no está en DATABASES
+        cls.databases = cls.databases | {ALIAS}
+
+    def test_carga_mixta(self):
+        # Con BEGIN IMMEDIATE y busy timeout ningún checkout falla con "database is locked"
+        resultado = carga_mixta(settings.SQLITE_PERFILES['produccion'], lectores=4, escritores=4, segundos=0.5)
+        self.assertEqual(resultado['errores'], 0)
+        self.assertGreater(resultado['lecturas'], 0)
+        self.assertGreater(resultado['escrituras'], 0)
+        self.assertEqual(resultado['pedidos'], resultado['escrituras'])
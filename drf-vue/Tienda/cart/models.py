@@ -1,5 +1,36 @@
+from collections import defaultdict
+from decimal import Decimal
 from django.db import models
-from products.models import Product, Color, Talle
+from django.db.models import Case, DecimalField, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from products.models import Product, Color, Talle, ProductoTalle, ProductoColor, refresco_diferido
+
+MONTO = DecimalField(max_digits=12, decimal_places=2)
+
+
+def precio_final(prefijo=''):
+    """sale_price si hay descuento, si no price (mismo criterio que Product.is_on_sale) como expresión SQL"""
+    price, sale_price = F(f'{prefijo}price'), F(f'{prefijo}sale_price')
+    return Case(
+        When(Q(**{f'{prefijo}sale_price__isnull': False}) & Q(**{f'{prefijo}sale_price__lt': price}), then=sale_price),
+        default=price,
+    )
+
+
+class StockInsuficiente(Exception):
+    """Algún item del carrito pide más unidades de las que hay"""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__(f'Stock insuficiente: {faltantes}')
+
+
+class CartItemQuerySet(models.QuerySet):
+    def for_serializer(self):
+        """Todo lo que usa CartItemSerializer (producto completo incluido) en consultas fijas"""
+        # Color y talle salen del cache de referencias (products/referencias.py)
+        return self.prefetch_related(Prefetch('product', queryset=Product.objects.with_catalog_data()))
+
 
 class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -8,6 +39,14 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listado de CartItemViewSet: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='cartitem_created_at_idx'),
+        ]
+
     def subtotal(self):
         # Usa sale_price si hay descuento
         price = self.product.sale_price if self.product.is_on_sale else self.product.price
@@ -16,13 +55,86 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.product.name} ({self.quantity})"
 
+def total_de_carrito(carrito):
+    """Subconsulta con la suma de precio final × cantidad del carrito (carrito: OuterRef al id)"""
+    items = Cart.items.through.objects.filter(cart=carrito).order_by().values('cart')
+    return Coalesce(
+        Subquery(items.annotate(
+            total=Sum(precio_final('cartitem__product__') * F('cartitem__quantity'), output_field=MONTO)
+        ).values('total')),
+        Value(Decimal('0')), output_field=MONTO,
+    )
+
+
+def unidades_de_carrito(carrito):
+    """Subconsulta con la cantidad de unidades (suma de quantity) del carrito"""
+    items = Cart.items.through.objects.filter(cart=carrito).order_by().values('cart')
+    return Coalesce(Subquery(items.annotate(unidades=Sum('cartitem__quantity')).values('unidades')), Value(0))
+
+
+class CartQuerySet(models.QuerySet):
+    def con_total(self):
+        """Anota total_calculado: suma de precio final × cantidad, calculada en la base"""
+        return self.annotate(total_calculado=total_de_carrito(OuterRef('pk')))
+
+    def for_serializer(self):
+        """Total anotado e items con su producto precargados: cantidad fija de consultas"""
+        return self.con_total().prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.for_serializer().order_by('id'))
+        )
+
+
 class Cart(models.Model):
     items = models.ManyToManyField(CartItem)
     created_at = models.DateTimeField(auto_now_add=True)
     completed = models.BooleanField(default=False)  # compra finalizada
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listado de CartViewSet: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='cart_created_at_idx'),
+        ]
+
     def total(self):
+        # Con con_total() el total ya viene calculado por la base
+        if hasattr(self, 'total_calculado'):
+            return self.total_calculado
         return sum(item.subtotal() for item in self.items.all())
 
+    def reservar_stock(self):
+        """
+        Descuenta el stock de todos los items con UPDATE condicionales
+        (stock = stock - n WHERE stock >= n), sin leer y reescribir en Python.
+        Tiene que correr dentro de transaction.atomic(): si algún item no alcanza
+        se lanza StockInsuficiente y la transacción revierte todo.
+        total_stock/etiqueta se recalculan una sola vez al final.
+        Un item sin talle ni color no descuenta de ninguna fila: se rechaza.
+        """
+        por_talle = defaultdict(int)
+        por_color = defaultdict(int)
+        faltantes = []
+        for producto_id, talle_id, color_id, cantidad in self.items.values_list(
+            'product_id', 'talle_id', 'color_id', 'quantity'
+        ):
+            if talle_id:
+                por_talle[(producto_id, talle_id)] += cantidad
+            if color_id:
+                por_color[(producto_id, color_id)] += cantidad
+            if not talle_id and not color_id:
+                faltantes.append({'product_id': producto_id, 'quantity': cantidad, 'detalle': 'Falta elegir talle o color'})
+
+        with refresco_diferido():
+            for modelo, campo, pedidos in ((ProductoTalle, 'talle_id', por_talle), (ProductoColor, 'color_id', por_color)):
+                for (producto_id, valor_id), cantidad in pedidos.items():
+                    actualizados = modelo.objects.filter(
+                        producto_id=producto_id, stock__gte=cantidad, **{campo: valor_id}
+                    ).update(stock=F('stock') - cantidad)
+                    if not actualizados:
+                        faltantes.append({'product_id': producto_id, campo: valor_id, 'quantity': cantidad})
+            if faltantes:
+                raise StockInsuficiente(faltantes)
+
     def __str__(self):
         return f"Carrito {self.id} - {'Completado' if self.completed else 'Activo'}"
@@ -1,26 +1,71 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Cart, CartItem
 from products.serializers import ProductSerializer
 from products.models import Product, Color, Talle
-from products.serializers import ColorSerializer, TalleSerializer
+from products.referencias import referencias
+from products.serializers import ColorSerializer, ReferenciaField, TalleSerializer
+
+class LotePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Usa los objetos que CartItemListSerializer ya trajo en bloque; si no están, consulta como siempre"""
+
+    def to_internal_value(self, data):
+        lote = self.context.get('lotes', {}).get(self.queryset.model)
+        if lote is not None and isinstance(data, (int, str)) and str(data).isdigit():
+            obj = lote.get(int(data))
+            if obj is not None:
+                return obj
+        return super().to_internal_value(data)
+
+
+class ReferenciaPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Valida colores y talles contra el cache de referencias (products/referencias.py), sin consultar"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, (int, str)) and str(data).isdigit():
+            obj = referencias(self.context).obtener(self.queryset.model, int(data))
+            if obj is None:
+                self.fail('does_not_exist', pk_value=data)
+            return obj
+        return super().to_internal_value(data)
+
+
+class CartItemListSerializer(serializers.ListSerializer):
+    """Valida una lista de items con una consulta para todos los productos en vez de una por item"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            lotes = self.context.setdefault('lotes', {})
+            # Colores y talles salen del cache de referencias
+            field = self.child.fields['product_id']
+            ids = {
+                int(item['product_id']) for item in data
+                if isinstance(item, dict) and isinstance(item.get('product_id'), (int, str))
+                and str(item['product_id']).isdigit()
+            }
+            if ids:
+                lotes.setdefault(field.queryset.model, {}).update(field.get_queryset().in_bulk(ids))
+        return super().to_internal_value(data)
+
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(
+    product_id = LotePrimaryKeyRelatedField(
         queryset=Product.objects.all(), source='product', write_only=True
     )
-    color = ColorSerializer(read_only=True)
-    color_id = serializers.PrimaryKeyRelatedField(
+    color = ReferenciaField(Color, ColorSerializer, source='color_id')
+    color_id = ReferenciaPrimaryKeyRelatedField(
         queryset=Color.objects.all(), source='color', write_only=True, allow_null=True, required=False
     )
-    talle = TalleSerializer(read_only=True)
-    talle_id = serializers.PrimaryKeyRelatedField(
+    talle = ReferenciaField(Talle, TalleSerializer, source='talle_id')
+    talle_id = ReferenciaPrimaryKeyRelatedField(
         queryset=Talle.objects.all(), source='talle', write_only=True, allow_null=True, required=False
     )
 
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'product_id', 'color', 'color_id', 'talle', 'talle_id', 'quantity', 'subtotal']
+        list_serializer_class = CartItemListSerializer
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True)
@@ -29,10 +74,14 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'items', 'total', 'completed', 'created_at']
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         cart = Cart.objects.create(**validated_data)
-        for item_data in items_data:
-            item = CartItem.objects.create(**item_data)
-            cart.items.add(item)
-        return cart
+        # Un INSERT para los items y otro para la tabla intermedia, sin importar cuántos sean
+        items = CartItem.objects.bulk_create([CartItem(**item_data) for item_data in items_data])
+        Cart.items.through.objects.bulk_create([
+            Cart.items.through(cart_id=cart.pk, cartitem_id=item.pk) for item in items
+        ])
+        # La respuesta se arma con el total y los productos precargados
+        return Cart.objects.for_serializer().get(pk=cart.pk)
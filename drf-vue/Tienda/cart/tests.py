@@ -1,3 +1,112 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from products.models import Category, Color, Material, Product, ProductImage, ProductoColor, ProductoTalle, Talle
+from .models import Cart, CartItem
+
+
+class CartTestMixin:
+    def setUp(self):
+        self.client = APIClient()
+        # Confirmadas: las versiones del cache y las tablas de referencia cambian al commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.talle = Talle.objects.create(name='M')
+            self.color = Color.objects.create(name='Negro')
+            category = Category.objects.create(name='Remeras')
+            material = Material.objects.create(name='Algodón')
+        self.productos = []
+        for i in range(10):
+            # Los pares están en promoción
+            producto = Product.objects.create(
+                name=f'Producto {i}', category=category, material=material,
+                price=1000 + i, price_cost=500, sale_price=800 if i % 2 == 0 else None,
+            )
+            ProductImage.objects.create(product=producto, image=f'https://img.test/{i}.jpg')
+            ProductoTalle.objects.create(producto=producto, talle=self.talle, stock=10)
+            ProductoColor.objects.create(producto=producto, color=self.color, stock=10)
+            self.productos.append(producto)
+
+    def datos_items(self, cantidad):
+        return [
+            {'product_id': self.productos[i % 10].pk, 'talle_id': self.talle.pk,
+             'color_id': self.color.pk, 'quantity': i % 3 + 1}
+            for i in range(cantidad)
+        ]
+
+
+class CartCreateTest(CartTestMixin, TestCase):
+    def crear(self, cantidad):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/carts/', {'items': self.datos_items(cantidad)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_consultas_no_crecen_con_los_items(self):
+        _, pocos = self.crear(2)
+        data, muchos = self.crear(50)
+        self.assertEqual(len(data['items']), 50)
+        self.assertEqual(pocos, muchos)
+
+    def test_total_calculado_en_la_base(self):
+        data, _ = self.crear(50)
+        carrito = Cart.objects.get(pk=data['id'])
+        esperado = sum(item.subtotal() for item in carrito.items.all())
+        self.assertEqual(Decimal(str(data['total'])), esperado)
+        self.assertEqual(Cart.objects.con_total().get(pk=carrito.pk).total_calculado, esperado)
+
+    def test_producto_inexistente(self):
+        items = self.datos_items(2) + [{'product_id': 999999, 'quantity': 1}]
+        response = self.client.post('/api/carts/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class CartQueryCountTest(CartTestMixin, TestCase):
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_detalle_con_consultas_fijas(self):
+        chico = self.client.post('/api/carts/', {'items': self.datos_items(2)}, format='json').json()
+        grande = self.client.post('/api/carts/', {'items': self.datos_items(50)}, format='json').json()
+        self.assertEqual(
+            self.contar_consultas(f'/api/carts/{chico["id"]}/'),
+            self.contar_consultas(f'/api/carts/{grande["id"]}/'),
+        )
+
+    def test_listados_con_consultas_fijas(self):
+        self.client.post('/api/carts/', {'items': self.datos_items(2)}, format='json')
+        for url in ['/api/carts/', '/api/cart-items/']:
+            with self.subTest(url=url):
+                pocos = self.contar_consultas(url)
+                self.client.post('/api/carts/', {'items': self.datos_items(20)}, format='json')
+                self.assertEqual(self.contar_consultas(url), pocos)
+
+    def test_carrito_vacio_total_cero(self):
+        carrito = Cart.objects.create()
+        data = self.client.get(f'/api/carts/{carrito.pk}/').json()
+        self.assertEqual(Decimal(str(data['total'])), 0)
+
+
+class CartReferenciasTest(CartTestMixin, TestCase):
+    def test_talle_y_color_sin_consultas(self):
+        # La primera lectura de las tablas de referencia ya ocurrió al crearlas (señales)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/carts/', {'items': self.datos_items(3)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        item = response.json()['items'][0]
+        self.assertEqual(item['talle']['name'], 'M')
+        self.assertEqual(item['color']['name'], 'Negro')
+        tablas = ('"products_talle"', '"products_color"')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in tablas)])
 
-# Create your tests here.
+    def test_talle_inexistente(self):
+        items = [{'product_id': self.productos[0].pk, 'talle_id': 999999, 'quantity': 1}]
+        response = self.client.post('/api/carts/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('talle_id', response.json()['items'][0])
@@ -1,11 +1,15 @@
 from rest_framework import viewsets
+from Tienda.metricas import SerializacionMedidaMixin
+from Tienda.pagination import CartCursorPagination
 from .models import Cart, CartItem
 from .serializers import CartSerializer, CartItemSerializer
 
-class CartViewSet(viewsets.ModelViewSet):
-    queryset = Cart.objects.all()
+class CartViewSet(SerializacionMedidaMixin, viewsets.ModelViewSet):
+    queryset = Cart.objects.for_serializer().order_by('-created_at', '-id')
     serializer_class = CartSerializer
+    pagination_class = CartCursorPagination
 
-class CartItemViewSet(viewsets.ModelViewSet):
-    queryset = CartItem.objects.all()
+class CartItemViewSet(SerializacionMedidaMixin, viewsets.ModelViewSet):
+    queryset = CartItem.objects.for_serializer().order_by('-created_at', '-id')
     serializer_class = CartItemSerializer
+    pagination_class = CartCursorPagination
@@ -1,8 +1,19 @@
 from django.contrib import admin
-from .models import Order
+from .models import Order, OrderLine
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    can_delete = False
+    fields = ["producto_nombre", "talle_nombre", "color_nombre", "cantidad", "precio_unitario", "en_promocion", "subtotal"]
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ["id", "cliente_nombre", "metodo_envio", "metodo_pago", "creado_en", "completado"]
     list_filter = ["metodo_envio", "metodo_pago", "completado"]
     search_fields = ["cliente_nombre", "cliente_telefono"]
+    inlines = [OrderLineInline]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-creado_en', 'id'], name='order_creado_en_idx'),
+        ),
+    ]
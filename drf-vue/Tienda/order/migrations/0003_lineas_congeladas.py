@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:43
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def congelar_existentes(apps, schema_editor):
+    # Los pedidos anteriores se congelan con los precios actuales (los de su momento no se guardaron).
+    # Copia de order.models.congelar_pedidos en este momento: no depende de cómo cambie después
+    Order = apps.get_model('order', 'Order')
+    OrderLine = apps.get_model('order', 'OrderLine')
+    Through = apps.get_model('cart', 'Cart').items.through
+    pedidos = Order.objects.filter(importe_total__isnull=True)
+    filas = Through.objects.filter(cart__pedido__in=pedidos).order_by('cart__pedido', 'cartitem_id').values_list(
+        'cart__pedido', 'cart__pedido__creado_en', 'cartitem__product_id', 'cartitem__product__name',
+        'cartitem__talle__name', 'cartitem__color__name', 'cartitem__quantity',
+        'cartitem__product__price', 'cartitem__product__sale_price',
+    )
+    lineas = []
+    for pedido_id, creado_en, producto_id, nombre, talle, color, cantidad, price, sale_price in filas:
+        en_promocion = sale_price is not None and sale_price < price
+        precio = sale_price if en_promocion else price
+        lineas.append(OrderLine(
+            pedido_id=pedido_id, creado_en=creado_en, producto_id=producto_id, producto_nombre=nombre,
+            talle_nombre=talle or '', color_nombre=color or '', cantidad=cantidad,
+            precio_unitario=precio, en_promocion=en_promocion, subtotal=precio * cantidad,
+        ))
+    OrderLine.objects.bulk_create(lineas)
+
+    de_cada_pedido = OrderLine.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    pedidos.update(
+        importe_total=Coalesce(Subquery(de_cada_pedido.annotate(t=Sum('subtotal')).values('t')), Value(Decimal('0'))),
+        cantidad_unidades=Coalesce(Subquery(de_cada_pedido.annotate(u=Sum('cantidad')).values('u')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0002_indices_de_consulta'),
+        ('products', '0009_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cantidad_unidades',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Unidades'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='importe_total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Total'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_nombre', models.CharField(max_length=255)),
+                ('talle_nombre', models.CharField(blank=True, max_length=255)),
+                ('color_nombre', models.CharField(blank=True, max_length=255)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('en_promocion', models.BooleanField(default=False)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('creado_en', models.DateTimeField()),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='order.order')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Línea de pedido',
+                'verbose_name_plural': 'Líneas de pedido',
+                'indexes': [models.Index(fields=['creado_en'], name='orderline_creado_en_idx'), models.Index(fields=['producto', 'creado_en'], name='orderline_producto_idx')],
+            },
+        ),
+        migrations.RunPython(congelar_existentes, migrations.RunPython.noop),
+    ]
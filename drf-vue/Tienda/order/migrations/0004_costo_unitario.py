@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def costo_de_lineas_existentes(apps, schema_editor):
+    # Las líneas ya congeladas toman el costo actual del producto (el de su momento no se guardó)
+    OrderLine = apps.get_model('order', 'OrderLine')
+    Product = apps.get_model('products', 'Product')
+    costo = Product.objects.filter(pk=OuterRef('producto_id')).values('price_cost')[:1]
+    OrderLine.objects.filter(producto__isnull=False).update(costo_unitario=Coalesce(Subquery(costo), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_lineas_congeladas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='costo_unitario',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(costo_de_lineas_existentes, migrations.RunPython.noop),
+    ]
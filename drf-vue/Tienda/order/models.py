@@ -1,6 +1,62 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import F, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from cart.models import Cart
+from cart.models import Cart, CartItem, MONTO, total_de_carrito, unidades_de_carrito
+
+
+def congelar_pedidos(pedidos, modelo_linea):
+    """
+    Copia los items del carrito de cada pedido a líneas con precio, nombres y
+    subtotal fijos, y guarda importe_total/cantidad_unidades en el pedido.
+    """
+    Through = pedidos.model._meta.get_field('carrito').related_model.items.through
+    filas = Through.objects.filter(cart__pedido__in=pedidos).order_by('cart__pedido', 'cartitem_id').values_list(
+        'cart__pedido', 'cart__pedido__creado_en', 'cartitem__product_id', 'cartitem__product__name',
+        'cartitem__talle__name', 'cartitem__color__name', 'cartitem__quantity',
+        'cartitem__product__price', 'cartitem__product__sale_price', 'cartitem__product__price_cost',
+    )
+    lineas = []
+    for pedido_id, creado_en, producto_id, nombre, talle, color, cantidad, price, sale_price, costo in filas:
+        en_promocion = sale_price is not None and sale_price < price
+        precio = sale_price if en_promocion else price
+        lineas.append(modelo_linea(
+            pedido_id=pedido_id, creado_en=creado_en, producto_id=producto_id, producto_nombre=nombre,
+            talle_nombre=talle or '', color_nombre=color or '', cantidad=cantidad,
+            precio_unitario=precio, en_promocion=en_promocion, subtotal=precio * cantidad, costo_unitario=costo,
+        ))
+    modelo_linea.objects.bulk_create(lineas)
+
+    de_cada_pedido = modelo_linea.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    return pedidos.update(
+        importe_total=Coalesce(Subquery(de_cada_pedido.annotate(t=Sum('subtotal')).values('t')), Value(Decimal('0'))),
+        cantidad_unidades=Coalesce(Subquery(de_cada_pedido.annotate(u=Sum('cantidad')).values('u')), Value(0)),
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+    def congelar(self):
+        # Solo los que no tienen líneas todavía: congelar dos veces no duplica
+        return congelar_pedidos(self.filter(importe_total__isnull=True), OrderLine)
+
+    def con_total(self):
+        """
+        Anota total_calculado y cantidad_items (unidades). Salen de las columnas
+        congeladas; solo un pedido sin congelar se calcula desde el carrito.
+        """
+        return self.annotate(
+            total_calculado=Coalesce(F('importe_total'), total_de_carrito(OuterRef('carrito_id')), output_field=MONTO),
+            cantidad_items=Coalesce(F('cantidad_unidades'), unidades_de_carrito(OuterRef('carrito_id'))),
+        )
+
+    def for_serializer(self):
+        """Pedido con líneas, carrito, items y productos precargados: cantidad fija de consultas"""
+        return self.con_total().select_related('carrito').prefetch_related(
+            Prefetch('lineas', queryset=OrderLine.objects.order_by('id')),
+            Prefetch('carrito__items', queryset=CartItem.objects.for_serializer().order_by('id')),
+        )
+
 
 class Order(models.Model):
     METODOS_ENVIO = [
@@ -37,8 +93,57 @@ class Order(models.Model):
     creado_en = models.DateTimeField(default=timezone.now)
     completado = models.BooleanField(default=False)
 
+    # Congelados en el checkout (ver OrderLine); null en pedidos sin congelar
+    importe_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False, verbose_name="Total")
+    cantidad_unidades = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Unidades")
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listado de pedidos (OrderCursorPagination): ORDER BY creado_en DESC, id
+            models.Index(fields=['-creado_en', 'id'], name='order_creado_en_idx'),
+        ]
+
     def total(self):
+        if self.importe_total is not None:
+            return self.importe_total
+        # Con con_total() el total ya viene calculado por la base
+        if hasattr(self, 'total_calculado'):
+            return self.total_calculado
         return self.carrito.total()
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.cliente_nombre}"
+
+
+class OrderLine(models.Model):
+    """
+    Línea de un pedido tal como se compró: precio, nombres y subtotal copiados
+    del catálogo en el checkout. Los cambios de precio posteriores no la afectan
+    y los reportes leen esta tabla sin unir con productos.
+    """
+    pedido = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lineas")
+    producto = models.ForeignKey('products.Product', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    producto_nombre = models.CharField(max_length=255)
+    talle_nombre = models.CharField(max_length=255, blank=True)
+    color_nombre = models.CharField(max_length=255, blank=True)
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    en_promocion = models.BooleanField(default=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    # price_cost del producto al momento de la compra (margen en los reportes)
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Copia de pedido.creado_en para filtrar reportes por fecha en esta misma tabla
+    creado_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Línea de pedido"
+        verbose_name_plural = "Líneas de pedido"
+        indexes = [
+            models.Index(fields=['creado_en'], name='orderline_creado_en_idx'),
+            models.Index(fields=['producto', 'creado_en'], name='orderline_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_nombre} x{self.cantidad}"
@@ -1,10 +1,20 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Order
+from .models import Order, OrderLine
 from cart.serializers import CartSerializer
-from cart.models import Cart
+from cart.models import Cart, StockInsuficiente
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = [
+            "producto", "producto_nombre", "talle_nombre", "color_nombre",
+            "cantidad", "precio_unitario", "en_promocion", "subtotal"
+        ]
 
 class OrderSerializer(serializers.ModelSerializer):
     carrito = CartSerializer(read_only=True)
+    lineas = OrderLineSerializer(many=True, read_only=True)
     carrito_id = serializers.PrimaryKeyRelatedField(
         queryset=Cart.objects.all(), source="carrito", write_only=True
     )
@@ -15,6 +25,41 @@ class OrderSerializer(serializers.ModelSerializer):
             "id", "cliente_nombre", "cliente_telefono",
             "metodo_envio", "metodo_pago",
             "opcion_entrega", "fecha_entrega",
-            "carrito", "carrito_id",
+            "carrito", "carrito_id", "lineas",
             "creado_en", "completado", "total"
         ]
+
+    def create(self, validated_data):
+        """Checkout: marca el carrito como comprado y descuenta el stock, todo o nada"""
+        carrito = validated_data['carrito']
+        with transaction.atomic():
+            # UPDATE condicional: dos checkouts simultáneos del mismo carrito no pasan los dos
+            if not Cart.objects.filter(pk=carrito.pk, completed=False).update(completed=True):
+                raise serializers.ValidationError({'carrito_id': 'El carrito ya fue comprado'})
+            try:
+                carrito.reservar_stock()
+            except StockInsuficiente as e:
+                raise serializers.ValidationError({'carrito_id': 'Stock insuficiente', 'faltantes': e.faltantes})
+            carrito.completed = True
+            pedido = super().create(validated_data)
+            # Precios y nombres quedan fijos desde este momento
+            Order.objects.filter(pk=pedido.pk).congelar()
+        # La respuesta anida el carrito completo: se arma con todo precargado
+        return Order.objects.for_serializer().get(pk=pedido.pk)
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Cabecera del pedido con total y unidades, sin anidar carrito ni productos (?view=summary)"""
+    total = serializers.DecimalField(source='total_calculado', max_digits=12, decimal_places=2, read_only=True)
+    cantidad_items = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            "id", "cliente_nombre", "cliente_telefono",
+            "metodo_envio", "metodo_pago",
+            "opcion_entrega", "fecha_entrega",
+            "carrito_id", "creado_en", "completado",
+            "total", "cantidad_items"
+        ]
+        read_only_fields = fields
@@ -1,3 +1,311 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from products.models import Category, Color, Material, Product, ProductoColor, ProductoTalle, Talle
+from products.tests import full_scans
+from .models import Order, OrderLine
+from .serializers import OrderSerializer
+
+
+def crear_pedido(**kwargs):
+    datos = {
+        'cliente_nombre': 'Cliente', 'metodo_envio': 'olmos',
+        'metodo_pago': 'efectivo', 'carrito': Cart.objects.create(),
+    }
+    datos.update(kwargs)
+    return Order.objects.create(**datos)
+
+
+class OrderPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cursor_del_mas_nuevo_al_mas_viejo(self):
+        ahora = timezone.now()
+        pedidos = [crear_pedido(creado_en=ahora - timedelta(hours=i)) for i in range(5)]
+
+        ids, url = [], '/api/orders/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [o['id'] for o in data['results']]
+            url = data['next']
+
+        self.assertEqual(ids, [p.id for p in pedidos])
+
+
+class OrderQueryPlanTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        ahora = timezone.now()
+        carritos = Cart.objects.bulk_create([Cart() for _ in range(500)])
+        Order.objects.bulk_create([
+            Order(cliente_nombre=f'Cliente {i}', metodo_envio='olmos', metodo_pago='efectivo',
+                  carrito=carrito, creado_en=ahora - timedelta(minutes=i))
+            for i, carrito in enumerate(carritos)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_listados_usan_indices(self):
+        for url in ['/api/orders/', '/api/carts/']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertEqual(full_scans(ctx.captured_queries), [])
+
+
+# -----------------------------
+# Reserva de stock en el checkout
+# -----------------------------
+def crear_producto_con_stock(stock_talle, stock_color):
+    talle, _ = Talle.objects.get_or_create(name='M')
+    color, _ = Color.objects.get_or_create(name='Negro')
+    producto = Product.objects.create(
+        name='Remera', category=Category.objects.create(name='Remeras'),
+        material=Material.objects.create(name='Algodón'), price=1000, price_cost=500,
+    )
+    ProductoTalle.objects.create(producto=producto, talle=talle, stock=stock_talle)
+    ProductoColor.objects.create(producto=producto, color=color, stock=stock_color)
+    return producto, talle, color
+
+
+def crear_carrito(*lineas):
+    """lineas: (producto, talle, color, cantidad)"""
+    carrito = Cart.objects.create()
+    carrito.items.set([
+        CartItem.objects.create(product=producto, talle=talle, color=color, quantity=cantidad)
+        for producto, talle, color, cantidad in lineas
+    ])
+    return carrito
+
+
+def datos_checkout(carrito):
+    return {
+        'cliente_nombre': 'Cliente', 'metodo_envio': 'olmos',
+        'metodo_pago': 'efectivo', 'carrito_id': carrito.pk,
+    }
+
+
+class ReservaStockTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.producto, self.talle, self.color = crear_producto_con_stock(stock_talle=3, stock_color=3)
+
+    def stock(self):
+        return (
+            ProductoTalle.objects.get(producto=self.producto).stock,
+            ProductoColor.objects.get(producto=self.producto).stock,
+        )
+
+    def test_checkout_descuenta_stock_y_completa_el_carrito(self):
+        carrito = crear_carrito((self.producto, self.talle, self.color, 2))
+        response = self.client.post('/api/orders/', datos_checkout(carrito), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), (1, 1))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.total_stock, 1)
+        self.assertEqual(self.producto.etiqueta, 'Última unidad')
+        carrito.refresh_from_db()
+        self.assertTrue(carrito.completed)
+
+    def test_no_vende_mas_de_lo_que_hay(self):
+        carrito = crear_carrito((self.producto, self.talle, self.color, 4))
+        response = self.client.post('/api/orders/', datos_checkout(carrito), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), (3, 3))
+        self.assertFalse(Order.objects.exists())
+        carrito.refresh_from_db()
+        self.assertFalse(carrito.completed)
+
+    def test_una_linea_sin_stock_revierte_todas(self):
+        otro, talle, color = crear_producto_con_stock(stock_talle=1, stock_color=5)
+        carrito = crear_carrito(
+            (self.producto, self.talle, self.color, 2),
+            (otro, talle, color, 2),
+        )
+        response = self.client.post('/api/orders/', datos_checkout(carrito), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), (3, 3))
+        self.assertEqual(ProductoColor.objects.get(producto=otro).stock, 5)
+
+    def test_lineas_repetidas_se_suman(self):
+        carrito = crear_carrito(
+            (self.producto, self.talle, self.color, 2),
+            (self.producto, self.talle, self.color, 2),
+        )
+        response = self.client.post('/api/orders/', datos_checkout(carrito), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), (3, 3))
+
+    def test_item_sin_talle_ni_color(self):
+        carrito = crear_carrito((self.producto, self.talle, self.color, 1), (self.producto, None, None, 1))
+        response = self.client.post('/api/orders/', datos_checkout(carrito), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['faltantes'][0]['detalle'], 'Falta elegir talle o color')
+        self.assertEqual(self.stock(), (3, 3))
+        self.assertFalse(Order.objects.exists())
+
+    def test_el_mismo_carrito_no_se_compra_dos_veces(self):
+        carrito = crear_carrito((self.producto, self.talle, self.color, 1))
+        self.assertEqual(self.client.post('/api/orders/', datos_checkout(carrito), format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/orders/', datos_checkout(carrito), format='json').status_code, 400)
+        self.assertEqual(self.stock(), (2, 2))
+
+
+class ReservaStockConcurrenteTest(TransactionTestCase):
+    """Muchos checkouts a la vez sobre el mismo talle: nunca se vende de más"""
+    STOCK = 5
+    COMPRADORES = 12
+
+    def test_checkouts_concurrentes(self):
+        producto, talle, color = crear_producto_con_stock(stock_talle=self.STOCK, stock_color=100)
+        carritos = [crear_carrito((producto, talle, color, 1)) for _ in range(self.COMPRADORES)]
+        resultados = []
+        barrera = threading.Barrier(self.COMPRADORES)
+
+        def comprar(carrito):
+            try:
+                barrera.wait()
+                serializer = OrderSerializer(data=datos_checkout(carrito))
+                serializer.is_valid(raise_exception=True)
+                for _ in range(50):
+                    try:
+                        serializer.save()
+                        resultados.append('ok')
+                        return
+                    except OperationalError:
+                        # SQLite serializa las escrituras: "database is locked" se reintenta
+                        time.sleep(0.02)
+                resultados.append('bloqueado')
+            except Exception:
+                resultados.append('sin stock')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(c,)) for c in carritos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        vendidos = resultados.count('ok')
+        stock_final = ProductoTalle.objects.get(producto=producto).stock
+        self.assertNotIn('bloqueado', resultados)
+        self.assertEqual(vendidos, self.STOCK)
+        self.assertEqual(stock_final, self.STOCK - vendidos)
+        self.assertEqual(Order.objects.count(), vendidos)
+        self.assertEqual(Cart.objects.filter(completed=True).count(), vendidos)
+        producto.refresh_from_db()
+        self.assertEqual(producto.total_stock, 0)
+
+
+class OrderQueryCountTest(TestCase):
+    """Listar pedidos no debe costar una consulta por pedido, item o producto"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.producto, self.talle, self.color = crear_producto_con_stock(stock_talle=1000, stock_color=1000)
+
+    def crear_pedidos(self, cantidad, items=3):
+        for _ in range(cantidad):
+            carrito = crear_carrito(*[(self.producto, self.talle, self.color, 2)] * items)
+            crear_pedido(carrito=carrito)
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_listados_con_consultas_fijas(self):
+        for url in ['/api/orders/', '/api/orders/?view=summary']:
+            with self.subTest(url=url):
+                Order.objects.all().delete()
+                self.crear_pedidos(2, items=1)
+                pocos = self.contar_consultas(url)
+                self.crear_pedidos(8, items=5)
+                self.assertEqual(self.contar_consultas(url), pocos)
+
+    def test_resumen_una_consulta(self):
+        self.crear_pedidos(5)
+        self.assertEqual(self.contar_consultas('/api/orders/?view=summary'), 1)
+
+    def test_resumen_total_y_unidades(self):
+        self.crear_pedidos(1, items=3)
+        pedido = Order.objects.get()
+        data = self.client.get(f'/api/orders/{pedido.pk}/?view=summary').json()
+        self.assertNotIn('carrito', data)
+        self.assertEqual(data['carrito_id'], pedido.carrito_id)
+        self.assertEqual(data['cantidad_items'], 6)
+        self.assertEqual(data['total'], '6000.00')
+        completo = self.client.get(f'/api/orders/{pedido.pk}/').json()
+        self.assertEqual(Decimal(str(completo['total'])), Decimal(data['total']))
+        self.assertEqual(len(completo['carrito']['items']), 3)
+
+    def test_pedido_sin_items(self):
+        crear_pedido()
+        data = self.client.get('/api/orders/?view=summary').json()['results'][0]
+        self.assertEqual((data['total'], data['cantidad_items']), ('0.00', 0))
+
+
+class OrderLineTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.producto, self.talle, self.color = crear_producto_con_stock(stock_talle=10, stock_color=10)
+        self.producto.sale_price = 800
+        self.producto.save()
+
+    def checkout(self, *lineas):
+        response = self.client.post('/api/orders/', datos_checkout(crear_carrito(*lineas)), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_checkout_congela_lineas(self):
+        data = self.checkout((self.producto, self.talle, self.color, 2))
+        self.assertEqual(data['lineas'], [{
+            'producto': self.producto.pk, 'producto_nombre': 'Remera', 'talle_nombre': 'M',
+            'color_nombre': 'Negro', 'cantidad': 2, 'precio_unitario': '800.00',
+            'en_promocion': True, 'subtotal': '1600.00',
+        }])
+        pedido = Order.objects.get(pk=data['id'])
+        self.assertEqual((pedido.importe_total, pedido.cantidad_unidades), (Decimal('1600.00'), 2))
+
+    def test_cambio_de_precio_no_altera_pedidos(self):
+        data = self.checkout((self.producto, self.talle, self.color, 2))
+        self.producto.sale_price = None
+        self.producto.price = 5000
+        self.producto.name = 'Remera nueva'
+        self.producto.save()
+
+        resumen = self.client.get(f'/api/orders/{data["id"]}/?view=summary').json()
+        self.assertEqual(resumen['total'], '1600.00')
+        completo = self.client.get(f'/api/orders/{data["id"]}/').json()
+        self.assertEqual(Decimal(str(completo['total'])), Decimal('1600.00'))
+        self.assertEqual(completo['lineas'][0]['producto_nombre'], 'Remera')
+
+    def test_resumen_lee_las_columnas_congeladas(self):
+        data = self.checkout((self.producto, self.talle, self.color, 2))
+        CartItem.objects.all().delete()
+        resumen = self.client.get(f'/api/orders/{data["id"]}/?view=summary').json()
+        self.assertEqual((resumen['total'], resumen['cantidad_items']), ('1600.00', 2))
+
+    def test_producto_borrado_conserva_la_linea(self):
+        data = self.checkout((self.producto, self.talle, self.color, 1))
+        self.producto.delete()
+        linea = OrderLine.objects.get(pedido_id=data['id'])
+        self.assertIsNone(linea.producto_id)
+        self.assertEqual((linea.producto_nombre, linea.subtotal), ('Remera', Decimal('800.00')))
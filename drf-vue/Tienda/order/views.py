@@ -1,8 +1,28 @@
 from rest_framework import viewsets
+from Tienda.metricas import SerializacionMedidaMixin
+from Tienda.pagination import OrderCursorPagination
 from .models import Order
-from .serializers import OrderSerializer
+from .serializers import OrderSerializer, OrderSummarySerializer
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SerializacionMedidaMixin, viewsets.ModelViewSet):
+    """
+    Pedidos. Con ?view=summary (listado y detalle) devuelve solo la cabecera,
+    el total y la cantidad de unidades, sin anidar el carrito.
+    """
     queryset = Order.objects.all().order_by("-creado_en")
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
 
+    def es_resumen(self):
+        return self.action in ('list', 'retrieve') and self.request.query_params.get('view') == 'summary'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.es_resumen():
+            return queryset.con_total()
+        return queryset.for_serializer()
+
+    def get_serializer_class(self):
+        if self.es_resumen():
+            return OrderSummarySerializer
+        return super().get_serializer_class()
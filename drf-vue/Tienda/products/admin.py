@@ -1,6 +1,16 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import path, reverse
 from django.utils.html import format_html
 from .models import Category, Material, Product, Talle, Color, ProductoTalle, ProductoColor, ProductImage
+from . import search
+from .catalogo_io import ErrorImportacion, exportar, formato_de, importar_catalogo
 
 
 # -----------------------------
@@ -31,12 +41,47 @@ class ProductoColorInline(admin.TabularInline):
     autocomplete_fields = ['color']
 
 
+# -----------------------------
+# Importación / exportación masiva
+# -----------------------------
+class ImportarCatalogoForm(forms.Form):
+    archivo = forms.FileField(help_text='CSV o JSONL (mismo formato que la exportación)')
+
+
+def _exportar(queryset, formato):
+    response = StreamingHttpResponse(
+        exportar(formato, queryset),
+        content_type='text/csv; charset=utf-8' if formato == 'csv' else 'application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="productos.{formato}"'
+    return response
+
+
+@admin.action(description='Exportar seleccionados a CSV')
+def exportar_csv(modeladmin, request, queryset):
+    return _exportar(queryset, 'csv')
+
+
+@admin.action(description='Exportar seleccionados a JSONL')
+def exportar_jsonl(modeladmin, request, queryset):
+    return _exportar(queryset, 'jsonl')
+
+
 # -----------------------------
 # Admin para Product
 # -----------------------------
+def _suma_stock(modelo):
+    """Subconsulta con la suma del stock de las filas de modelo del producto"""
+    filas = modelo.objects.filter(producto=OuterRef('pk')).order_by().values('producto')
+    return Coalesce(Subquery(filas.annotate(total=Sum('stock')).values('total')), Value(0))
+
+
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'material', 'price', 'sale_price', 'total_stock', 'main_image_preview']
+    list_display = ['name', 'category', 'material', 'price', 'sale_price', 'stock_total', 'main_image_preview']
     list_filter = ['category', 'material']
+    list_select_related = ['category', 'material']
+    actions = [exportar_csv, exportar_jsonl]
+    change_list_template = 'admin/products/product/change_list.html'
     search_fields = ['name', 'description']
     readonly_fields = ['total_stock_display', 'main_image_preview_large', 'profit_margin_display', 'fecha_creacion_display']
     
@@ -57,12 +102,60 @@ class ProductAdmin(admin.ModelAdmin):
 
     inlines = [ProductImageInline, ProductoTalleInline, ProductoColorInline]
 
+    def get_queryset(self, request):
+        # Stock e imagen principal como subconsultas: cantidad fija de consultas por página
+        primera_imagen = ProductImage.objects.filter(product=OuterRef('pk')).order_by('order', 'id').values('image')[:1]
+        return super().get_queryset(request).annotate(
+            stock_talles_colores=Coalesce(
+                _suma_stock(ProductoTalle) + _suma_stock(ProductoColor), Value(0), output_field=IntegerField()
+            ),
+            imagen_principal=Subquery(primera_imagen),
+        )
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='products_product_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            return HttpResponseRedirect(reverse('admin:products_product_changelist'))
+        form = ImportarCatalogoForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                formato = formato_de(archivo.name)
+                texto = io.TextIOWrapper(archivo.file, encoding='utf-8', newline='')
+                creados, actualizados = importar_catalogo(texto, formato)
+            except (ValueError, ErrorImportacion) as e:
+                form.add_error('archivo', str(e))
+            else:
+                self.message_user(
+                    request, f'{creados} productos creados y {actualizados} actualizados', messages.SUCCESS
+                )
+                return HttpResponseRedirect(reverse('admin:products_product_changelist'))
+        return render(request, 'admin/products/product/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar productos',
+            'form': form,
+        })
+
+    # -----------------------------
+    # Búsqueda con el índice de texto completo
+    # -----------------------------
+    def get_search_results(self, request, queryset, search_term):
+        resultados = search.buscar(search_term) if search_term else None
+        if resultados is None:
+            return super().get_search_results(request, queryset, search_term)
+        return resultados.filtrar(queryset), False
+
     # -----------------------------
     # Métodos para imagen principal
     # -----------------------------
     def main_image_preview(self, obj):
         """Vista previa pequeña para la lista de productos"""
-        main_image = obj.main_image
+        main_image = obj.imagen_principal if hasattr(obj, 'imagen_principal') else obj.main_image
         if main_image:
             return format_html('<img src="{}" style="max-height:50px; max-width:50px;" />', main_image)
         return "Sin imagen"
@@ -70,7 +163,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     def main_image_preview_large(self, obj):
         """Vista previa grande para el formulario de edición"""
-        main_image = obj.main_image
+        main_image = obj.imagen_principal if hasattr(obj, 'imagen_principal') else obj.main_image
         if main_image:
             return format_html('<img src="{}" style="max-height:200px; max-width:200px;" />', main_image)
         return "No hay imagen principal"
@@ -79,14 +172,18 @@ class ProductAdmin(admin.ModelAdmin):
     # -----------------------------
     # Stock total (talles + colores)
     # -----------------------------
-    def total_stock(self, obj):
+    # No se llama total_stock: en list_display ganaría el campo Product.total_stock (solo talles)
+    def stock_total(self, obj):
+        if hasattr(obj, 'stock_talles_colores'):
+            return obj.stock_talles_colores
         stock_talles = sum(pt.stock for pt in obj.productotalle_set.all())
         stock_colores = sum(pc.stock for pc in obj.productocolor_set.all())
         return stock_talles + stock_colores
-    total_stock.short_description = 'Stock Total'
+    stock_total.short_description = 'Stock Total'
+    stock_total.admin_order_field = 'stock_talles_colores'
 
     def total_stock_display(self, obj):
-        return self.total_stock(obj)
+        return self.stock_total(obj)
     total_stock_display.short_description = 'Stock Total'
 
     # -----------------------------
@@ -111,9 +208,13 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'product_count']
     search_fields = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(cantidad_productos=Count('products'))
+
     def product_count(self, obj):
-        return obj.products.count()
+        return obj.cantidad_productos
     product_count.short_description = 'Número de Productos'
+    product_count.admin_order_field = 'cantidad_productos'
 
 
 # -----------------------------
@@ -123,9 +224,13 @@ class MaterialAdmin(admin.ModelAdmin):
     list_display = ['name', 'product_count']
     search_fields = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(cantidad_productos=Count('get_products'))
+
     def product_count(self, obj):
-        return obj.get_products.count()
+        return obj.cantidad_productos
     product_count.short_description = 'Número de Productos'
+    product_count.admin_order_field = 'cantidad_productos'
 
 
 # -----------------------------
@@ -150,6 +255,7 @@ class ColorAdmin(admin.ModelAdmin):
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ['product', 'image_preview', 'order', 'alt_text']
     list_filter = ['product']
+    list_select_related = ['product']
     search_fields = ['product__name', 'alt_text']
     readonly_fields = ['image_preview_large']
     
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import cache, documentos, referencias, search
+        cache.conectar_senales()
+        # Después de cache: recarga con la versión ya incrementada
+        referencias.conectar_senales()
+        search.conectar_senales()
+        documentos.conectar_senales()
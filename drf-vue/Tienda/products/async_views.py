@@ -0,0 +1,175 @@
+"""
+Lectura async del catálogo, para servir bajo ASGI (uvicorn Tienda.asgi:application).
+
+Bajo /api/async/ responden lo mismo que los GET de ProductViewSet, CategoryViewSet
+y MaterialViewSet: comparten querysets (for_serializer, filtros facetados),
+serializers, paginación y renderer JSON. La vista no ocupa un hilo mientras
+espera a la base: el detalle usa aget(), /export/ aiterator() con prefetch por
+lote, y la paginación de DRF (que es sync) corre con sync_to_async en el hilo
+de la base del request, igual que el ORM async.
+
+No pasan por el cache de respuestas ni por el GET condicional de los viewsets;
+sí usan los documentos JSON precalculados del detalle y los listados (documentos.py).
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from Tienda.metricas import medir_serializacion
+from Tienda.pagination import ProductCursorPagination, StandardPageNumberPagination
+from . import documentos
+from .filters import VERDADERO, aplicar_filtros, contar_facetas, filtros_activos
+from .models import Category, Material, Product
+from .referencias import Referencias
+from .serializers import CategorySerializer, MaterialSerializer, ProductListSerializer, ProductSerializer
+from .views import ProductViewSet, fila_exportada, productos_exportables
+
+
+def respuesta(data, status=200):
+    # Mismo renderer que las respuestas de DRF: el JSON sale idéntico al de la versión sync
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def vista_async(funcion):
+    """Solo GET/HEAD; la vista recibe un Request de DRF y los errores de DRF se devuelven como JSON"""
+    @require_safe
+    @wraps(funcion)
+    async def vista(request, *args, **kwargs):
+        try:
+            return await funcion(Request(request), *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return respuesta(data, exc.status_code)
+    return vista
+
+
+async def contexto(request):
+    """Contexto de los serializers con las tablas de referencia ya leídas: leerlas puede consultar la base"""
+    return {'request': request, 'referencias': await sync_to_async(Referencias.actuales)()}
+
+
+async def paginar(request, queryset, serializer_class, pagination_class=ProductCursorPagination):
+    paginador = pagination_class()
+    pagina = await sync_to_async(paginador.paginate_queryset)(queryset, request)
+    # Con todo precargado, serializar no toca la base (si lo hiciera, Django avisa
+    # con SynchronousOnlyOperation)
+    serializer = serializer_class(pagina, many=True, context=await contexto(request))
+    with medir_serializacion(request):
+        data = serializer.data
+    return paginador.get_paginated_response(data).data
+
+
+async def paginar_productos(request, queryset):
+    """Listado de productos: con la representación por defecto sale de los documentos precalculados"""
+    if not documentos.servible(request):
+        return respuesta(await paginar(request, queryset, ProductListSerializer))
+    contenido = await sync_to_async(documentos.listado)(
+        ProductCursorPagination(), request, queryset, await contexto(request)
+    )
+    return documentos.respuesta(contenido)
+
+
+async def obtener(queryset, pk):
+    try:
+        return await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise NotFound()
+
+
+# -----------------------------
+# Productos
+# -----------------------------
+@vista_async
+async def product_list(request):
+    filtros = filtros_activos(request.query_params)
+    productos = aplicar_filtros(Product.objects.for_serializer(ProductListSerializer, request), filtros)
+    if request.query_params.get('facets', '').lower() not in VERDADERO:
+        return await paginar_productos(request, productos)
+    data = await paginar(request, productos, ProductListSerializer)
+    data['facets'] = await sync_to_async(contar_facetas)(Product.objects.all(), filtros)
+    return respuesta(data)
+
+
+@vista_async
+async def product_detail(request, pk):
+    if documentos.servible(request):
+        contenido = await sync_to_async(documentos.detalle)(pk)
+        if contenido is not None:
+            return documentos.respuesta(contenido)
+    producto = await obtener(Product.objects.for_serializer(ProductSerializer, request), pk)
+    serializer = ProductSerializer(producto, context=await contexto(request))
+    with medir_serializacion(request):
+        data = serializer.data
+    return respuesta(data)
+
+
+@vista_async
+async def product_export(request):
+    """Como ProductViewSet.export: NDJSON (o array JSON con ?format=json / Accept: application/json)"""
+    hasta = timezone.now()
+    productos = productos_exportables(request, hasta)
+    serializer = ProductSerializer(context=await contexto(request))
+    aceptados = request.headers.get('Accept', '')
+    formato = 'json' if request.query_params.get('format') == 'json' or (
+        'application/json' in aceptados and 'application/x-ndjson' not in aceptados
+    ) else 'ndjson'
+
+    async def cuerpo():
+        separador = '['
+        async for producto in productos.aiterator(chunk_size=ProductViewSet.export_chunk_size):
+            fila = fila_exportada(serializer, producto)
+            if formato == 'ndjson':
+                yield fila + '\n'
+            else:
+                yield separador + fila
+                separador = ',\n'
+        if formato == 'json':
+            yield ']' if separador == ',\n' else '[]'
+
+    tipo = 'application/x-ndjson' if formato == 'ndjson' else 'application/json'
+    response = StreamingHttpResponse(cuerpo(), content_type=f'{tipo}; charset=utf-8')
+    response['X-Export-Hasta'] = hasta.isoformat()
+    return response
+
+
+# -----------------------------
+# Categorías y materiales
+# -----------------------------
+@vista_async
+async def category_list(request):
+    return respuesta(await paginar(request, Category.objects.all(), CategorySerializer, StandardPageNumberPagination))
+
+
+@vista_async
+async def category_detail(request, pk):
+    return respuesta(CategorySerializer(await obtener(Category.objects.all(), pk)).data)
+
+
+@vista_async
+async def category_products(request, pk):
+    categoria = await obtener(Category.objects.all(), pk)
+    productos = categoria.products.for_serializer(ProductListSerializer, request)
+    return await paginar_productos(request, productos)
+
+
+@vista_async
+async def material_list(request):
+    return respuesta(await paginar(request, Material.objects.all(), MaterialSerializer, StandardPageNumberPagination))
+
+
+@vista_async
+async def material_detail(request, pk):
+    return respuesta(MaterialSerializer(await obtener(Material.objects.all(), pk)).data)
+
+
+@vista_async
+async def material_products(request, pk):
+    material = await obtener(Material.objects.all(), pk)
+    productos = material.get_products.for_serializer(ProductListSerializer, request)
+    return await paginar_productos(request, productos)
@@ -0,0 +1,189 @@
+"""
+Cache de respuestas del catálogo.
+
+Las respuestas GET de los viewsets de productos, categorías y materiales se
+guardan ya renderizadas en el cache 'catalogo' (ver CACHES en settings). La
+clave incluye la versión de cada tabla de la que depende el endpoint; las
+señales de escritura incrementan la versión de la tabla modificada, así que
+solo se invalidan las respuestas que podrían haber cambiado. La versión
+cambia cuando se confirma la transacción que escribió.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+from Tienda.replicas import vigencia_respuesta
+
+CACHE_ALIAS = 'catalogo'
+PREFIJO = 'catalogo'
+
+# Tablas (app_label.model) que pueden cambiar una respuesta del catálogo
+TABLAS_PRODUCTO = (
+    'products.product', 'products.productimage', 'products.productotalle',
+    'products.productocolor', 'products.category', 'products.material',
+    'products.color', 'products.talle',
+)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _clave_version(tabla):
+    return f'{PREFIJO}:version:{tabla}'
+
+
+def _clave_modificacion(tabla):
+    return f'{PREFIJO}:modificado:{tabla}'
+
+
+def versiones(tablas):
+    """Versión actual de cada tabla; si no existe se inicializa con un valor único"""
+    cache = get_cache()
+    claves = [_clave_version(tabla) for tabla in tablas]
+    actuales = cache.get_many(claves)
+    for clave in claves:
+        if clave not in actuales:
+            # time_ns evita reutilizar una versión vieja si la clave fue desalojada
+            cache.add(clave, time.time_ns(), timeout=None)
+            actuales[clave] = cache.get(clave)
+    return [actuales[clave] for clave in claves]
+
+
+def invalidar(*tablas):
+    """
+    Incrementa la versión de las tablas: las respuestas que dependen de ellas
+    dejan de usarse. Dentro de una transacción, recién al confirmarla: antes un
+    lector todavía ve las filas viejas y las guardaría bajo la versión nueva (y
+    si se revierte, no cambió nada). Fuera de una transacción, en el momento.
+    """
+    transaction.on_commit(partial(_incrementar, tablas))
+
+
+def _incrementar(tablas):
+    cache = get_cache()
+    ahora = int(time.time())
+    for tabla in tablas:
+        clave = _clave_version(tabla)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.add(clave, time.time_ns(), timeout=None)
+        cache.set(_clave_modificacion(tabla), ahora, timeout=None)
+
+
+def ultima_modificacion(tablas):
+    """
+    Timestamp (segundos) del último cambio en cualquiera de las tablas. Lo anota
+    invalidar() (así también cuentan los borrados); con el cache frío se toma
+    el máximo de actualizado_en de la tabla.
+    """
+    cache = get_cache()
+    claves = {tabla: _clave_modificacion(tabla) for tabla in tablas}
+    actuales = cache.get_many(claves.values())
+    resultado = 0
+    for tabla, clave in claves.items():
+        if clave not in actuales:
+            maximo = apps.get_model(tabla).objects.aggregate(m=Max('actualizado_en'))['m']
+            cache.add(clave, int(maximo.timestamp()) if maximo else 0, timeout=None)
+            actuales[clave] = cache.get(clave)
+        resultado = max(resultado, actuales[clave])
+    return resultado
+
+
+# -----------------------------
+# Contadores de aciertos/fallos
+# -----------------------------
+def _contar(nombre):
+    cache = get_cache()
+    clave = f'{PREFIJO}:stats:{nombre}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+
+def estadisticas():
+    cache = get_cache()
+    hits = cache.get(f'{PREFIJO}:stats:hits', 0)
+    misses = cache.get(f'{PREFIJO}:stats:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reiniciar_estadisticas():
+    get_cache().delete_many([f'{PREFIJO}:stats:hits', f'{PREFIJO}:stats:misses'])
+
+
+# -----------------------------
+# Mixin para viewsets
+# -----------------------------
+class CachedResponseMixin:
+    """
+    Cachea las respuestas GET exitosas de las acciones en cache_actions.
+    cache_dependencies lista las tablas de las que depende el viewset.
+    """
+    cache_actions = ()
+    cache_dependencies = TABLAS_PRODUCTO
+
+    def _clave_respuesta(self, request):
+        partes = [
+            request.get_host(),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            *map(str, versiones(self.cache_dependencies)),
+        ]
+        resumen = hashlib.md5('|'.join(partes).encode()).hexdigest()
+        return f'{PREFIJO}:respuesta:{resumen}'
+
+    def dispatch(self, request, *args, **kwargs):
+        accion = self.action_map.get(request.method.lower()) if request.method == 'GET' else None
+        if accion not in self.cache_actions or not getattr(settings, 'CATALOGO_CACHE_RESPUESTAS', True):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        clave = self._clave_respuesta(request)
+        guardada = cache.get(clave)
+        if guardada is not None:
+            _contar('hits')
+            content, content_type = guardada
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _contar('misses')
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if hasattr(response, 'render'):
+                # Los documentos precalculados (documentos.py) ya vienen renderizados
+                response.render()
+            # Armada en una réplica puede estar atrasada: dura poco en el cache
+            cache.set(clave, (response.content, response['Content-Type']), timeout=vigencia_respuesta())
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+# -----------------------------
+# Invalidación por señales (incluye los inlines de ProductAdmin)
+# -----------------------------
+def _invalidar_por_senal(sender, **kwargs):
+    invalidar(sender._meta.label_lower)
+
+
+def conectar_senales():
+    for tabla in TABLAS_PRODUCTO:
+        modelo = apps.get_model(tabla)
+        post_save.connect(_invalidar_por_senal, sender=modelo, dispatch_uid=f'cache-save-{tabla}')
+        post_delete.connect(_invalidar_por_senal, sender=modelo, dispatch_uid=f'cache-delete-{tabla}')
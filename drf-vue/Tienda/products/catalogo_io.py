@@ -0,0 +1,382 @@
+"""
+Importación y exportación masiva del catálogo (CSV o JSONL).
+
+Cada fila es un producto con sus imágenes y su stock por talle y por color:
+
+  JSONL: {"id": 1, "name": "Remera", "description": "...", "price": "1000.00",
+          "price_cost": "500.00", "sale_price": null, "category": "Remeras",
+          "material": "Algodón", "color": "Negro", "talle": "M",
+          "fecha_creacion": "2026-01-01T00:00:00+00:00",
+          "images": [{"image": "https://...", "order": 0, "alt_text": ""}],
+          "talles": {"M": 3, "L": 0}, "colores": {"Negro": 2}}
+
+  CSV: las mismas columnas; images son URLs separadas por "|" (el orden es la
+  posición) y talles/colores van como "M:3|L:0".
+
+Categorías, materiales, colores y talles se identifican por nombre (los que no
+existen se crean). Una fila con id de un producto existente lo actualiza: pisa
+solo los campos de las columnas que trae (fecha_creacion, solo si viene con
+valor), reemplaza sus imágenes si trae la columna images y actualiza el stock
+de los talles/colores que nombra. Sin id (o con un id que no existe) se crea un
+producto nuevo. El stock no puede ser negativo.
+
+La escritura va por lotes con bulk_create/bulk_update, cada lote en su propia
+transacción. total_stock/etiqueta y el índice de búsqueda se recalculan una
+sola vez al final para todos los productos importados.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import TABLAS_PRODUCTO, invalidar
+from .models import (
+    Category, Color, Material, Product, ProductImage, ProductoColor, ProductoTalle, Talle,
+    refresco_diferido, refrescar_productos,
+)
+from .search import guardar_documentos, indexar_productos
+
+FORMATOS = ('csv', 'jsonl')
+LOTE_POR_DEFECTO = 1000
+
+COLUMNAS = [
+    'id', 'name', 'description', 'price', 'price_cost', 'sale_price',
+    'category', 'material', 'color', 'talle', 'fecha_creacion',
+    'images', 'talles', 'colores',
+]
+# columna -> campo que pisa al actualizar un producto existente
+CAMPOS_PRODUCTO = {
+    'name': 'name', 'description': 'description', 'price': 'price', 'price_cost': 'price_cost',
+    'sale_price': 'sale_price', 'category': 'category_id', 'material': 'material_id',
+    'color': 'color_id', 'talle': 'talle_id',
+}
+
+
+class ErrorImportacion(Exception):
+    def __init__(self, linea, mensaje):
+        self.linea = linea
+        super().__init__(f'Línea {linea}: {mensaje}')
+
+
+def formato_de(nombre_archivo, formato=None):
+    """Formato explícito o deducido de la extensión del archivo"""
+    formato = formato or (nombre_archivo or '').rsplit('.', 1)[-1].lower()
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconocido: {formato!r} (usar {" o ".join(FORMATOS)})')
+    return formato
+
+
+# -----------------------------
+# Lectura (fila a fila, sin cargar el archivo entero)
+# -----------------------------
+def _pares(texto):
+    """'M:3|L:0' -> {'M': 3, 'L': 0}"""
+    resultado = {}
+    for par in filter(None, (texto or '').split('|')):
+        nombre, _, stock = par.rpartition(':')
+        resultado[nombre.strip()] = stock.strip()
+    return resultado
+
+
+def leer_csv(archivo):
+    for fila in csv.DictReader(archivo):
+        fila = {clave: valor for clave, valor in fila.items() if clave}
+        if 'images' in fila:
+            fila['images'] = [
+                {'image': url.strip(), 'order': orden}
+                for orden, url in enumerate(filter(None, fila['images'].split('|')))
+            ]
+        for columna in ('talles', 'colores'):
+            if columna in fila:
+                fila[columna] = _pares(fila[columna])
+        yield fila
+
+
+def leer_jsonl(archivo):
+    for linea, texto in enumerate(archivo, start=1):
+        if not texto.strip():
+            yield None
+            continue
+        try:
+            yield json.loads(texto)
+        except json.JSONDecodeError as e:
+            raise ErrorImportacion(linea, f'JSON inválido: {e.msg}')
+
+
+def leer(archivo, formato):
+    """Filas del archivo (dicts); None para las líneas vacías de un JSONL"""
+    return leer_csv(archivo) if formato == 'csv' else leer_jsonl(archivo)
+
+
+# -----------------------------
+# Escritura
+# -----------------------------
+def _decimal(fila, campo, requerido=False):
+    valor = fila.get(campo)
+    if valor in (None, ''):
+        if requerido:
+            raise ValueError(f'falta {campo}')
+        return None
+    try:
+        return Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f'{campo} no es un número: {valor!r}')
+
+
+def _entero(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} no es un número entero: {valor!r}')
+
+
+def _stock(valor):
+    stock = _entero(valor, 'stock')
+    if stock < 0:
+        raise ValueError('stock no puede ser negativo')
+    return stock
+
+
+class ImportadorCatalogo:
+    MODELOS_AUXILIARES = {'category': Category, 'material': Material, 'color': Color, 'talle': Talle}
+
+    def __init__(self, lote=LOTE_POR_DEFECTO):
+        self.lote = lote
+        self.creados = 0
+        self.actualizados = 0
+        # Nuevos: se indexan con el texto de la fila. Actualizados: se releen de la base
+        self.documentos = []
+        self.actualizados_ids = []
+        # nombre -> id de cada tabla auxiliar, cargado una sola vez
+        self.ids = {
+            modelo: dict(modelo.objects.values_list('name', 'id'))
+            for modelo in self.MODELOS_AUXILIARES.values()
+        }
+
+    def id_de(self, modelo, nombre):
+        nombre = (nombre or '').strip()
+        if not nombre:
+            return None
+        if nombre not in self.ids[modelo]:
+            self.ids[modelo][nombre] = modelo.objects.create(name=nombre).pk
+        return self.ids[modelo][nombre]
+
+    def importar(self, filas):
+        """
+        Importa las filas por lotes. Si una fila es inválida se corta ahí con
+        ErrorImportacion: los lotes anteriores quedan guardados (y recalculados)
+        y el lote de la fila con error no se escribe.
+        """
+        error = None
+        try:
+            with refresco_diferido():
+                lote = []
+                try:
+                    for linea, fila in enumerate(filas, start=1):
+                        if fila is not None:
+                            lote.append((linea, fila))
+                        if len(lote) >= self.lote:
+                            self.escribir_lote(lote)
+                            lote = []
+                    if lote:
+                        self.escribir_lote(lote)
+                except Exception as e:
+                    # refresco_diferido() solo recalcula si el bloque termina sin error
+                    error = e
+        finally:
+            # Con cualquier error, los lotes ya guardados quedan indexados e invalidados
+            for inicio in range(0, len(self.documentos), self.lote):
+                guardar_documentos(self.documentos[inicio:inicio + self.lote])
+            for inicio in range(0, len(self.actualizados_ids), self.lote):
+                indexar_productos(self.actualizados_ids[inicio:inicio + self.lote])
+            invalidar(*TABLAS_PRODUCTO)
+        if error:
+            raise error
+        return self.creados, self.actualizados
+
+    def preparar(self, linea, fila):
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError('la fila no es un objeto')
+            if not (fila.get('name') or '').strip():
+                raise ValueError('falta name')
+            if not (fila.get('category') or '').strip():
+                raise ValueError('falta category')
+            fecha = parse_datetime(fila.get('fecha_creacion') or '')
+            if fecha and timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+            producto = Product(
+                pk=_entero(fila['id'], 'id') if fila.get('id') not in (None, '') else None,
+                name=fila['name'].strip(),
+                description=fila.get('description') or None,
+                price=_decimal(fila, 'price', requerido=True),
+                price_cost=_decimal(fila, 'price_cost') or Decimal('0'),
+                sale_price=_decimal(fila, 'sale_price'),
+                category_id=self.id_de(Category, fila['category']),
+                material_id=self.id_de(Material, fila.get('material')),
+                color_id=self.id_de(Color, fila.get('color')),
+                talle_id=self.id_de(Talle, fila.get('talle')),
+                fecha_creacion=fecha or timezone.now(),
+                actualizado_en=timezone.now(),
+            )
+            imagenes = None
+            if 'images' in fila:
+                imagenes = [
+                    ProductImage(
+                        image=imagen['image'], order=_entero(imagen.get('order', orden), 'order'),
+                        alt_text=imagen.get('alt_text') or '',
+                    )
+                    for orden, imagen in enumerate(fila['images'] or [])
+                ]
+            talles = [
+                ProductoTalle(talle_id=self.id_de(Talle, nombre), stock=_stock(stock))
+                for nombre, stock in (fila.get('talles') or {}).items() if nombre.strip()
+            ]
+            colores = [
+                ProductoColor(color_id=self.id_de(Color, nombre), stock=_stock(stock))
+                for nombre, stock in (fila.get('colores') or {}).items() if nombre.strip()
+            ]
+            # Al actualizar: solo las columnas de la fila; la fecha de creación, solo si vino
+            campos = [campo for columna, campo in CAMPOS_PRODUCTO.items() if columna in fila]
+            campos += ['fecha_creacion', 'actualizado_en'] if fecha else ['actualizado_en']
+        except (ValueError, TypeError, KeyError) as e:
+            raise ErrorImportacion(linea, e)
+        return producto, imagenes, talles, colores, campos
+
+    def escribir_lote(self, lote):
+        preparados = [self.preparar(linea, fila) for linea, fila in lote]
+        atributos_por_fila = [
+            [fila.get(campo) or '' for campo in self.MODELOS_AUXILIARES]
+            + list(fila.get('talles') or {}) + list(fila.get('colores') or {})
+            for _, fila in lote
+        ]
+        ids = [producto.pk for producto, *_ in preparados if producto.pk]
+        existentes = set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+        nuevos, actualizar = [], []
+        # Un bulk_update por conjunto de columnas (en un archivo, normalmente uno solo)
+        actualizar_por_campos = defaultdict(list)
+        for producto, *_, campos in preparados:
+            if producto.pk in existentes:
+                actualizar.append(producto)
+                actualizar_por_campos[tuple(campos)].append(producto)
+            else:
+                producto.pk = None
+                nuevos.append(producto)
+        ids_actualizados = {producto.pk for producto in actualizar}
+
+        try:
+            with transaction.atomic():
+                # bulk_create completa los pk en SQLite y Postgres
+                Product.objects.bulk_create(nuevos)
+                for campos, productos in actualizar_por_campos.items():
+                    Product.objects.bulk_update(productos, campos)
+
+                reemplazar = [p.pk for p, imagenes, *_ in preparados if imagenes is not None and p.pk in ids_actualizados]
+                if reemplazar:
+                    ProductImage.objects.filter(product_id__in=reemplazar).delete()
+                imagenes, talles, colores = [], [], []
+                for producto, sus_imagenes, sus_talles, sus_colores, _ in preparados:
+                    for fila in sus_imagenes or []:
+                        fila.product_id = producto.pk
+                        imagenes.append(fila)
+                    for fila in sus_talles + sus_colores:
+                        fila.producto_id = producto.pk
+                    talles += sus_talles
+                    colores += sus_colores
+                ProductImage.objects.bulk_create(imagenes)
+                # Upsert: el stock de un talle/color que ya existía se pisa
+                ahora = timezone.now()
+                for fila in talles + colores:
+                    fila.actualizado_en = ahora
+                ProductoTalle.objects.bulk_create(
+                    talles, indexar=False, update_conflicts=True,
+                    unique_fields=['producto', 'talle'], update_fields=['stock', 'actualizado_en'],
+                )
+                ProductoColor.objects.bulk_create(
+                    colores, indexar=False, update_conflicts=True,
+                    unique_fields=['producto', 'color'], update_fields=['stock', 'actualizado_en'],
+                )
+        except DatabaseError as e:
+            raise ErrorImportacion(lote[0][0], f'no se pudo guardar el lote: {e}')
+
+        refrescar_productos(producto.pk for producto, *_ in preparados)
+        self.actualizados_ids += [producto.pk for producto in actualizar]
+        self.documentos += [
+            (producto.pk, producto.name, atributos, producto.description)
+            for (producto, *_), atributos in zip(preparados, atributos_por_fila)
+            if producto.pk not in ids_actualizados
+        ]
+        self.creados += len(nuevos)
+        self.actualizados += len(actualizar)
+
+
+def importar_catalogo(archivo, formato, lote=LOTE_POR_DEFECTO):
+    """(creados, actualizados). archivo: texto abierto (CSV o JSONL)"""
+    return ImportadorCatalogo(lote).importar(leer(archivo, formato))
+
+
+# -----------------------------
+# Exportación (generadores de líneas, para escribir a archivo o a una respuesta HTTP)
+# -----------------------------
+def fila_de(producto):
+    return {
+        'id': producto.pk,
+        'name': producto.name,
+        'description': producto.description or '',
+        'price': str(producto.price),
+        'price_cost': str(producto.price_cost),
+        'sale_price': str(producto.sale_price) if producto.sale_price is not None else None,
+        'category': producto.category.name,
+        'material': producto.material.name if producto.material_id else '',
+        'color': producto.color.name if producto.color_id else '',
+        'talle': producto.talle.name if producto.talle_id else '',
+        'fecha_creacion': producto.fecha_creacion.isoformat(),
+        'images': [
+            {'image': imagen.image, 'order': imagen.order, 'alt_text': imagen.alt_text}
+            for imagen in producto.images.all()
+        ],
+        'talles': {pt.talle.name: pt.stock for pt in producto.productotalle_set.all()},
+        'colores': {pc.color.name: pc.stock for pc in producto.productocolor_set.all()},
+    }
+
+
+def productos_para_exportar(queryset=None):
+    queryset = Product.objects.all() if queryset is None else queryset
+    return queryset.select_related('category', 'material', 'color', 'talle').prefetch_related(
+        'images', 'productotalle_set__talle', 'productocolor_set__color'
+    ).order_by('pk')
+
+
+def exportar_jsonl(queryset=None, lote=LOTE_POR_DEFECTO):
+    for producto in productos_para_exportar(queryset).iterator(chunk_size=lote):
+        yield json.dumps(fila_de(producto), ensure_ascii=False) + '\n'
+
+
+def exportar_csv(queryset=None, lote=LOTE_POR_DEFECTO):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS)
+
+    def linea(fila):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerow(fila)
+        return buffer.getvalue()
+
+    yield linea({columna: columna for columna in COLUMNAS})
+    for producto in productos_para_exportar(queryset).iterator(chunk_size=lote):
+        fila = fila_de(producto)
+        fila['sale_price'] = fila['sale_price'] or ''
+        fila['images'] = '|'.join(imagen['image'] for imagen in fila['images'])
+        for columna in ('talles', 'colores'):
+            fila[columna] = '|'.join(f'{nombre}:{stock}' for nombre, stock in fila[columna].items())
+        yield linea(fila)
+
+
+def exportar(formato, queryset=None, lote=LOTE_POR_DEFECTO):
+    return exportar_csv(queryset, lote) if formato == 'csv' else exportar_jsonl(queryset, lote)
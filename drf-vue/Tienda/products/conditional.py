@@ -0,0 +1,52 @@
+"""
+GET condicional (ETag / Last-Modified) para los viewsets del catálogo.
+
+Los validadores salen de las versiones y timestamps por tabla de products/cache.py
+(y de Product.actualizado_en en el detalle), así que un 304 se responde sin
+consultar el catálogo ni correr el serializer.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from Tienda.replicas import replica_actual
+from .cache import TABLAS_PRODUCTO, ultima_modificacion, versiones
+
+
+class ConditionalGetMixin:
+    """
+    Agrega ETag y Last-Modified a las acciones en conditional_actions y
+    responde 304 si el cliente ya tiene la última versión.
+    """
+    conditional_actions = ()
+    cache_dependencies = TABLAS_PRODUCTO
+
+    def get_validadores(self, request, accion, **kwargs):
+        """(etag, last_modified) del recurso; None si no se puede calcular"""
+        partes = [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        partes += map(str, versiones(self.cache_dependencies))
+        etag = hashlib.md5('|'.join(partes).encode()).hexdigest()
+        return etag, ultima_modificacion(self.cache_dependencies)
+
+    def dispatch(self, request, *args, **kwargs):
+        accion = self.action_map.get(request.method.lower()) if request.method in ('GET', 'HEAD') else None
+        if accion not in self.conditional_actions:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validadores(request, accion, **kwargs)
+        etag = quote_etag(etag) if etag else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            # 304: no se corre la vista ni el serializer
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        # Los validadores son los de la primaria: con el cuerpo de una réplica
+        # atrasada, un 304 posterior dejaría al cliente con datos viejos
+        if response.status_code == 200 and replica_actual() is None:
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
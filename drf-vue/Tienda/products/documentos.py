@@ -0,0 +1,288 @@
+"""
+Documentos JSON precalculados de los productos.
+
+El detalle (ProductSerializer) y la fila del listado (ProductListSerializer) de
+cada producto se guardan ya renderizados en DocumentoProducto, y el detalle y
+los listados de productos los devuelven tal cual, sin serializer. Solo se usan
+con la representación por defecto: JSON, sin ?fields=, ?expand= ni indent.
+
+Un documento vale mientras su fuente coincide con Product.actualizado_en, que
+cambia con cada save() y con cada cambio de stock o imágenes (ver
+actualizar_stock_y_etiqueta). Lo que cambia el JSON sin tocar actualizado_en
+(la etiqueta, renombrar o borrar una categoría, material, color o talle) borra
+los documentos afectados. Un documento que falta o quedó viejo se reemplaza por
+la serialización en vivo, así que nunca se sirve un JSON desactualizado.
+
+Después del commit los productos modificados se regeneran en un hilo aparte
+(DOCUMENTOS_PRODUCTO['ASINCRONO']); si no, en el momento. El comando
+verificar_documentos compara los documentos con la serialización en vivo.
+"""
+import logging
+import threading
+import time
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete
+from django.http import HttpRequest, HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from Tienda.metricas import medir_serializacion
+
+from .referencias import TABLAS_REFERENCIA, productos_que_usan
+
+LOTE = 500
+REINTENTOS = 5
+
+logger = logging.getLogger(__name__)
+
+_pendientes = set()
+_hilo = None
+_lock = threading.Lock()
+
+
+def configuracion():
+    return getattr(settings, 'DOCUMENTOS_PRODUCTO', {})
+
+
+def renderizar(data):
+    # Mismo renderer que las respuestas de DRF: el JSON sale idéntico
+    return JSONRenderer().render(data)
+
+
+def respuesta(contenido):
+    response = HttpResponse(contenido, content_type='application/json')
+    response['X-Documento'] = 'HIT'
+    return response
+
+
+def servible(request):
+    """Si el request pide la representación por defecto, la que guardan los documentos"""
+    if not configuracion().get('ACTIVOS', True):
+        return False
+    if request.query_params.get('fields') or request.query_params.get('expand'):
+        return False
+    # Las vistas async responden siempre JSON; en los viewsets, no la API navegable ni ?indent
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is None or (renderer.format == 'json' and 'indent' not in request.accepted_media_type)
+
+
+# -----------------------------
+# Generación
+# -----------------------------
+def request_por_defecto():
+    """GET sin parámetros: los serializers arman sus campos por defecto"""
+    request = HttpRequest()
+    request.method = 'GET'
+    return Request(request)
+
+
+def generar(productos):
+    """DocumentoProducto (sin guardar) de productos con with_catalog_data()"""
+    from .models import DocumentoProducto
+    from .serializers import ProductListSerializer, ProductSerializer
+    # Un contexto para todos: las tablas de referencia se leen una vez
+    contexto = {'request': request_por_defecto()}
+    return [
+        DocumentoProducto(
+            producto_id=producto.pk,
+            fuente=producto.actualizado_en,
+            detalle=renderizar(ProductSerializer(producto, context=contexto).data),
+            listado=renderizar(ProductListSerializer(producto, context=contexto).data),
+        )
+        for producto in productos
+    ]
+
+
+def _regenerar_lote(ids):
+    from .models import DocumentoProducto, Product
+    # Leer y escribir en la misma transacción: ninguna escritura se mete en el
+    # medio y deja un documento viejo
+    with transaction.atomic():
+        productos = Product.objects.filter(pk__in=ids).with_catalog_data()
+        DocumentoProducto.objects.bulk_create(
+            generar(productos), update_conflicts=True, unique_fields=['producto'],
+            update_fields=['detalle', 'listado', 'fuente', 'generado_en'],
+        )
+
+
+def regenerar(ids, lote=LOTE):
+    """Vuelve a generar los documentos de los productos (los borrados no tienen documento)"""
+    ids = sorted(set(ids))
+    for inicio in range(0, len(ids), lote):
+        for intento in range(REINTENTOS):
+            try:
+                _regenerar_lote(ids[inicio:inicio + lote])
+                break
+            except OperationalError:
+                # Sin BEGIN IMMEDIATE (SQLITE_PERFIL 'basico') pasar de leer a escribir
+                # falla si otra conexión está escribiendo: se vuelve a leer todo
+                if intento == REINTENTOS - 1:
+                    raise
+                time.sleep(0.05 * (intento + 1))
+
+
+def descartar(ids):
+    from .models import DocumentoProducto
+    DocumentoProducto.objects.filter(producto_id__in=ids).delete()
+
+
+def programar(ids):
+    """Regenera los documentos después del commit: en un hilo aparte o en el momento"""
+    ids = set(ids)
+    if not ids or not configuracion().get('ACTIVOS', True):
+        return
+    if configuracion().get('ASINCRONO', True):
+        transaction.on_commit(partial(_encolar, ids))
+    else:
+        transaction.on_commit(partial(regenerar, ids))
+
+
+def actualizar(ids):
+    """El JSON de los productos cambió sin tocar actualizado_en: se borran y se regeneran"""
+    ids = set(ids)
+    if ids:
+        descartar(ids)
+        programar(ids)
+
+
+def reparar(ids):
+    """Documentos que faltaban al servir un listado: solo en segundo plano, un GET no escribe"""
+    if ids and configuracion().get('ASINCRONO', True):
+        _encolar(set(ids))
+
+
+def _encolar(ids):
+    global _hilo
+    with _lock:
+        _pendientes.update(ids)
+        if _hilo is None:
+            _hilo = threading.Thread(target=_trabajar, name='documentos-producto', daemon=True)
+            _hilo.start()
+
+
+def _trabajar():
+    global _hilo
+    try:
+        while True:
+            with _lock:
+                if not _pendientes:
+                    _hilo = None
+                    return
+                ids = list(_pendientes)
+                _pendientes.clear()
+            try:
+                regenerar(ids)
+            except Exception:
+                # Quedan sin documento (se sirven en vivo) hasta el próximo cambio o verificar_documentos --reparar
+                logger.exception('No se pudieron regenerar los documentos de %s productos', len(ids))
+    finally:
+        # Las conexiones de este hilo no las cierra ningún request
+        connections.close_all()
+
+
+def esperar(timeout=None):
+    """Espera a que el hilo termine con lo pendiente (tests, comandos)"""
+    hilo = _hilo
+    if hilo is not None:
+        hilo.join(timeout)
+
+
+# -----------------------------
+# Lectura
+# -----------------------------
+def vigentes(ids, campo):
+    """{pk: bytes} del campo 'detalle' o 'listado', solo de los documentos al día"""
+    from .models import DocumentoProducto
+    filas = DocumentoProducto.objects.filter(
+        producto_id__in=ids, fuente=F('producto__actualizado_en')
+    ).values_list('producto_id', campo)
+    return {pk: bytes(contenido) for pk, contenido in filas}
+
+
+def detalle(pk):
+    # Con un pk inválido en la URL, la vista responde el 404
+    return vigentes([int(pk)], 'detalle').get(int(pk)) if str(pk).isdigit() else None
+
+
+def listado(paginador, request, queryset, contexto, view=None):
+    """
+    Página del listado con las filas de los documentos; las que faltan se
+    serializan en vivo con el queryset (que trae el prefetch) y se mandan a regenerar.
+    """
+    from .serializers import ProductListSerializer
+    pagina = paginador.paginate_queryset(queryset.prefetch_related(None), request, view=view)
+    ids = [producto.pk for producto in pagina]
+    filas = vigentes(ids, 'listado')
+    faltantes = [pk for pk in ids if pk not in filas]
+    if faltantes:
+        for pk, producto in queryset.in_bulk(faltantes).items():
+            with medir_serializacion(request):
+                datos = ProductListSerializer(producto, context=contexto).data
+            filas[pk] = renderizar(datos)
+        reparar(faltantes)
+    resultados = b'[' + b','.join(filas[pk] for pk in ids if pk in filas) + b']'
+    # El envoltorio del paginador (next, previous, results...) se arma clave por clave,
+    # en su orden, con las filas ya renderizadas en lugar de la lista de results
+    partes = []
+    for clave, valor in paginador.get_paginated_response([]).data.items():
+        # {"clave":valor} sin las llaves; en results, '"results":' seguido de las filas
+        par = renderizar({clave: valor})[1:-1]
+        partes.append(par[:-len(b'[]')] + resultados if clave == 'results' else par)
+    return b'{' + b','.join(partes) + b'}'
+
+
+# -----------------------------
+# Verificación
+# -----------------------------
+def verificar(lote=LOTE):
+    """
+    Compara cada documento con la serialización en vivo. Genera (pk, problema):
+    'falta', 'desactualizado' (fuente vieja: no se sirve) o 'distinto' (al día
+    pero con otro contenido: se está sirviendo mal).
+    """
+    from .models import DocumentoProducto, Product
+    ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), lote):
+        parte = ids[inicio:inicio + lote]
+        guardados = {
+            pk: (fuente, bytes(det), bytes(lis))
+            for pk, fuente, det, lis in DocumentoProducto.objects.filter(producto_id__in=parte).values_list(
+                'producto_id', 'fuente', 'detalle', 'listado'
+            )
+        }
+        for documento in generar(Product.objects.filter(pk__in=parte).with_catalog_data()):
+            guardado = guardados.get(documento.producto_id)
+            if guardado is None:
+                yield documento.producto_id, 'falta'
+            elif guardado[0] != documento.fuente:
+                yield documento.producto_id, 'desactualizado'
+            elif guardado[1:] != (documento.detalle, documento.listado):
+                yield documento.producto_id, 'distinto'
+
+
+# -----------------------------
+# Mantenimiento por señales
+# -----------------------------
+def _producto_guardado(sender, instance, raw=False, **kwargs):
+    # save() ya cambió actualizado_en: el documento viejo deja de servirse solo
+    if not raw:
+        programar([instance.pk])
+
+
+def _referencia_cambiada(sender, instance, created=False, raw=False, **kwargs):
+    """Renombrar o borrar una categoría, material, color o talle cambia el JSON de sus productos"""
+    if not created and not raw:
+        actualizar(productos_que_usan(instance))
+
+
+def conectar_senales():
+    post_save.connect(_producto_guardado, sender=apps.get_model('products.product'), dispatch_uid='documentos-producto')
+    for tabla in TABLAS_REFERENCIA:
+        modelo = apps.get_model(tabla)
+        post_save.connect(_referencia_cambiada, sender=modelo, dispatch_uid=f'documentos-save-{tabla}')
+        # Antes de borrar: después, SET_NULL ya desvinculó los productos (sin señales)
+        pre_delete.connect(_referencia_cambiada, sender=modelo, dispatch_uid=f'documentos-delete-{tabla}')
@@ -0,0 +1,142 @@
+"""
+Filtros facetados del catálogo.
+
+Filtros por query params (todos combinables; los de ids aceptan varios separados por coma):
+  ?category=1,2  ?material=3  ?color=4  ?talle=5   (color/talle: solo con stock)
+  ?min_price=1000&max_price=5000                    (precio final: promocional si corresponde)
+  ?on_sale=true  ?etiqueta=Última unidad
+
+contar_facetas() devuelve, para cada dimensión, cuántos productos quedarían al
+elegir cada valor. Cada dimensión se cuenta con el resto de los filtros aplicados
+(no el propio), así la barra lateral muestra las alternativas. Los conteos salen
+de consultas agrupadas (GROUP BY), nunca de recorrer productos en Python.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, DecimalField, Exists, F, Max, Min, OuterRef, Q, When
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductoColor, ProductoTalle
+
+VERDADERO = {'1', 'true', 'si', 'sí', 'yes'}
+# Rango de BigAutoField: un id mayor desborda el entero de la base (500 en lugar de 400)
+ID_MAXIMO = 2 ** 63 - 1
+
+EN_PROMOCION = Q(sale_price__isnull=False) & Q(sale_price__lt=F('price'))
+PRECIO_FINAL = Case(
+    When(EN_PROMOCION, then=F('sale_price')), default=F('price'),
+    output_field=DecimalField(max_digits=10, decimal_places=2),
+)
+
+
+def _ids(params, nombre):
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    try:
+        ids = [int(pk) for pk in valor.split(',') if pk.strip()]
+    except ValueError:
+        ids = None
+    if ids is None or not all(0 < pk <= ID_MAXIMO for pk in ids):
+        raise ValidationError({nombre: 'Debe ser una lista de ids separados por coma'})
+    return ids
+
+
+def _decimal(params, nombre):
+    valor = params.get(nombre)
+    if valor in (None, ''):
+        return None
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        numero = None
+    # NaN e Infinity son Decimal válidos, pero la base no los compara
+    if numero is None or not numero.is_finite():
+        raise ValidationError({nombre: 'Debe ser un número'})
+    return numero
+
+
+def filtros_activos(params):
+    """{dimensión: Q} con los filtros pedidos en el request"""
+    filtros = {}
+
+    for dimension in ('category', 'material'):
+        ids = _ids(params, dimension)
+        if ids is not None:
+            filtros[dimension] = Q(**{f'{dimension}__in': ids})
+
+    ids = _ids(params, 'talle')
+    if ids is not None:
+        filtros['talle'] = Q(Exists(ProductoTalle.objects.filter(
+            producto=OuterRef('pk'), talle__in=ids, stock__gt=0
+        )))
+    ids = _ids(params, 'color')
+    if ids is not None:
+        filtros['color'] = Q(Exists(ProductoColor.objects.filter(
+            producto=OuterRef('pk'), color__in=ids, stock__gt=0
+        )))
+
+    minimo, maximo = _decimal(params, 'min_price'), _decimal(params, 'max_price')
+    if minimo is not None or maximo is not None:
+        rango = Q()
+        if minimo is not None:
+            rango &= Q(precio_final__gte=minimo)
+        if maximo is not None:
+            rango &= Q(precio_final__lte=maximo)
+        filtros['price'] = rango
+
+    if params.get('on_sale', '').lower() in VERDADERO:
+        filtros['on_sale'] = EN_PROMOCION
+
+    if params.get('etiqueta'):
+        filtros['etiqueta'] = Q(etiqueta=params['etiqueta'])
+
+    return filtros
+
+
+def aplicar_filtros(queryset, filtros, excepto=None):
+    if 'price' in filtros and excepto != 'price':
+        queryset = queryset.alias(precio_final=PRECIO_FINAL)
+    for dimension, condicion in filtros.items():
+        if dimension != excepto:
+            queryset = queryset.filter(condicion)
+    return queryset
+
+
+def contar_facetas(queryset, filtros):
+    """Conteos por valor de cada dimensión (una consulta agrupada por dimensión)"""
+    def base(dimension):
+        return aplicar_filtros(queryset, filtros, excepto=dimension).order_by()
+
+    def agrupado(qs, campo, nombre):
+        filas = qs.values(campo, nombre).annotate(count=Count('pk', distinct=True)).order_by(nombre)
+        return [
+            {'id': fila[campo], 'name': fila[nombre], 'count': fila['count']}
+            for fila in filas if fila[campo] is not None
+        ]
+
+    facetas = {
+        'category': agrupado(base('category'), 'category', 'category__name'),
+        'material': agrupado(base('material'), 'material', 'material__name'),
+    }
+
+    for dimension, modelo, campo in (('talle', ProductoTalle, 'talle'), ('color', ProductoColor, 'color')):
+        filas = modelo.objects.filter(
+            producto__in=base(dimension).values('pk'), stock__gt=0
+        ).values(campo, f'{campo}__name').annotate(
+            count=Count('producto', distinct=True)
+        ).order_by(f'{campo}__name')
+        facetas[dimension] = [
+            {'id': fila[campo], 'name': fila[f'{campo}__name'], 'count': fila['count']} for fila in filas
+        ]
+
+    precios = base('price').aggregate(min=Min(PRECIO_FINAL), max=Max(PRECIO_FINAL))
+    # Mismo formato que los precios de ProductSerializer ("1000.00")
+    facetas['price'] = {clave: f'{valor:.2f}' if valor is not None else None for clave, valor in precios.items()}
+    facetas['on_sale'] = base('on_sale').aggregate(count=Count('pk', filter=EN_PROMOCION))['count']
+
+    etiquetas = base('etiqueta').exclude(etiqueta__isnull=True).values('etiqueta').annotate(
+        count=Count('pk')
+    ).order_by('etiqueta')
+    facetas['etiqueta'] = [{'name': fila['etiqueta'], 'count': fila['count']} for fila in etiquetas]
+    return facetas
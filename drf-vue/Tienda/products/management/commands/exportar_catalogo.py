@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalogo_io import LOTE_POR_DEFECTO, exportar, formato_de
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo completo (productos, imágenes y stock por talle/color) a CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', default='-', help='Ruta del archivo (por defecto, salida estándar)')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión (jsonl en salida estándar)')
+        parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO, help='Productos leídos por consulta')
+
+    def handle(self, *args, **options):
+        destino = options['archivo']
+        try:
+            if destino == '-':
+                formato = formato_de(None, options['formato'] or 'jsonl')
+            else:
+                formato = formato_de(destino, options['formato'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        if destino == '-':
+            for linea in exportar(formato, lote=options['lote']):
+                self.stdout.write(linea, ending='')
+            return
+
+        with open(destino, 'w', encoding='utf-8', newline='') as archivo:
+            lineas = 0
+            for linea in exportar(formato, lote=options['lote']):
+                archivo.write(linea)
+                lineas += 1
+        # El CSV tiene una línea de encabezado
+        productos = lineas - 1 if formato == 'csv' else lineas
+        self.stdout.write(self.style.SUCCESS(f'{productos} productos exportados a {destino}'))
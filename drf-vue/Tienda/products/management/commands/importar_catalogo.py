@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalogo_io import LOTE_POR_DEFECTO, ErrorImportacion, formato_de, importar_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa productos con sus imágenes y stock por talle/color desde un CSV o JSONL '
+        '(ver products/catalogo_io.py para el formato). Lee el archivo fila a fila y escribe por lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO, help='Productos por transacción')
+
+    def handle(self, *args, **options):
+        try:
+            formato = formato_de(options['archivo'], options['formato'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        inicio = time.monotonic()
+        try:
+            with open(options['archivo'], encoding='utf-8', newline='') as archivo:
+                creados, actualizados = importar_catalogo(archivo, formato, options['lote'])
+        except ErrorImportacion as e:
+            raise CommandError(f'{e} (los lotes anteriores quedaron importados)')
+        except OSError as e:
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{creados} productos creados y {actualizados} actualizados en {time.monotonic() - inicio:.1f}s'
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Product, etiqueta_para
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula las columnas desnormalizadas total_stock y etiqueta de Product. '
+        'Con --vencidos solo actualiza los "Nuevo ingreso" que ya pasaron los 7 días '
+        '(pensado para cron); con --verificar solo informa las diferencias.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vencidos', action='store_true',
+            help='Solo recalcular etiquetas "Nuevo ingreso" vencidas (refresco periódico)',
+        )
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='No modifica nada: compara las columnas con el valor real y falla si difieren',
+        )
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            return self.verificar()
+
+        if options['vencidos']:
+            cantidad = Product.objects.vencer_nuevos_ingresos()
+            self.stdout.write(self.style.SUCCESS(f'{cantidad} etiquetas "Nuevo ingreso" vencidas actualizadas'))
+            return
+
+        cantidad = Product.objects.all().actualizar_stock_y_etiqueta()
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} productos recalculados'))
+
+    def verificar(self):
+        ahora = timezone.now()
+        productos = Product.objects.annotate(
+            stock_real=Coalesce(Sum('productotalle__stock'), Value(0))
+        ).values_list('id', 'total_stock', 'etiqueta', 'stock_real', 'price', 'sale_price', 'fecha_creacion')
+
+        errores = 0
+        for pk, total_stock, etiqueta, stock_real, price, sale_price, fecha_creacion in productos.iterator():
+            etiqueta_real = etiqueta_para(stock_real, price, sale_price, fecha_creacion, ahora)
+            if total_stock != stock_real or etiqueta != etiqueta_real:
+                errores += 1
+                self.stdout.write(
+                    f'Producto {pk}: total_stock={total_stock} (real {stock_real}), '
+                    f'etiqueta={etiqueta!r} (real {etiqueta_real!r})'
+                )
+
+        if errores:
+            raise CommandError(f'{errores} productos desactualizados; correr recalcular_etiquetas')
+        self.stdout.write(self.style.SUCCESS('Columnas total_stock y etiqueta al día'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de productos (FTS5 o tsvector)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Productos indexados por lote')
+
+    def handle(self, *args, **options):
+        if search.get_motor() is None:
+            self.stdout.write(self.style.WARNING('La base de datos no tiene índice de texto; se usa icontains'))
+            return
+        cantidad = search.reconstruir_indice(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} productos indexados'))
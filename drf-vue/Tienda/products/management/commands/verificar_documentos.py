@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import documentos
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los documentos JSON precalculados de productos con la serialización en vivo. '
+        'Con --reparar regenera los que faltan, están viejos o difieren (también sirve para la carga inicial).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=documentos.LOTE, help='Productos comparados por lote')
+        parser.add_argument(
+            '--reparar', action='store_true',
+            help='Regenera los documentos con problemas en lugar de fallar',
+        )
+
+    def handle(self, *args, **options):
+        problemas = defaultdict(list)
+        for pk, problema in documentos.verificar(lote=options['lote']):
+            problemas[problema].append(pk)
+
+        if not problemas:
+            self.stdout.write(self.style.SUCCESS('Documentos de productos al día'))
+            return
+
+        for problema in ('falta', 'desactualizado', 'distinto'):
+            ids = problemas.get(problema)
+            if ids:
+                muestra = ', '.join(map(str, ids[:20])) + (', ...' if len(ids) > 20 else '')
+                self.stdout.write(f'{problema}: {len(ids)} productos ({muestra})')
+
+        ids = [pk for lista in problemas.values() for pk in lista]
+        if not options['reparar']:
+            # 'distinto' es un documento vigente que no coincide: se está sirviendo mal
+            raise CommandError(f'{len(ids)} documentos con problemas; correr verificar_documentos --reparar')
+        documentos.regenerar(ids, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{len(ids)} documentos regenerados'))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:29
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def poblar_columnas(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductoTalle = apps.get_model('products', 'ProductoTalle')
+    stock = ProductoTalle.objects.filter(
+        producto=OuterRef('pk')
+    ).values('producto').annotate(total=Sum('stock')).values('total')
+    Product.objects.update(total_stock=Coalesce(Subquery(stock), Value(0)))
+
+    # Copia de la regla de etiqueta de este momento (products.models.expresion_etiqueta):
+    # la migración no depende de cómo cambie el modelo después
+    Product.objects.update(etiqueta=Case(
+        When(total_stock=1, then=Value('Última unidad')),
+        When(Q(sale_price__gt=0) & Q(sale_price__lt=F('price')), then=Value('Descuento')),
+        When(fecha_creacion__gte=timezone.now() - timedelta(days=7), then=Value('Nuevo ingreso')),
+        default=Value(None),
+        output_field=models.CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_remove_product_image_productimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='etiqueta',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, null=True, verbose_name='Etiqueta'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Stock Total'),
+        ),
+        migrations.RunPython(poblar_columnas, migrations.RunPython.noop),
+    ]
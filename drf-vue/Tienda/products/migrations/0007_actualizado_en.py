@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_total_stock_etiqueta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='color',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='productocolor',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='productotalle',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddField(
+            model_name='talle',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación'),
+        ),
+    ]
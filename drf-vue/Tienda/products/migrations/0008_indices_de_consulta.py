@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'name', 'id'], name='product_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['material', 'name', 'id'], name='product_material_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('sale_price__isnull', False)), fields=['name', 'id'], name='product_on_sale_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['fecha_creacion'], name='product_fecha_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', 'order', 'id'], name='productimage_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productocolor',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['producto'], name='productocolor_en_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productotalle',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['producto'], name='productotalle_en_stock_idx'),
+        ),
+    ]
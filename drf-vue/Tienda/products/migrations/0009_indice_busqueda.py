@@ -0,0 +1,99 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Copia de products/search.py en el momento de esta migración: la migración no
+# depende de cómo cambie ese módulo después (reindexar_busqueda usa la versión actual)
+TABLA_SQLITE = 'products_product_fts'
+TABLA_POSTGRES = 'products_product_search'
+
+SUFIJOS = (
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'uciones',
+    'adoras', 'adores', 'ancias', 'mente', 'acion', 'ucion', 'adora', 'ador',
+    'ancia', 'idad', 'ismo', 'able', 'ible', 'ista', 'osos', 'osas', 'oso', 'osa',
+    'es', 'os', 'as', 's', 'o', 'a', 'e',
+)
+LARGO_MINIMO_RAIZ = 3
+LOTE = 500
+
+
+def raiz(palabra):
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def normalizar(texto):
+    sin_tildes = ''.join(
+        c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c)
+    )
+    return ' '.join(raiz(palabra) for palabra in re.findall(r'\w+', sin_tildes.lower()))
+
+
+def documento(producto):
+    atributos = [
+        producto.category.name if producto.category_id else '',
+        producto.material.name if producto.material_id else '',
+        producto.color.name if producto.color_id else '',
+        producto.talle.name if producto.talle_id else '',
+    ]
+    atributos += [pt.talle.name for pt in producto.productotalle_set.all()]
+    atributos += [pc.color.name for pc in producto.productocolor_set.all()]
+    return normalizar(producto.name), normalizar(' '.join(atributos)), normalizar(producto.description)
+
+
+def crear_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        crear = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_SQLITE} USING fts5("
+            f"name, atributos, description, tokenize='unicode61 remove_diacritics 2')",
+            f'DELETE FROM {TABLA_SQLITE}',
+        ]
+        insertar = f'INSERT INTO {TABLA_SQLITE} (rowid, name, atributos, description) VALUES (%s, %s, %s, %s)'
+    elif connection.vendor == 'postgresql':
+        crear = [
+            f'CREATE TABLE IF NOT EXISTS {TABLA_POSTGRES} (product_id bigint PRIMARY KEY, documento tsvector NOT NULL)',
+            f'CREATE INDEX IF NOT EXISTS {TABLA_POSTGRES}_gin ON {TABLA_POSTGRES} USING GIN (documento)',
+            f'TRUNCATE {TABLA_POSTGRES}',
+        ]
+        insertar = (
+            f"INSERT INTO {TABLA_POSTGRES} (product_id, documento) VALUES (%s, "
+            f"setweight(to_tsvector('simple', %s), 'A') || "
+            f"setweight(to_tsvector('simple', %s), 'B') || "
+            f"setweight(to_tsvector('simple', %s), 'C'))"
+        )
+    else:
+        return
+
+    Product = apps.get_model('products', 'Product')
+    productos = Product.objects.using(connection.alias).order_by('pk').select_related(
+        'category', 'material', 'color', 'talle'
+    ).prefetch_related('productotalle_set__talle', 'productocolor_set__color')
+    with connection.cursor() as cursor:
+        for sql in crear:
+            cursor.execute(sql)
+        ids = list(productos.values_list('pk', flat=True))
+        for inicio in range(0, len(ids), LOTE):
+            lote = productos.filter(pk__in=ids[inicio:inicio + LOTE])
+            cursor.executemany(insertar, [(p.pk, *documento(p)) for p in lote])
+
+
+def borrar_indice(apps, schema_editor):
+    tabla = {'sqlite': TABLA_SQLITE, 'postgresql': TABLA_POSTGRES}.get(schema_editor.connection.vendor)
+    if tabla:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {tabla}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_indices_de_consulta'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
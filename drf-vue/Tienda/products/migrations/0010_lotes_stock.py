@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote_id', models.CharField(max_length=100, unique=True, verbose_name='Id de lote')),
+                ('resultado', models.JSONField(default=dict, verbose_name='Resultado')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Aplicado en')),
+            ],
+            options={
+                'verbose_name': 'Lote de stock',
+                'verbose_name_plural': 'Lotes de stock',
+            },
+        ),
+    ]
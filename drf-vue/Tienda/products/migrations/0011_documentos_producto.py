@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_lotes_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento', serialize=False, to='products.product', verbose_name='Producto')),
+                ('detalle', models.BinaryField(verbose_name='Detalle (ProductSerializer)')),
+                ('listado', models.BinaryField(verbose_name='Listado (ProductListSerializer)')),
+                ('fuente', models.DateTimeField(verbose_name='actualizado_en del producto serializado')),
+                ('generado_en', models.DateTimeField(auto_now=True, verbose_name='Generado en')),
+            ],
+            options={
+                'verbose_name': 'Documento de producto',
+                'verbose_name_plural': 'Documentos de producto',
+            },
+        ),
+    ]
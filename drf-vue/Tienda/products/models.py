@@ -1,14 +1,96 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from django.db import models
+from django.db.models import Case, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.urls import reverse
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
+from .cache import invalidar
+from .documentos import actualizar as actualizar_documentos
+from .search import indexar_productos
+
+
+# -----------------------------
+# Etiquetas de producto
+# -----------------------------
+ETIQUETA_ULTIMA_UNIDAD = "Última unidad"
+ETIQUETA_DESCUENTO = "Descuento"
+ETIQUETA_NUEVO_INGRESO = "Nuevo ingreso"
+DIAS_NUEVO_INGRESO = 7
+
+
+def etiqueta_para(total_stock, price, sale_price, fecha_creacion, ahora=None):
+    """Regla de la etiqueta; expresion_etiqueta() es su equivalente en SQL"""
+    ahora = ahora or timezone.now()
+    if total_stock == 1:
+        return ETIQUETA_ULTIMA_UNIDAD
+    elif sale_price and sale_price < price:
+        return ETIQUETA_DESCUENTO
+    elif ahora - fecha_creacion <= timedelta(days=DIAS_NUEVO_INGRESO):
+        return ETIQUETA_NUEVO_INGRESO
+    return None
+
+
+def expresion_etiqueta(ahora=None):
+    """Misma regla que etiqueta_para(), evaluada por la base de datos sobre las columnas"""
+    ahora = ahora or timezone.now()
+    return Case(
+        When(total_stock=1, then=Value(ETIQUETA_ULTIMA_UNIDAD)),
+        When(Q(sale_price__gt=0) & Q(sale_price__lt=F('price')), then=Value(ETIQUETA_DESCUENTO)),
+        When(fecha_creacion__gte=ahora - timedelta(days=DIAS_NUEVO_INGRESO), then=Value(ETIQUETA_NUEVO_INGRESO)),
+        default=Value(None),
+        output_field=models.CharField(),
+    )
+
+
+# -----------------------------
+# Refresco de columnas desnormalizadas (total_stock, etiqueta)
+# -----------------------------
+_productos_pendientes = ContextVar('productos_pendientes', default=None)
+LOTE_REFRESCO = 500
+
+
+@contextmanager
+def refresco_diferido():
+    """
+    Junta los productos afectados por cambios de stock y los recalcula una sola
+    vez al salir del bloque, en lugar de una vez por fila modificada.
+    """
+    pendientes = _productos_pendientes.get()
+    if pendientes is not None:
+        # Ya estamos dentro de otro bloque: el externo hace el refresco
+        yield
+        return
+
+    pendientes = set()
+    token = _productos_pendientes.set(pendientes)
+    try:
+        yield
+    finally:
+        _productos_pendientes.reset(token)
+    # De a LOTE_REFRESCO ids: una importación puede juntar decenas de miles
+    pendientes = sorted(pendientes)
+    for inicio in range(0, len(pendientes), LOTE_REFRESCO):
+        Product.objects.filter(pk__in=pendientes[inicio:inicio + LOTE_REFRESCO]).actualizar_stock_y_etiqueta()
+
+
+def refrescar_productos(producto_ids):
+    """Recalcula ahora, o al final del refresco_diferido() en curso"""
+    producto_ids = set(producto_ids)
+    pendientes = _productos_pendientes.get()
+    if pendientes is not None:
+        pendientes.update(producto_ids)
+    elif producto_ids:
+        Product.objects.filter(pk__in=producto_ids).actualizar_stock_y_etiqueta()
 
 
 # Modelos de Color
 class Color(models.Model):
     name = models.CharField(max_length=255, verbose_name='Nombre')
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
 
     class Meta:
         verbose_name = 'Color'
@@ -25,6 +107,7 @@ class Color(models.Model):
 # Modelos de Talle
 class Talle(models.Model):
     name = models.CharField(max_length=255, verbose_name='Nombre')
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
 
     class Meta:
         verbose_name = 'Talle'
@@ -40,6 +123,7 @@ class Talle(models.Model):
 # Modelos de Categoria
 class Category(models.Model):
     name = models.CharField(max_length=255, verbose_name='Nombre')
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
 
     class Meta:
         verbose_name = 'Categoría'
@@ -55,6 +139,7 @@ class Category(models.Model):
 # Modelos de Material
 class Material(models.Model):
     name = models.CharField(max_length=255, verbose_name='Nombre')
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
 
     class Meta:
         verbose_name = 'Material'
@@ -74,16 +159,84 @@ class ProductImage(models.Model):
     image = models.URLField(max_length=255, verbose_name='URL de la imagen')
     order = models.PositiveIntegerField(default=0, verbose_name='Orden')
     alt_text = models.CharField(max_length=255, blank=True, verbose_name='Texto alternativo')
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
     
     class Meta:
         verbose_name = 'Imagen del producto'
         verbose_name_plural = 'Imágenes del producto'
         ordering = ['order', 'id']
+        indexes = [
+            # Prefetch de imágenes: WHERE product_id IN (...) ORDER BY order, id
+            models.Index(fields=['product', 'order', 'id'], name='productimage_product_order_idx'),
+        ]
     
     def __str__(self):
         return f"Imagen de {self.product.name}"
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_catalog_data(self, images=True, talles=True, colores=True):
+        """
+        Carga en una cantidad fija de consultas todo lo que usan los serializers
+        de producto: talles/colores con stock e imágenes. Los nombres de
+        categoría, material, talle y color salen de products/referencias.py.
+        Los prefetch que el serializer no va a usar se pueden omitir.
+        """
+        prefetches = []
+        if images:
+            prefetches.append(Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id')))
+        if talles:
+            prefetches.append(Prefetch(
+                'productotalle_set',
+                queryset=ProductoTalle.objects.filter(stock__gt=0),
+                to_attr='talles_en_stock'
+            ))
+        if colores:
+            prefetches.append(Prefetch(
+                'productocolor_set',
+                queryset=ProductoColor.objects.filter(stock__gt=0),
+                to_attr='colores_en_stock'
+            ))
+        return self.prefetch_related(*prefetches)
+
+    def for_serializer(self, serializer_class, request):
+        """with_catalog_data() limitado a los campos que el request va a serializar"""
+        campos = set(serializer_class.campos_pedidos(request))
+        return self.with_catalog_data(
+            images=bool(campos & {'image', 'images'}),
+            talles='talles_disponibles' in campos,
+            colores='colores_disponibles' in campos,
+        )
+
+    def actualizar_stock_y_etiqueta(self):
+        """
+        Recalcula total_stock y etiqueta en la BD con dos UPDATE, sin traer filas.
+        También marca actualizado_en: cambió algo del producto (stock, imágenes).
+        """
+        stock = ProductoTalle.objects.filter(
+            producto=OuterRef('pk')
+        ).values('producto').annotate(total=Sum('stock')).values('total')
+        self.update(total_stock=Coalesce(Subquery(stock), Value(0)), actualizado_en=timezone.now())
+        return self.actualizar_etiquetas()
+
+    def actualizar_etiquetas(self, ahora=None):
+        # Antes del UPDATE: el filtro de vencer_nuevos_ingresos deja de coincidir después
+        ids = list(self.values_list('pk', flat=True))
+        actualizados = self.update(etiqueta=expresion_etiqueta(ahora))
+        # update() no dispara señales: invalidar el cache de respuestas y los documentos a mano
+        invalidar(Product._meta.label_lower)
+        actualizar_documentos(ids)
+        return actualizados
+
+    def vencer_nuevos_ingresos(self, ahora=None):
+        """Pensado para correr periódicamente: 'Nuevo ingreso' deja de valer a los 7 días"""
+        ahora = ahora or timezone.now()
+        return self.filter(
+            etiqueta=ETIQUETA_NUEVO_INGRESO,
+            fecha_creacion__lt=ahora - timedelta(days=DIAS_NUEVO_INGRESO)
+        ).actualizar_etiquetas(ahora)
+
+
 # Modelos de Productos
 class Product(models.Model):
     name = models.CharField(max_length=255, verbose_name='Nombre')
@@ -97,11 +250,33 @@ class Product(models.Model):
     color = models.ForeignKey(Color, on_delete=models.SET_NULL, null=True, blank=True, related_name='get_products', verbose_name='Color')
     talle = models.ForeignKey(Talle, on_delete=models.SET_NULL, null=True, blank=True, related_name='get_products', verbose_name='Talle')
     fecha_creacion = models.DateTimeField(default=timezone.now)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
+
+    # Columnas desnormalizadas: las mantienen save(), las señales de ProductoTalle
+    # y el comando recalcular_etiquetas
+    total_stock = models.IntegerField(default=0, editable=False, db_index=True, verbose_name='Stock Total')
+    etiqueta = models.CharField(max_length=20, null=True, blank=True, editable=False, db_index=True, verbose_name='Etiqueta')
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['name']
+        indexes = [
+            # Orden del catálogo y de la paginación por cursor (name, id)
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+            # by_category / categories/{id}/products y materials/{id}/products
+            models.Index(fields=['category', 'name', 'id'], name='product_category_name_idx'),
+            models.Index(fields=['material', 'name', 'id'], name='product_material_name_idx'),
+            # on_sale: índice parcial, solo productos con precio promocional
+            models.Index(
+                fields=['name', 'id'], name='product_on_sale_idx',
+                condition=Q(sale_price__isnull=False),
+            ),
+            # new_arrivals
+            models.Index(fields=['fecha_creacion'], name='product_fecha_creacion_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -109,8 +284,9 @@ class Product(models.Model):
     @property
     def main_image(self):
         """Devuelve la imagen principal (primera imagen ordenada)"""
-        first_image = self.images.first()
-        return first_image.image if first_image else None
+        # Usa .all() para aprovechar el prefetch de imágenes si existe
+        images = self.images.all()
+        return images[0].image if images else None
     
     @property
     def image_list(self):
@@ -131,40 +307,132 @@ class Product(models.Model):
         return reverse('admin:products_product_change', args=[self.id])
     
     def save(self, *args, **kwargs):
+        # Se recalcula desde la BD para no pisar el stock con una instancia vieja
+        if self.pk:
+            self.total_stock = self.productotalle_set.aggregate(total=Sum('stock'))['total'] or 0
+        self.etiqueta = self.calcular_etiqueta()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'total_stock', 'etiqueta'}
         super().save(*args, **kwargs)
 
+    def get_talles_en_stock(self):
+        """ProductoTalle con stock > 0 (usa el prefetch de with_catalog_data si existe)"""
+        if hasattr(self, 'talles_en_stock'):
+            return self.talles_en_stock
+        return list(self.productotalle_set.filter(stock__gt=0))
+
+    def get_colores_en_stock(self):
+        """ProductoColor con stock > 0 (usa el prefetch de with_catalog_data si existe)"""
+        if hasattr(self, 'colores_en_stock'):
+            return self.colores_en_stock
+        return list(self.productocolor_set.filter(stock__gt=0))
+
     def calcular_etiqueta(self):
-        # Obtener el stock total de todos los talles
-        total_stock = sum(pt.stock for pt in self.productotalle_set.all())
+        return etiqueta_para(self.total_stock, self.price, self.sale_price, self.fecha_creacion)
+
 
-        if total_stock == 1:
-            return "Última unidad"
-        elif self.sale_price and self.sale_price < self.price:
-            return "Descuento"
-        elif timezone.now() - self.fecha_creacion <= timedelta(days=7):
-            return "Nuevo ingreso"
-        return None
+class StockQuerySet(models.QuerySet):
+    """
+    ProductoTalle/ProductoColor: las operaciones masivas no disparan señales,
+    así que refrescan los productos afectados
+    """
+
+    def update(self, **kwargs):
+        kwargs.setdefault('actualizado_en', timezone.now())
+        with refresco_diferido():
+            refrescar_productos(self.values_list('producto_id', flat=True).distinct())
+            return super().update(**kwargs)
+
+    def delete(self):
+        with refresco_diferido():
+            return super().delete()
+
+    def bulk_create(self, objs, *args, indexar=True, **kwargs):
+        """indexar=False: quien llama reindexa después (importación masiva)"""
+        with refresco_diferido():
+            creados = super().bulk_create(objs, *args, **kwargs)
+            refrescar_productos(obj.producto_id for obj in creados)
+        if indexar:
+            # Los nombres de talles/colores nuevos entran al índice de búsqueda
+            indexar_productos({obj.producto_id for obj in creados})
+        return creados
 
 
 class ProductoTalle(models.Model):
     producto = models.ForeignKey(Product, on_delete=models.CASCADE)
     talle = models.ForeignKey(Talle, on_delete=models.CASCADE)
     stock = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
+
+    objects = StockQuerySet.as_manager()
 
     class Meta:
         db_table = 'producto_talle'
         unique_together = ('producto', 'talle')
+        indexes = [
+            # talles_disponibles: WHERE producto_id IN (...) AND stock > 0
+            models.Index(fields=['producto'], name='productotalle_en_stock_idx', condition=Q(stock__gt=0)),
+        ]
 
-@receiver(post_save, sender=ProductoTalle)
-def actualizar_etiqueta_producto(sender, instance, **kwargs):
-    producto = instance.producto
-    producto.save()  # Esto volverá a calcular la etiqueta
 
 class ProductoColor(models.Model):
     producto = models.ForeignKey(Product, on_delete=models.CASCADE)
     color = models.ForeignKey(Color, on_delete=models.CASCADE)
     stock = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Última modificación')
+
+    objects = StockQuerySet.as_manager()
 
     class Meta:
         db_table = 'producto_color'
-        unique_together = ('producto', 'color')
\ No newline at end of file
+        unique_together = ('producto', 'color')
+        indexes = [
+            # colores_disponibles: WHERE producto_id IN (...) AND stock > 0
+            models.Index(fields=['producto'], name='productocolor_en_stock_idx', condition=Q(stock__gt=0)),
+        ]
+
+
+# Lotes de stock ya aplicados (sincronización con el depósito)
+class LoteStock(models.Model):
+    """Un reintento con el mismo batch_id devuelve este resultado sin volver a aplicar el lote"""
+    lote_id = models.CharField(max_length=100, unique=True, verbose_name='Id de lote')
+    resultado = models.JSONField(default=dict, verbose_name='Resultado')
+    creado_en = models.DateTimeField(auto_now_add=True, verbose_name='Aplicado en')
+
+    class Meta:
+        verbose_name = 'Lote de stock'
+        verbose_name_plural = 'Lotes de stock'
+
+    def __str__(self):
+        return self.lote_id
+
+
+# JSON precalculado de cada producto (products/documentos.py)
+class DocumentoProducto(models.Model):
+    """Detalle y fila de listado ya renderizados; valen mientras fuente == producto.actualizado_en"""
+    producto = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='documento', verbose_name='Producto'
+    )
+    detalle = models.BinaryField(verbose_name='Detalle (ProductSerializer)')
+    listado = models.BinaryField(verbose_name='Listado (ProductListSerializer)')
+    fuente = models.DateTimeField(verbose_name='actualizado_en del producto serializado')
+    generado_en = models.DateTimeField(auto_now=True, verbose_name='Generado en')
+
+    class Meta:
+        verbose_name = 'Documento de producto'
+        verbose_name_plural = 'Documentos de producto'
+
+    def __str__(self):
+        return f"Documento de {self.producto_id}"
+
+
+@receiver(post_save, sender=ProductoTalle)
+@receiver(post_delete, sender=ProductoTalle)
+@receiver(post_save, sender=ProductoColor)
+@receiver(post_delete, sender=ProductoColor)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def actualizar_etiqueta_producto(sender, instance, **kwargs):
+    # Actualiza total_stock, etiqueta y actualizado_en sin re-guardar todo el producto
+    producto_id = instance.product_id if sender is ProductImage else instance.producto_id
+    refrescar_productos([producto_id])
@@ -0,0 +1,133 @@
+"""
+Cache en proceso de las tablas de referencia: Category, Material, Color y Talle.
+
+Son tablas chicas que casi no cambian, pero los serializers de producto y de
+carrito las leían en cada request: joins para category_name, talle_name,
+talles_disponibles..., y una consulta por tabla para validar color_id/talle_id.
+
+Cada proceso guarda las filas de cada tabla junto con su versión en el cache
+compartido (la misma de products/cache.py, que incrementan las señales de
+escritura). Si otro worker modificó una tabla, la versión cambió y se vuelve a
+leer con una consulta. Las señales de este proceso, además, la recargan apenas
+se confirma la transacción que escribió. Se leen siempre de la primaria: una foto
+de una réplica atrasada quedaría guardada con la versión nueva hasta la próxima escritura.
+
+Un request usa una sola foto de las tablas (Referencias), guardada en el
+contexto del serializer: las versiones se consultan una vez por request.
+Las instancias se comparten entre hilos: no se deben modificar.
+"""
+import threading
+from functools import partial
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Value
+from django.db.models.signals import post_delete, post_save
+
+from .cache import versiones
+
+# Todas con las mismas columnas: se leen juntas con un UNION ALL
+TABLAS_REFERENCIA = ('products.category', 'products.material', 'products.color', 'products.talle')
+CAMPOS = ('id', 'name', 'actualizado_en')
+
+# tabla -> (versión, {pk: instancia})
+_tablas = {}
+_lock = threading.Lock()
+
+
+def _cargar(versiones_por_tabla):
+    """Lee las tablas ({tabla: versión}) en una consulta y las guarda; devuelve {tabla: {pk: instancia}}"""
+    consultas = [
+        apps.get_model(tabla).objects.using(DEFAULT_DB_ALIAS).order_by().annotate(tabla=Value(tabla)).values_list('tabla', *CAMPOS)
+        for tabla in versiones_por_tabla
+    ]
+    filas = {tabla: {} for tabla in versiones_por_tabla}
+    for tabla, *valores in consultas[0].union(*consultas[1:], all=True):
+        filas[tabla][valores[0]] = apps.get_model(tabla).from_db(None, CAMPOS, valores)
+    with _lock:
+        for tabla, version in versiones_por_tabla.items():
+            _tablas[tabla] = (version, filas[tabla])
+    return filas
+
+
+class Referencias:
+    """Foto de las tablas de referencia para un request"""
+
+    def __init__(self, tablas):
+        self.tablas = tablas
+
+    @classmethod
+    def actuales(cls):
+        tablas, vencidas = {}, {}
+        for tabla, version in zip(TABLAS_REFERENCIA, versiones(TABLAS_REFERENCIA)):
+            guardada = _tablas.get(tabla)
+            if guardada is not None and guardada[0] == version:
+                tablas[tabla] = guardada[1]
+            else:
+                vencidas[tabla] = version
+        if vencidas:
+            tablas.update(_cargar(vencidas))
+        return cls(tablas)
+
+    def obtener(self, modelo, pk):
+        """Instancia por pk; una fila que no está en la foto (recién creada) se busca en la base"""
+        tabla = modelo._meta.label_lower
+        instancia = self.tablas[tabla].get(pk)
+        if instancia is None:
+            instancia = modelo.objects.using(DEFAULT_DB_ALIAS).filter(pk=pk).first()
+            if instancia is not None:
+                # Sin tocar el dict compartido entre requests
+                self.tablas[tabla] = {**self.tablas[tabla], pk: instancia}
+        return instancia
+
+    def nombre(self, modelo, pk):
+        instancia = self.obtener(modelo, pk)
+        return instancia.name if instancia is not None else None
+
+
+def referencias(context):
+    """La foto del request, guardada en el contexto del serializer (compartido con los anidados)"""
+    foto = context.get('referencias')
+    if foto is None:
+        foto = context['referencias'] = Referencias.actuales()
+    return foto
+
+
+def productos_que_usan(instancia):
+    """Ids de los productos que muestran el nombre de una categoría, material, color o talle"""
+    Product = apps.get_model('products.product')
+    campo = {
+        'products.category': 'category', 'products.material': 'material',
+        'products.color': 'color', 'products.talle': 'talle',
+    }[instancia._meta.label_lower]
+    ids = set(Product.objects.filter(**{campo: instancia}).values_list('pk', flat=True))
+    if campo == 'color':
+        ids |= set(instancia.productocolor_set.values_list('producto_id', flat=True))
+    if campo == 'talle':
+        ids |= set(instancia.productotalle_set.values_list('producto_id', flat=True))
+    return ids
+
+
+def limpiar():
+    with _lock:
+        _tablas.clear()
+
+
+# -----------------------------
+# Invalidación por señales
+# -----------------------------
+def _recargar(tabla):
+    _cargar({tabla: versiones([tabla])[0]})
+
+
+def _recargar_por_senal(sender, **kwargs):
+    # Al confirmar, después del on_commit de products/cache.py (se registra antes):
+    # se leen las filas confirmadas y la versión ya es la nueva
+    transaction.on_commit(partial(_recargar, sender._meta.label_lower))
+
+
+def conectar_senales():
+    for tabla in TABLAS_REFERENCIA:
+        modelo = apps.get_model(tabla)
+        post_save.connect(_recargar_por_senal, sender=modelo, dispatch_uid=f'referencias-save-{tabla}')
+        post_delete.connect(_recargar_por_senal, sender=modelo, dispatch_uid=f'referencias-delete-{tabla}')
@@ -0,0 +1,348 @@
+"""
+Búsqueda de texto completo del catálogo.
+
+El índice invertido vive en la misma base de datos:
+  - SQLite:   tabla virtual FTS5 products_product_fts (ranking bm25)
+  - Postgres: tabla products_product_search con un tsvector + índice GIN (ts_rank)
+
+El texto se normaliza en Python antes de indexar y de buscar (minúsculas, sin
+tildes, raíz en español), así que ambos motores indexan los mismos términos y
+la búsqueda por prefijo ("reme" -> remera, remeras) funciona igual en los dos.
+Con cualquier otro motor, buscar() devuelve None y se usa icontains.
+
+Los resultados no tienen tope: se paginan en la misma consulta del índice
+(COUNT para el total y LIMIT/OFFSET por página), y el admin filtra con una
+subconsulta de ids.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.db import connection as default_connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+
+from .cache import invalidar
+
+TABLA_SQLITE = 'products_product_fts'
+TABLA_POSTGRES = 'products_product_search'
+
+# Peso de cada columna en el ranking: nombre > categoría/material/color/talle > descripción
+PESO_NOMBRE, PESO_ATRIBUTOS, PESO_DESCRIPCION = 10.0, 4.0, 1.0
+
+# Sufijos del español, del más largo al más corto. Quitar género y número
+# hace que "remeras", "remera" y "remero" compartan la raíz "remer".
+SUFIJOS = (
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'uciones',
+    'adoras', 'adores', 'ancias', 'mente', 'acion', 'ucion', 'adora', 'ador',
+    'ancia', 'idad', 'ismo', 'able', 'ible', 'ista', 'osos', 'osas', 'oso', 'osa',
+    'es', 'os', 'as', 's', 'o', 'a', 'e',
+)
+LARGO_MINIMO_RAIZ = 3
+
+
+# -----------------------------
+# Normalización
+# -----------------------------
+def sin_tildes(texto):
+    return ''.join(
+        c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)
+    )
+
+
+@lru_cache(maxsize=50000)
+def raiz(palabra):
+    """Stemmer liviano para español (memoizado: el vocabulario del catálogo se repite mucho)"""
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def terminos(texto):
+    """'Remeras de Algodón' -> ['remer', 'de', 'algodon']"""
+    return [raiz(palabra) for palabra in re.findall(r'\w+', sin_tildes(texto or '').lower())]
+
+
+def normalizar(texto):
+    return ' '.join(terminos(texto))
+
+
+def documento(producto):
+    """(nombre, atributos, descripción) normalizados de un producto"""
+    atributos = [
+        producto.category.name if producto.category_id else '',
+        producto.material.name if producto.material_id else '',
+        producto.color.name if producto.color_id else '',
+        producto.talle.name if producto.talle_id else '',
+    ]
+    atributos += [pt.talle.name for pt in producto.productotalle_set.all()]
+    atributos += [pc.color.name for pc in producto.productocolor_set.all()]
+    return normalizar(producto.name), normalizar(' '.join(atributos)), normalizar(producto.description)
+
+
+# -----------------------------
+# Motores
+# -----------------------------
+class SQLiteFTS:
+    def crear(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_SQLITE} USING fts5("
+            f"name, atributos, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def borrar_tabla(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLA_SQLITE}')
+
+    def vaciar(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLA_SQLITE}')
+
+    def quitar(self, cursor, ids):
+        cursor.executemany(f'DELETE FROM {TABLA_SQLITE} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def guardar(self, cursor, filas):
+        self.quitar(cursor, [pk for pk, *_ in filas])
+        cursor.executemany(
+            f'INSERT INTO {TABLA_SQLITE} (rowid, name, atributos, description) VALUES (%s, %s, %s, %s)',
+            filas,
+        )
+
+    def coincidencias(self, raices, filtro=None):
+        # Cada término es un prefijo entre comillas: sin riesgo de sintaxis FTS5 en la entrada
+        consulta = ' '.join(f'"{r}"*' for r in raices)
+        return _restringir(f'SELECT rowid FROM {TABLA_SQLITE} WHERE {TABLA_SQLITE} MATCH %s', [consulta], 'rowid', filtro)
+
+    def buscar(self, cursor, raices, limite, desplazamiento=0, filtro=None):
+        sql, params = self.coincidencias(raices, filtro)
+        # rowid desempata: las páginas (OFFSET) no se solapan. LIMIT -1: sin límite
+        cursor.execute(
+            f'{sql} ORDER BY bm25({TABLA_SQLITE}, %s, %s, %s), rowid LIMIT %s OFFSET %s',
+            params + [PESO_NOMBRE, PESO_ATRIBUTOS, PESO_DESCRIPCION, -1 if limite is None else limite, desplazamiento],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+class PostgresTsvector:
+    # Los términos ya vienen normalizados: se indexan con la configuración 'simple'
+    DOCUMENTO = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'C')"
+    )
+
+    def crear(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLA_POSTGRES} ('
+            f'product_id bigint PRIMARY KEY, documento tsvector NOT NULL)'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TABLA_POSTGRES}_gin ON {TABLA_POSTGRES} USING GIN (documento)'
+        )
+
+    def borrar_tabla(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLA_POSTGRES}')
+
+    def vaciar(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLA_POSTGRES}')
+
+    def quitar(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLA_POSTGRES} WHERE product_id = ANY(%s)', [list(ids)])
+
+    def guardar(self, cursor, filas):
+        cursor.executemany(
+            f'INSERT INTO {TABLA_POSTGRES} (product_id, documento) VALUES (%s, {self.DOCUMENTO}) '
+            f'ON CONFLICT (product_id) DO UPDATE SET documento = EXCLUDED.documento',
+            filas,
+        )
+
+    def coincidencias(self, raices, filtro=None):
+        consulta = ' & '.join(f'{r}:*' for r in raices)
+        return _restringir(
+            f"SELECT product_id FROM {TABLA_POSTGRES}, to_tsquery('simple', %s) AS q WHERE documento @@ q",
+            [consulta], 'product_id', filtro,
+        )
+
+    def buscar(self, cursor, raices, limite, desplazamiento=0, filtro=None):
+        sql, params = self.coincidencias(raices, filtro)
+        # ts_rank recibe los pesos en orden {D, C, B, A}; product_id desempata. LIMIT NULL: sin límite
+        pesos = [0.0, PESO_DESCRIPCION / PESO_NOMBRE, PESO_ATRIBUTOS / PESO_NOMBRE, 1.0]
+        cursor.execute(
+            f'{sql} ORDER BY ts_rank(%s::float4[], documento, q) DESC, product_id LIMIT %s OFFSET %s',
+            params + [pesos, limite, desplazamiento],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _restringir(sql, params, columna, filtro):
+    """Agrega 'AND columna IN (subconsulta)' con el (sql, params) de un queryset de ids"""
+    if filtro is None:
+        return sql, params
+    sql_filtro, params_filtro = filtro
+    return f'{sql} AND {columna} IN ({sql_filtro})', [*params, *params_filtro]
+
+
+def get_motor(connection=None):
+    vendor = (connection or default_connection).vendor
+    if vendor == 'sqlite':
+        return SQLiteFTS()
+    if vendor == 'postgresql':
+        return PostgresTsvector()
+    return None
+
+
+# -----------------------------
+# API del índice
+# -----------------------------
+def crear_indice(connection=None):
+    connection = connection or default_connection
+    motor = get_motor(connection)
+    if motor:
+        with connection.cursor() as cursor:
+            motor.crear(cursor)
+
+
+def indexar_productos(ids, queryset=None):
+    """(Re)indexa los productos indicados; los que ya no existen se quitan del índice"""
+    motor = get_motor()
+    ids = set(ids)
+    if motor is None or not ids:
+        return
+    if queryset is None:
+        from .models import Product
+        queryset = Product.objects.all()
+    productos = queryset.filter(pk__in=ids).select_related(
+        'category', 'material', 'color', 'talle'
+    ).prefetch_related('productotalle_set__talle', 'productocolor_set__color')
+    filas = [(p.pk, *documento(p)) for p in productos]
+    # Una transacción: en autocommit cada fila del executemany sería un commit
+    with transaction.atomic(), default_connection.cursor() as cursor:
+        motor.quitar(cursor, ids - {pk for pk, *_ in filas})
+        if filas:
+            motor.guardar(cursor, filas)
+
+
+def guardar_documentos(documentos):
+    """
+    Indexa productos a partir de sus textos ya en memoria, sin volver a leerlos
+    de la base: [(pk, nombre, [nombres de categoría/material/talles/colores], descripción)]
+    """
+    motor = get_motor()
+    if motor is None or not documentos:
+        return
+    filas = [
+        (pk, normalizar(nombre), normalizar(' '.join(atributos)), normalizar(descripcion))
+        for pk, nombre, atributos, descripcion in documentos
+    ]
+    with transaction.atomic(), default_connection.cursor() as cursor:
+        motor.guardar(cursor, filas)
+
+
+def reconstruir_indice(queryset=None, lote=500):
+    """Vacía y vuelve a llenar el índice completo"""
+    motor = get_motor()
+    if motor is None:
+        return 0
+    if queryset is None:
+        from .models import Product
+        queryset = Product.objects.all()
+    with default_connection.cursor() as cursor:
+        motor.crear(cursor)
+        motor.vaciar(cursor)
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), lote):
+        indexar_productos(ids[inicio:inicio + lote], queryset)
+    # Las respuestas cacheadas de /search/ pueden haber cambiado
+    invalidar('products.product')
+    return len(ids)
+
+
+class Resultados:
+    """
+    Ids que coinciden con una búsqueda, por relevancia. Se paginan en la base:
+    count() es un COUNT y cada rebanada ([inicio:fin]) un LIMIT/OFFSET.
+    """
+
+    def __init__(self, motor, raices, queryset=None):
+        self.motor = motor
+        self.raices = raices
+        # Solo los ids del queryset (filtros facetados), como subconsulta
+        self.filtro = None if queryset is None else queryset.order_by().values('pk').query.sql_with_params()
+
+    def count(self):
+        if not self.raices:
+            return 0
+        sql, params = self.motor.coincidencias(self.raices, self.filtro)
+        with default_connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM ({sql}) AS coincidencias', params)
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        inicio = indice.start or 0
+        limite = None if indice.stop is None else max(indice.stop - inicio, 0)
+        if not self.raices or limite == 0:
+            return []
+        with default_connection.cursor() as cursor:
+            return self.motor.buscar(cursor, self.raices, limite, inicio, self.filtro)
+
+    def __iter__(self):
+        return iter(self[0:])
+
+    def filtrar(self, queryset):
+        """El queryset restringido a los que coinciden, con una subconsulta (sin traer los ids)"""
+        if not self.raices:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(*self.motor.coincidencias(self.raices, self.filtro)))
+
+
+def buscar(texto, queryset=None):
+    """
+    Productos que coinciden con todos los términos (como prefijo), ordenados por
+    relevancia (Resultados); con queryset, solo los que están en él. None si la
+    base no tiene índice de texto.
+    """
+    motor = get_motor()
+    if motor is None:
+        return None
+    return Resultados(motor, [t for t in terminos(texto) if t], queryset)
+
+
+# -----------------------------
+# Mantenimiento por señales
+# -----------------------------
+def _producto_guardado(sender, instance, **kwargs):
+    indexar_productos([instance.pk])
+
+
+def _producto_borrado(sender, instance, **kwargs):
+    indexar_productos([instance.pk])
+
+
+def _fila_de_stock(sender, instance, created=True, **kwargs):
+    # Cambiar solo el stock no cambia el texto indexado
+    if created:
+        indexar_productos([instance.producto_id])
+
+
+def _fila_de_stock_borrada(sender, instance, **kwargs):
+    indexar_productos([instance.producto_id])
+
+
+def _nombre_auxiliar(sender, instance, created=False, **kwargs):
+    """Renombrar una categoría, material, color o talle reindexa sus productos"""
+    if created:
+        return
+    from .referencias import productos_que_usan
+    indexar_productos(productos_que_usan(instance))
+
+
+def conectar_senales():
+    from .models import Product, ProductoTalle, ProductoColor, Category, Material, Color, Talle
+    post_save.connect(_producto_guardado, sender=Product, dispatch_uid='busqueda-producto')
+    post_delete.connect(_producto_borrado, sender=Product, dispatch_uid='busqueda-producto-borrado')
+    for modelo in (ProductoTalle, ProductoColor):
+        post_save.connect(_fila_de_stock, sender=modelo, dispatch_uid=f'busqueda-{modelo.__name__}')
+        post_delete.connect(_fila_de_stock_borrada, sender=modelo, dispatch_uid=f'busqueda-{modelo.__name__}-borrado')
+    for modelo in (Category, Material, Color, Talle):
+        post_save.connect(_nombre_auxiliar, sender=modelo, dispatch_uid=f'busqueda-{modelo.__name__}')
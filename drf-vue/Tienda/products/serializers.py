@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Category, Material, Product, Color, Talle, ProductoTalle, ProductoColor, ProductImage
+from .referencias import referencias
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,15 +27,75 @@ class ProductImageSerializer(serializers.ModelSerializer):
         model = ProductImage
         fields = ['id', 'image', 'order', 'alt_text']
 
+
+class NombreReferenciaField(serializers.ReadOnlyField):
+    """Nombre de una categoría, material, color o talle por el id de la FK (source='<fk>_id'), sin join"""
+
+    def __init__(self, modelo, **kwargs):
+        self.modelo = modelo
+        super().__init__(**kwargs)
+
+    def to_representation(self, pk):
+        return referencias(self.context).nombre(self.modelo, pk)
+
+
+class ReferenciaField(serializers.ReadOnlyField):
+    """La fila completa de una tabla de referencia, con serializer_class, sin join ni consulta"""
+
+    def __init__(self, modelo, serializer_class, **kwargs):
+        self.modelo = modelo
+        self.serializer_class = serializer_class
+        super().__init__(**kwargs)
+
+    def to_representation(self, pk):
+        instancia = referencias(self.context).obtener(self.modelo, pk)
+        return self.serializer_class(instancia).data if instancia is not None else None
+
+
+def _lista_param(valor):
+    return {campo.strip() for campo in (valor or '').split(',') if campo.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Campos a pedido del cliente (solo en lecturas):
+      ?fields=id,name,price  -> devuelve solo esas columnas
+      ?expand=images         -> agrega campos opcionales (Meta.expandable_fields)
+    """
+
+    @classmethod
+    def campos_pedidos(cls, request):
+        """Nombres de los campos que se van a serializar para este request"""
+        todos = list(cls.Meta.fields)
+        expandibles = set(getattr(cls.Meta, 'expandable_fields', ()))
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return [campo for campo in todos if campo not in expandibles]
+
+        pedidos = _lista_param(request.query_params.get('fields'))
+        expand = _lista_param(request.query_params.get('expand'))
+        if pedidos:
+            return [campo for campo in todos if campo in pedidos or campo in expand]
+        return [campo for campo in todos if campo not in expandibles or campo in expand]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'request' not in self.context:
+            # Serializer anidado o usado fuera de una vista: todos los campos por defecto
+            return
+        campos = set(self.campos_pedidos(self.context['request']))
+        for nombre in list(self.fields):
+            if nombre not in campos:
+                self.fields.pop(nombre)
+
 # serializers.py
-class ProductSerializer(serializers.ModelSerializer):
-    category_name = serializers.ReadOnlyField(source='category.name')
-    material_name = serializers.ReadOnlyField(source='material.name')
-    color_name = serializers.CharField(source='color.name', read_only=True, allow_null=True)
-    talle_name = serializers.CharField(source='talle.name', read_only=True, allow_null=True)
-
-    # Campo calculado de stock total
-    total_stock = serializers.SerializerMethodField()
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category_name = NombreReferenciaField(Category, source='category_id')
+    material_name = NombreReferenciaField(Material, source='material_id')
+    color_name = NombreReferenciaField(Color, source='color_id')
+    talle_name = NombreReferenciaField(Talle, source='talle_id')
+
+    # Stock total (columna desnormalizada)
+    total_stock = serializers.ReadOnlyField()
     
     # Nuevos campos para talles y colores disponibles
     talles_disponibles = serializers.SerializerMethodField()
@@ -46,7 +107,7 @@ class ProductSerializer(serializers.ModelSerializer):
     # Campos adicionales
     is_on_sale = serializers.ReadOnlyField()
     profit_margin = serializers.ReadOnlyField()
-    etiqueta = serializers.SerializerMethodField()
+    etiqueta = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
@@ -58,46 +119,23 @@ class ProductSerializer(serializers.ModelSerializer):
             'images', 'is_on_sale', 'profit_margin', 'etiqueta'
         ]
 
-    def get_total_stock(self, obj):
-        """Calcula el stock total basado en ProductoTalle"""
-        try:
-            stock_total = sum(pt.stock for pt in ProductoTalle.objects.filter(producto=obj))
-            return stock_total
-        except:
-            return 0
-    
     def get_talles_disponibles(self, obj):
-        """Obtiene talles que tienen stock > 0"""
-        try:
-            talles_con_stock = ProductoTalle.objects.filter(
-                producto=obj, 
-                stock__gt=0
-            ).select_related('talle')
-            return [{"talle": pt.talle.name, "stock": pt.stock} for pt in talles_con_stock]
-        except:
-            return []
+        """Obtiene talles que tienen stock > 0 (prefetch de with_catalog_data)"""
+        nombres = referencias(self.context)
+        return [{"talle": nombres.nombre(Talle, pt.talle_id), "stock": pt.stock} for pt in obj.get_talles_en_stock()]
     
     def get_colores_disponibles(self, obj):
-        """Obtiene colores que tienen stock > 0"""
-        try:
-            colores_con_stock = ProductoColor.objects.filter(
-                producto=obj, 
-                stock__gt=0
-            ).select_related('color')
-            return [{"color": pc.color.name, "stock": pc.stock} for pc in colores_con_stock]
-        except:
-            return []
-
-    def get_etiqueta(self, obj):
-        """Devuelve la etiqueta del producto"""
-        return obj.calcular_etiqueta()
-
-class ProductListSerializer(serializers.ModelSerializer):
-    category_name = serializers.CharField(source='category.name', read_only=True)
-    material_name = serializers.CharField(source='material.name', read_only=True)
-    color_name = serializers.CharField(source='color.name', read_only=True, allow_null=True)
-    talle_name = serializers.CharField(source='talle.name', read_only=True, allow_null=True)
-    total_stock = serializers.SerializerMethodField()
+        """Obtiene colores que tienen stock > 0 (prefetch de with_catalog_data)"""
+        nombres = referencias(self.context)
+        return [{"color": nombres.nombre(Color, pc.color_id), "stock": pc.stock} for pc in obj.get_colores_en_stock()]
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Representación compacta para grillas y listados"""
+    category_name = NombreReferenciaField(Category, source='category_id')
+    material_name = NombreReferenciaField(Material, source='material_id')
+    color_name = NombreReferenciaField(Color, source='color_id')
+    talle_name = NombreReferenciaField(Talle, source='talle_id')
+    total_stock = serializers.ReadOnlyField()
     
     # Nuevos campos para talles y colores disponibles
     talles_disponibles = serializers.SerializerMethodField()
@@ -106,9 +144,12 @@ class ProductListSerializer(serializers.ModelSerializer):
     # Campo para compatibilidad (imagen principal)
     image = serializers.SerializerMethodField()
 
+    # Todas las imágenes, solo con ?expand=images
+    images = ProductImageSerializer(many=True, read_only=True)
+
     # Campos adicionales para la lista
     is_on_sale = serializers.ReadOnlyField()
-    etiqueta = serializers.SerializerMethodField()
+    etiqueta = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
@@ -117,43 +158,20 @@ class ProductListSerializer(serializers.ModelSerializer):
             'material', 'material_name', 'color', 'color_name',
             'talle', 'talle_name', 'price', 'sale_price', 'total_stock',
             'talles_disponibles', 'colores_disponibles', 'is_on_sale', 'etiqueta',
-            'fecha_creacion'
+            'fecha_creacion', 'description', 'images'
         ]
+        expandable_fields = ['description', 'images']
 
     def get_image(self, obj):
         """Devuelve la imagen principal para compatibilidad"""
         return obj.main_image
 
-    def get_total_stock(self, obj):
-        """Calcula el stock total basado en ProductoTalle"""
-        try:
-            stock_total = sum(pt.stock for pt in ProductoTalle.objects.filter(producto=obj))
-            return stock_total
-        except:
-            return 0
-    
     def get_talles_disponibles(self, obj):
-        """Obtiene talles que tienen stock > 0"""
-        try:
-            talles_con_stock = ProductoTalle.objects.filter(
-                producto=obj, 
-                stock__gt=0
-            ).select_related('talle')
-            return [pt.talle.name for pt in talles_con_stock]
-        except:
-            return []
+        """Obtiene talles que tienen stock > 0 (prefetch de with_catalog_data)"""
+        nombres = referencias(self.context)
+        return [{"talle": nombres.nombre(Talle, pt.talle_id), "stock": pt.stock} for pt in obj.get_talles_en_stock()]
     
     def get_colores_disponibles(self, obj):
-        """Obtiene colores que tienen stock > 0"""
-        try:
-            colores_con_stock = ProductoColor.objects.filter(
-                producto=obj, 
-                stock__gt=0
-            ).select_related('color')
-            return [pc.color.name for pc in colores_con_stock]
-        except:
-            return []
-
-    def get_etiqueta(self, obj):
-        """Devuelve la etiqueta del producto"""
-        return obj.calcular_etiqueta()
\ No newline at end of file
+        """Obtiene colores que tienen stock > 0 (prefetch de with_catalog_data)"""
+        nombres = referencias(self.context)
+        return [{"color": nombres.nombre(Color, pc.color_id), "stock": pc.stock} for pc in obj.get_colores_en_stock()]
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Actualización masiva de stock (sincronización con el depósito).
+
+Cada fila cambia el stock de un talle o de un color de un producto:
+
+  {"product_id": 1, "talle": "M", "stock": 5}        stock absoluto
+  {"product_id": 1, "color_id": 3, "delta": -2}      movimiento (+ ingreso, - egreso)
+
+Talles y colores se indican por nombre (talle/color) o por id (talle_id/color_id).
+Las filas de una misma combinación producto/talle o producto/color se aplican
+en el orden recibido; un delta sobre una combinación que no existe parte de 0.
+
+Las filas válidas se aplican en una sola transacción: una lectura y un upsert
+(bulk_create con update_conflicts) por tabla, y total_stock/etiqueta se
+recalculan una vez por producto al final. Las inválidas (producto o talle
+inexistente, stock negativo) se informan en el resultado sin frenar al resto.
+El resultado queda guardado con el batch_id del lote: reenviar el mismo lote
+devuelve ese resultado sin volver a aplicarlo.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidar
+from .models import Color, LoteStock, Product, ProductoColor, ProductoTalle, Talle, refresco_diferido
+from .search import indexar_productos
+
+MAX_FILAS = 10000
+
+# dimensión -> (tabla de stock, tabla auxiliar)
+DIMENSIONES = {'talle': (ProductoTalle, Talle), 'color': (ProductoColor, Color)}
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+def _entero(valor, campo):
+    if isinstance(valor, (bool, float)):
+        raise FilaInvalida(f'{campo} debe ser un número entero')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise FilaInvalida(f'{campo} debe ser un número entero')
+
+
+def leer_fila(fila):
+    """(producto_id, dimensión, por_id, talle/color, 'stock' o 'delta', valor)"""
+    if not isinstance(fila, dict):
+        raise FilaInvalida('Cada fila debe ser un objeto')
+    producto_id = _entero(fila.get('product_id'), 'product_id')
+
+    referencias = [
+        (dimension, campo) for dimension in DIMENSIONES for campo in (dimension, f'{dimension}_id')
+        if fila.get(campo) not in (None, '')
+    ]
+    if len(referencias) != 1:
+        raise FilaInvalida('Cada fila lleva uno solo de talle, talle_id, color o color_id')
+    dimension, campo = referencias[0]
+    por_id = campo.endswith('_id')
+    referencia = _entero(fila[campo], campo) if por_id else str(fila[campo]).strip()
+
+    operaciones = [operacion for operacion in ('stock', 'delta') if fila.get(operacion) is not None]
+    if len(operaciones) != 1:
+        raise FilaInvalida('Cada fila lleva stock o delta (uno de los dos)')
+    operacion = operaciones[0]
+    valor = _entero(fila[operacion], operacion)
+    if operacion == 'stock' and valor < 0:
+        raise FilaInvalida('stock no puede ser negativo')
+    return producto_id, dimension, por_id, referencia, operacion, valor
+
+
+def _resolver(leidas, rechazar):
+    """
+    Agrupa los movimientos por (dimensión, producto, talle/color) con los ids ya
+    resueltos: una consulta para los productos y dos por dimensión (nombres e ids)
+    """
+    productos = set(Product.objects.filter(
+        pk__in={producto_id for _, producto_id, *_ in leidas}
+    ).values_list('pk', flat=True))
+
+    resueltos = {}
+    for dimension, (_, auxiliar) in DIMENSIONES.items():
+        nombres = {ref for _, _, dim, por_id, ref, *_ in leidas if dim == dimension and not por_id}
+        ids = {ref for _, _, dim, por_id, ref, *_ in leidas if dim == dimension and por_id}
+        resueltos[dimension] = {
+            False: dict(auxiliar.objects.filter(name__in=nombres).values_list('name', 'pk')),
+            True: {pk: pk for pk in auxiliar.objects.filter(pk__in=ids).values_list('pk', flat=True)},
+        }
+
+    movimientos = defaultdict(list)
+    for indice, producto_id, dimension, por_id, referencia, operacion, valor in leidas:
+        if producto_id not in productos:
+            rechazar(indice, f'No existe el producto {producto_id}')
+            continue
+        auxiliar_id = resueltos[dimension][por_id].get(referencia)
+        if auxiliar_id is None:
+            rechazar(indice, f'No existe el {dimension} {referencia!r}')
+            continue
+        movimientos[dimension, producto_id, auxiliar_id].append((indice, operacion, valor))
+    return movimientos
+
+
+def _aplicar(filas):
+    rechazadas = []
+
+    def rechazar(indice, error):
+        rechazadas.append({'fila': indice, 'error': error})
+
+    leidas = []
+    for indice, fila in enumerate(filas):
+        try:
+            leidas.append((indice, *leer_fila(fila)))
+        except FilaInvalida as e:
+            rechazar(indice, str(e))
+    movimientos = _resolver(leidas, rechazar)
+
+    aplicadas = 0
+    productos = set()
+    ahora = timezone.now()
+    for dimension, (modelo, _) in DIMENSIONES.items():
+        claves = {(producto_id, auxiliar_id) for dim, producto_id, auxiliar_id in movimientos if dim == dimension}
+        if not claves:
+            continue
+        # Stock actual de las combinaciones del lote, bloqueado hasta el final de la transacción
+        actuales = {
+            (producto_id, auxiliar_id): stock
+            for producto_id, auxiliar_id, stock in modelo.objects.select_for_update().filter(
+                producto_id__in={producto_id for producto_id, _ in claves},
+                **{f'{dimension}_id__in': {auxiliar_id for _, auxiliar_id in claves}},
+            ).values_list('producto_id', f'{dimension}_id', 'stock')
+            if (producto_id, auxiliar_id) in claves
+        }
+
+        filas_stock, nuevos = [], set()
+        for producto_id, auxiliar_id in sorted(claves):
+            actual = actuales.get((producto_id, auxiliar_id))
+            stock = actual or 0
+            for indice, operacion, valor in movimientos[dimension, producto_id, auxiliar_id]:
+                if operacion == 'delta' and stock + valor < 0:
+                    rechazar(indice, f'El stock quedaría negativo ({stock} {valor:+d})')
+                    continue
+                stock = valor if operacion == 'stock' else stock + valor
+                aplicadas += 1
+            if stock == actual:
+                continue
+            filas_stock.append(modelo(
+                producto_id=producto_id, stock=stock, actualizado_en=ahora, **{f'{dimension}_id': auxiliar_id}
+            ))
+            productos.add(producto_id)
+            if actual is None:
+                nuevos.add(producto_id)
+
+        if filas_stock:
+            modelo.objects.bulk_create(
+                filas_stock, indexar=False, update_conflicts=True,
+                unique_fields=['producto', dimension], update_fields=['stock', 'actualizado_en'],
+            )
+            invalidar(modelo._meta.label_lower)
+            # Solo las combinaciones nuevas agregan texto (nombres de talle/color) al índice
+            indexar_productos(nuevos)
+
+    rechazadas.sort(key=lambda rechazada: rechazada['fila'])
+    return {'aplicadas': aplicadas, 'rechazadas': rechazadas, 'productos': len(productos)}
+
+
+def aplicar_lote(lote_id, filas):
+    """Aplica el lote una sola vez por lote_id; devuelve (resultado, repetido)"""
+    with transaction.atomic():
+        lote, creado = LoteStock.objects.get_or_create(lote_id=lote_id)
+        if not creado:
+            return lote.resultado, True
+        # Un solo refresco de total_stock/etiqueta por producto, al final del lote
+        with refresco_diferido():
+            resultado = {'batch_id': lote_id, **_aplicar(filas)}
+        lote.resultado = resultado
+        lote.save(update_fields=['resultado'])
+    return resultado, False
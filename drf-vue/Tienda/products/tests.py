@@ -1,3 +1,1286 @@
-from django.test import TestCase
+import json
+import re
+import tempfile
+from contextlib import nullcontext
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from Tienda import metricas, replicas
+from Tienda.pagination import ProductCursorPagination
+from . import documentos, referencias, search
+from .admin import ProductAdmin
+from .cache import get_cache, invalidar, versiones
+
+from .models import (
+    Category, Material, Color, Talle, Product, ProductImage, ProductoTalle, ProductoColor, DocumentoProducto,
+)
+
+
+def crear_productos(cantidad, category, material, talle, color, offset=0):
+    """Crea productos completos (imágenes, talles y colores con stock)"""
+    productos = []
+    for i in range(offset, offset + cantidad):
+        producto = Product.objects.create(
+            name=f'Producto {i:04d}', category=category, material=material,
+            color=color, talle=talle, price=1000, price_cost=500, sale_price=800,
+        )
+        ProductImage.objects.create(product=producto, image=f'https://img.test/{i}-a.jpg', order=0)
+        ProductImage.objects.create(product=producto, image=f'https://img.test/{i}-b.jpg', order=1)
+        ProductoTalle.objects.create(producto=producto, talle=talle, stock=3)
+        ProductoColor.objects.create(producto=producto, color=color, stock=2)
+        productos.append(producto)
+    return productos
+
+
+class CatalogoTestMixin:
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        with self.confirmar():
+            self.category = Category.objects.create(name='Remeras')
+            self.material = Material.objects.create(name='Algodón')
+            self.talle = Talle.objects.create(name='M')
+            self.color = Color.objects.create(name='Negro')
+
+    def confirmar(self):
+        """Las escrituras del bloque cuentan como confirmadas: corren sus on_commit (versiones del cache)"""
+        if isinstance(self, TestCase):
+            return self.captureOnCommitCallbacks(execute=True)
+        # TransactionTestCase: cada escritura ya se confirma
+        return nullcontext()
+
+    def crear_productos(self, cantidad, offset=0):
+        with self.confirmar():
+            return crear_productos(cantidad, self.category, self.material, self.talle, self.color, offset)
+
+
+class ProductQueryCountTest(CatalogoTestMixin, TestCase):
+    """La cantidad de consultas por listado no debe crecer con el catálogo"""
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_consultas_constantes(self, url):
+        self.crear_productos(3)
+        pocas = self.contar_consultas(url)
+        self.crear_productos(20, offset=3)
+        muchas = self.contar_consultas(url)
+        self.assertEqual(pocas, muchas)
+
+    def test_list(self):
+        self.assert_consultas_constantes('/api/products/')
+
+    def test_by_category(self):
+        self.assert_consultas_constantes(f'/api/products/by_category/?category={self.category.id}')
+
+    def test_on_sale(self):
+        self.assert_consultas_constantes('/api/products/on_sale/')
+
+    def test_new_arrivals(self):
+        self.assert_consultas_constantes('/api/products/new_arrivals/')
+
+    def test_category_products(self):
+        self.assert_consultas_constantes(f'/api/categories/{self.category.id}/products/')
+
+    def test_datos_prefetcheados(self):
+        producto = self.crear_productos(1)[0]
+        ProductoTalle.objects.create(producto=producto, talle=Talle.objects.create(name='L'), stock=0)
+        data = self.client.get(f'/api/products/{producto.id}/').json()
+        self.assertEqual(data['total_stock'], 3)
+        self.assertEqual(data['talles_disponibles'], [{'talle': 'M', 'stock': 3}])
+        self.assertEqual(data['colores_disponibles'], [{'color': 'Negro', 'stock': 2}])
+        self.assertEqual(data['category_name'], 'Remeras')
+        self.assertEqual(len(data['images']), 2)
+        self.assertEqual(data['etiqueta'], 'Descuento')
+
+
+class ProductPaginationTest(CatalogoTestMixin, TestCase):
+    def recorrer(self, url):
+        """Sigue los cursores 'next' y devuelve los nombres en orden"""
+        nombres = []
+        while url:
+            data = self.client.get(url).json()
+            nombres += [p['name'] for p in data['results']]
+            url = data['next']
+        return nombres
+
+    def test_cursor_recorre_todo_en_orden(self):
+        self.crear_productos(7)
+        nombres = self.recorrer('/api/products/?page_size=3')
+        self.assertEqual(nombres, sorted(nombres))
+        self.assertEqual(len(nombres), 7)
+
+    def test_acciones_paginadas(self):
+        self.crear_productos(5)
+        for url in ['/api/products/on_sale/?page_size=2', '/api/products/new_arrivals/?page_size=2',
+                    f'/api/products/by_category/?category={self.category.id}&page_size=2',
+                    f'/api/categories/{self.category.id}/products/?page_size=2']:
+            data = self.client.get(url).json()
+            self.assertEqual(len(data['results']), 2, url)
+            self.assertIsNotNone(data['next'], url)
+
+    def test_page_size_tiene_tope(self):
+        self.crear_productos(3)
+        with mock.patch.object(ProductCursorPagination, 'max_page_size', 2):
+            data = self.client.get('/api/products/', {'page_size': 10 ** 6}).json()
+        self.assertEqual(len(data['results']), 2)
+
+
+class EtiquetaDesnormalizadaTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = Product.objects.create(
+            name='Buzo', category=self.category, price=1000,
+            fecha_creacion=timezone.now() - timedelta(days=30),
+        )
+
+    def refrescar(self):
+        self.producto.refresh_from_db()
+        return self.producto.total_stock, self.producto.etiqueta
+
+    def test_save_y_delete_de_talle(self):
+        pt = ProductoTalle.objects.create(producto=self.producto, talle=self.talle, stock=1)
+        self.assertEqual(self.refrescar(), (1, 'Última unidad'))
+        pt.stock = 4
+        pt.save()
+        self.assertEqual(self.refrescar(), (4, None))
+        pt.delete()
+        self.assertEqual(self.refrescar(), (0, None))
+
+    def test_operaciones_masivas(self):
+        otro = Talle.objects.create(name='L')
+        ProductoTalle.objects.bulk_create([
+            ProductoTalle(producto=self.producto, talle=self.talle, stock=2),
+            ProductoTalle(producto=self.producto, talle=otro, stock=3),
+        ])
+        self.assertEqual(self.refrescar(), (5, None))
+        ProductoTalle.objects.filter(talle=otro).update(stock=0)
+        self.assertEqual(self.refrescar(), (2, None))
+        ProductoTalle.objects.filter(talle=self.talle).update(stock=1)
+        self.assertEqual(self.refrescar(), (1, 'Última unidad'))
+        ProductoTalle.objects.all().delete()
+        self.assertEqual(self.refrescar(), (0, None))
+
+    def test_save_de_producto_recalcula_etiqueta(self):
+        self.producto.sale_price = 500
+        self.producto.save()
+        self.assertEqual(self.refrescar(), (0, 'Descuento'))
+
+    def test_vencimiento_de_nuevo_ingreso(self):
+        nuevo = Product.objects.create(name='Nuevo', category=self.category, price=100)
+        self.assertEqual(nuevo.etiqueta, 'Nuevo ingreso')
+        Product.objects.vencer_nuevos_ingresos(ahora=timezone.now() + timedelta(days=8))
+        nuevo.refresh_from_db()
+        self.assertIsNone(nuevo.etiqueta)
+
+    def test_filtro_por_etiqueta(self):
+        ProductoTalle.objects.create(producto=self.producto, talle=self.talle, stock=1)
+        Product.objects.create(name='Otro', category=self.category, price=100)
+        data = self.client.get('/api/products/', {'etiqueta': 'Última unidad'}).json()
+        self.assertEqual([p['name'] for p in data['results']], ['Buzo'])
+
+    def test_comando_verifica_y_reconstruye(self):
+        ProductoTalle.objects.create(producto=self.producto, talle=self.talle, stock=1)
+        Product.objects.filter(pk=self.producto.pk).update(total_stock=9, etiqueta=None)
+        with self.assertRaises(CommandError):
+            call_command('recalcular_etiquetas', verificar=True, stdout=StringIO())
+        call_command('recalcular_etiquetas', stdout=StringIO())
+        call_command('recalcular_etiquetas', verificar=True, stdout=StringIO())
+        self.assertEqual(self.refrescar(), (1, 'Última unidad'))
+
+
+class SparseFieldsTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_productos(1)[0]
+
+    def test_listado_compacto_por_defecto(self):
+        item = self.client.get('/api/products/').json()['results'][0]
+        self.assertEqual(item['image'], 'https://img.test/0-a.jpg')
+        self.assertEqual(item['talles_disponibles'], [{'talle': 'M', 'stock': 3}])
+        for campo in ['images', 'description', 'price_cost', 'profit_margin']:
+            self.assertNotIn(campo, item)
+
+    def test_expand_images(self):
+        item = self.client.get('/api/products/', {'expand': 'images'}).json()['results'][0]
+        self.assertEqual(len(item['images']), 2)
+
+    def test_fields_limita_columnas(self):
+        item = self.client.get('/api/products/', {'fields': 'id,name,price'}).json()['results'][0]
+        self.assertEqual(set(item), {'id', 'name', 'price'})
+        detalle = self.client.get(f'/api/products/{self.producto.id}/', {'fields': 'id,profit_margin'}).json()
+        self.assertEqual(set(detalle), {'id', 'profit_margin'})
+
+    def test_sin_imagenes_no_hay_prefetch_de_imagenes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/products/', {'fields': 'id,name'})
+        tablas = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('products_productimage', tablas)
+        self.assertNotIn('producto_talle', tablas)
+
+
+class CatalogoCacheTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_productos(1)[0]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_segunda_lectura_sin_consultas(self):
+        self.assertEqual(self.get('/api/products/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['results'][0]['name'], self.producto.name)
+
+    def test_query_params_son_parte_de_la_clave(self):
+        self.get('/api/products/')
+        self.assertEqual(self.get('/api/products/?fields=id')['X-Cache'], 'MISS')
+
+    def test_escrituras_invalidan(self):
+        url = f'/api/products/{self.producto.id}/'
+        escrituras = [
+            lambda: Product.objects.filter(pk=self.producto.pk).first().save(),
+            lambda: ProductImage.objects.create(product=self.producto, image='https://img.test/x.jpg'),
+            lambda: ProductoTalle.objects.filter(producto=self.producto).update(stock=1),
+            lambda: ProductoColor.objects.get(producto=self.producto).delete(),
+            lambda: Category.objects.filter(pk=self.category.pk).first().save(),
+            lambda: Material.objects.create(name='Lino'),
+        ]
+        for escribir in escrituras:
+            self.get(url)
+            self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+            with self.confirmar():
+                escribir()
+            self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(url).json()['etiqueta'], 'Última unidad')
+
+    def test_version_cambia_al_confirmar(self):
+        url = f'/api/products/{self.producto.id}/'
+        antes = versiones(['products.product'])
+        self.get(url)
+        with self.confirmar():
+            with transaction.atomic():
+                Product.objects.get(pk=self.producto.pk).save()
+            # Sin confirmar: otro lector todavía ve la fila vieja
+            self.assertEqual(versiones(['products.product']), antes)
+            self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+        self.assertNotEqual(versiones(['products.product']), antes)
+        self.assertEqual(self.get(url)['X-Cache'], 'MISS')
+
+    def test_transaccion_revertida_no_invalida(self):
+        antes = versiones(['products.product'])
+        with self.confirmar(), self.assertRaises(ValueError):
+            with transaction.atomic():
+                Product.objects.get(pk=self.producto.pk).save()
+                raise ValueError
+        self.assertEqual(versiones(['products.product']), antes)
+
+    def test_estadisticas(self):
+        self.get('/api/categories/')
+        self.get('/api/categories/')
+        self.get('/api/categories/with_products/')
+        self.assertEqual(
+            self.client.get('/api/cache/stats/').json(),
+            {'hits': 1, 'misses': 2, 'hit_ratio': 0.3333}
+        )
+
+
+class ConditionalGetTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_productos(1)[0]
+
+    def assert_304_sin_serializar(self, url, consultas=0, **headers):
+        with self.assertNumQueries(consultas):
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_none_match(self):
+        # El detalle solo lee actualizado_en de su fila
+        for url, consultas in [('/api/products/', 0), (f'/api/products/{self.producto.id}/', 1),
+                               ('/api/categories/', 0), (f'/api/materials/{self.material.id}/products/', 0)]:
+            primera = self.client.get(url)
+            self.assertEqual(primera.status_code, 200)
+            self.assertTrue(primera['ETag'].startswith('"'))
+            self.assert_304_sin_serializar(url, consultas, if_none_match=primera['ETag'])
+
+    def test_if_modified_since(self):
+        url = f'/api/products/{self.producto.id}/'
+        primera = self.client.get(url)
+        self.assertIn('Last-Modified', primera)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={'if_modified_since': primera['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambios_relacionados_cambian_el_etag(self):
+        url = f'/api/products/{self.producto.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.confirmar():
+            ProductoColor.objects.filter(producto=self.producto).update(stock=7)
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.confirmar():
+            ProductImage.objects.filter(product=self.producto).first().delete()
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['images']), 1)
+
+    def test_etag_nuevo_recien_al_confirmar(self):
+        # Un ETag entregado antes del commit acompaña a las filas viejas: no puede ser el definitivo
+        url = '/api/products/'
+        etag = self.client.get(url)['ETag']
+        with self.confirmar():
+            ProductoColor.objects.filter(producto=self.producto).update(stock=7)
+            self.assertEqual(self.client.get(url)['ETag'], etag)
+        response = self.client.get(url, headers={'if_none_match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detalle_inexistente(self):
+        self.assertEqual(self.client.get('/api/products/999999/').status_code, 404)
+
+
+# -----------------------------
+# Planes de consulta (EXPLAIN QUERY PLAN)
+# -----------------------------
+# Tablas auxiliares chicas: recorrerlas completas es más barato que un índice
+TABLAS_CHICAS = {'products_category', 'products_material', 'products_color', 'products_talle'}
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)')
+
+
+def full_scans(captured_queries):
+    """Devuelve [(tabla, sql)] de las consultas cuyo plan recorre una tabla grande entera"""
+    encontrados = []
+    with connection.cursor() as cursor:
+        for query in captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            # captured_queries trae el SQL ya interpolado
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            for fila in cursor.fetchall():
+                detalle = fila[-1]
+                match = FULL_SCAN.search(detalle)
+                if match and match.group(1) not in TABLAS_CHICAS:
+                    encontrados.append((detalle, sql))
+    return encontrados
+
+
+class AssertQueryPlanMixin:
+    def assert_sin_full_scan(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        scans = full_scans(ctx.captured_queries)
+        self.assertEqual(scans, [], f'{url} recorre tablas completas')
+
+
+class ProductQueryPlanTest(AssertQueryPlanMixin, CatalogoTestMixin, TestCase):
+    """Cada endpoint del catálogo debe resolverse con índices sobre un catálogo grande"""
+    CANTIDAD = 600
+
+    def setUp(self):
+        super().setUp()
+        viejo = timezone.now() - timedelta(days=60)
+        with self.confirmar():
+            categorias = [self.category] + [Category.objects.create(name=f'Categoría {i}') for i in range(11)]
+            materiales = [self.material] + [Material.objects.create(name=f'Material {i}') for i in range(5)]
+        productos = Product.objects.bulk_create([
+            Product(
+                name=f'Producto {i:05d}', category=categorias[i % 12], material=materiales[i % 6],
+                price=1000, sale_price=800 if i % 10 == 0 else None,
+                fecha_creacion=timezone.now() if i % 50 == 0 else viejo,
+            )
+            for i in range(self.CANTIDAD)
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=p, image=f'https://img.test/{p.id}.jpg') for p in productos
+        ])
+        ProductoTalle.objects.bulk_create([
+            ProductoTalle(producto=p, talle=self.talle, stock=i % 3) for i, p in enumerate(productos)
+        ])
+        ProductoColor.objects.bulk_create([
+            ProductoColor(producto=p, color=self.color, stock=i % 2) for i, p in enumerate(productos)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.producto = productos[self.CANTIDAD // 2]
+
+    def test_endpoints(self):
+        urls = [
+            '/api/products/',
+            '/api/products/?expand=images',
+            f'/api/products/{self.producto.id}/',
+            '/api/products/on_sale/',
+            '/api/products/new_arrivals/',
+            f'/api/products/by_category/?category={self.category.id}',
+            '/api/products/?etiqueta=Última unidad',
+            f'/api/categories/{self.category.id}/products/',
+            f'/api/materials/{self.material.id}/products/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_sin_full_scan(url)
+
+
+class BusquedaTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.remera = Product.objects.create(
+            name='Remera básica', category=self.category, material=self.material, price=100,
+            description='Cuello redondo',
+        )
+        ProductoColor.objects.create(producto=self.remera, color=self.color, stock=1)
+        self.buzo = Product.objects.create(
+            name='Buzo canguro', category=Category.objects.create(name='Abrigos'), price=200,
+            description='Ideal para usar con remeras',
+        )
+
+    def buscar(self, q):
+        data = self.client.get('/api/products/search/', {'q': q}).json()
+        return [p['name'] for p in data['results']]
+
+    def test_normalizacion(self):
+        self.assertEqual(search.terminos('Remeras de ALGODÓN'), ['remer', 'de', 'algodon'])
+        self.assertEqual(search.raiz('negra'), search.raiz('negros'))
+
+    def test_plural_tildes_y_prefijo(self):
+        self.assertEqual(self.buscar('remeras')[0], 'Remera básica')
+        self.assertEqual(self.buscar('BASICAS'), ['Remera básica'])
+        self.assertEqual(self.buscar('algod'), ['Remera básica'])
+        self.assertEqual(self.buscar('rem neg'), ['Remera básica'])
+
+    def test_ranking_nombre_antes_que_descripcion(self):
+        self.assertEqual(self.buscar('remera'), ['Remera básica', 'Buzo canguro'])
+
+    def test_indice_se_mantiene_por_senales(self):
+        with self.confirmar():
+            self.buzo.name = 'Campera rompeviento'
+            self.buzo.save()
+        self.assertEqual(self.buscar('campera'), ['Campera rompeviento'])
+        self.assertEqual(self.buscar('canguro'), [])
+
+        with self.confirmar():
+            ProductoTalle.objects.create(producto=self.buzo, talle=Talle.objects.create(name='XXL'), stock=2)
+        self.assertEqual(self.buscar('xxl'), ['Campera rompeviento'])
+
+        with self.confirmar():
+            self.color.name = 'Bordó'
+            self.color.save()
+        self.assertEqual(self.buscar('bordo'), ['Remera básica'])
+
+        with self.confirmar():
+            self.remera.delete()
+        self.assertEqual(self.buscar('bordo'), [])
+
+    def test_con_filtros_facetados(self):
+        url = '/api/products/search/'
+        data = self.client.get(url, {'q': 'remera', 'category': self.buzo.category_id}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual([p['name'] for p in data['results']], ['Buzo canguro'])
+        data = self.client.get(url, {'q': 'remera', 'category': 99, 'page_size': 1}).json()
+        self.assertEqual((data['count'], data['results'], data['next']), (0, [], None))
+
+    def test_admin_usa_el_indice(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        admin = site._registry[Product]
+        request = RequestFactory().get('/admin/products/product/')
+        queryset, duplicados = admin.get_search_results(request, Product.objects.all(), 'remeras')
+        self.assertEqual(set(queryset), {self.remera, self.buzo})
+        self.assertFalse(duplicados)
+
+    def test_paginado_en_el_indice(self):
+        self.crear_productos(25)
+        nombres = []
+        for pagina in (1, 2, 3):
+            data = self.client.get('/api/products/search/', {'q': 'producto', 'page_size': 10, 'page': pagina}).json()
+            self.assertEqual(data['count'], 25)
+            nombres += [p['name'] for p in data['results']]
+        self.assertEqual(sorted(nombres), [f'Producto {i:04d}' for i in range(25)])
+        # Sin tope: count y rebanadas salen de la consulta del índice
+        with mock.patch.object(search.SQLiteFTS, 'buscar', wraps=search.SQLiteFTS().buscar) as buscar:
+            self.assertEqual(len(search.buscar('producto')[20:]), 5)
+        self.assertIsNone(buscar.call_args.args[2])
+
+    def test_admin_filtra_con_subconsulta(self):
+        self.crear_productos(25)
+        product_admin = ProductAdmin(Product, admin.site)
+        queryset, _ = product_admin.get_search_results(RequestFactory().get('/'), Product.objects.all(), 'producto')
+        self.assertIn('MATCH', str(queryset.query))
+        self.assertEqual(queryset.count(), 25)
+
+    def test_comando_reindexar(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLA_SQLITE}')
+        self.assertEqual(self.buscar('remera'), [])
+        with self.confirmar():
+            call_command('reindexar_busqueda', stdout=StringIO())
+        self.assertEqual(len(self.buscar('remera')), 2)
+
+
+class FacetasTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.abrigos = Category.objects.create(name='Abrigos')
+        self.talle_l = Talle.objects.create(name='L')
+        self.rojo = Color.objects.create(name='Rojo')
+
+        self.remera = Product.objects.create(name='Remera', category=self.category, material=self.material, price=1000)
+        self.musculosa = Product.objects.create(name='Musculosa', category=self.category, price=800, sale_price=600)
+        self.buzo = Product.objects.create(name='Buzo', category=self.abrigos, material=self.material, price=3000)
+        ProductoTalle.objects.create(producto=self.remera, talle=self.talle, stock=5)
+        ProductoTalle.objects.create(producto=self.musculosa, talle=self.talle, stock=1)
+        ProductoTalle.objects.create(producto=self.buzo, talle=self.talle_l, stock=2)
+        ProductoTalle.objects.create(producto=self.buzo, talle=self.talle, stock=0)
+        ProductoColor.objects.create(producto=self.buzo, color=self.rojo, stock=1)
+        ProductoColor.objects.create(producto=self.remera, color=self.color, stock=3)
+
+    def nombres(self, **params):
+        data = self.client.get('/api/products/', params).json()
+        return sorted(p['name'] for p in data['results'])
+
+    def test_filtros(self):
+        self.assertEqual(self.nombres(category=self.category.id), ['Musculosa', 'Remera'])
+        self.assertEqual(self.nombres(category=f'{self.category.id},{self.abrigos.id}', material=self.material.id), ['Buzo', 'Remera'])
+        # Solo talles con stock: el buzo tiene M en 0
+        self.assertEqual(self.nombres(talle=self.talle.id), ['Musculosa', 'Remera'])
+        self.assertEqual(self.nombres(color=self.rojo.id), ['Buzo'])
+        # El precio final usa el promocional
+        self.assertEqual(self.nombres(max_price=700), ['Musculosa'])
+        self.assertEqual(self.nombres(min_price=900, max_price=3000), ['Buzo', 'Remera'])
+        self.assertEqual(self.nombres(on_sale='true'), ['Musculosa'])
+
+    def test_parametro_invalido(self):
+        for params in [
+            {'category': 'abc'}, {'category': '99999999999999999999999'}, {'talle': '-1'},
+            {'min_price': 'NaN'}, {'max_price': 'Infinity'}, {'min_price': '-inf'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/products/', params).status_code, 400)
+
+    def test_by_category_parametro_invalido(self):
+        url = '/api/products/by_category/'
+        self.assertEqual(self.client.get(url, {'category': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'category': f'{self.category.id},{self.abrigos.id}'}).status_code, 400)
+        data = self.client.get(url, {'category': self.category.id}).json()
+        self.assertEqual(sorted(p['name'] for p in data['results']), ['Musculosa', 'Remera'])
+
+    def test_facetas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/products/', {
+                'category': self.category.id, 'facets': 'true', 'fields': 'id'
+            }).json()
+        self.assertEqual(len(data['results']), 2)
+        facetas = data['facets']
+        # La dimensión elegida se cuenta sin su propio filtro
+        self.assertEqual(
+            [(f['name'], f['count']) for f in facetas['category']],
+            [('Abrigos', 1), ('Remeras', 2)]
+        )
+        self.assertEqual([(f['name'], f['count']) for f in facetas['material']], [('Algodón', 1)])
+        self.assertEqual([(f['name'], f['count']) for f in facetas['talle']], [('M', 2)])
+        self.assertEqual([(f['name'], f['count']) for f in facetas['color']], [('Negro', 1)])
+        self.assertEqual(facetas['on_sale'], 1)
+        self.assertEqual(facetas['price'], {'min': '600.00', 'max': '1000.00'})
+        self.assertEqual(
+            facetas['etiqueta'],
+            [{'name': 'Nuevo ingreso', 'count': 1}, {'name': 'Última unidad', 'count': 1}]
+        )
+        self.assertLessEqual(len(ctx.captured_queries), 12)
+
+
+class AdminChangelistTest(CatalogoTestMixin, TestCase):
+    """Las páginas de listado del admin no hacen consultas por fila"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'clave'))
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_consultas_constantes(self):
+        urls = [
+            '/admin/products/product/', '/admin/products/product/?o=6',
+            '/admin/products/category/', '/admin/products/material/', '/admin/products/productimage/',
+        ]
+        self.crear_productos(2)
+        pocas = {url: self.contar_consultas(url) for url in urls}
+        self.crear_productos(30, offset=2)
+        for i in range(10):
+            Category.objects.create(name=f'Categoría {i}')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.contar_consultas(url), pocas[url])
+
+    def test_columnas_anotadas(self):
+        producto = self.crear_productos(1)[0]
+        response = self.client.get('/admin/products/product/?o=6')
+        self.assertContains(response, 'https://img.test/0-a.jpg')
+        # 3 por talle + 2 por color, como antes (Product.total_stock solo cuenta talles)
+        self.assertContains(response, '<td class="field-stock_total">5</td>', html=True)
+        product_admin = ProductAdmin(Product, admin.site)
+        self.assertEqual(product_admin.stock_total(product_admin.get_queryset(None).get(pk=producto.pk)), 5)
+        categorias = self.client.get('/admin/products/category/?o=2')
+        self.assertContains(categorias, '<td class="field-product_count">1</td>', html=True)
+
+
+class CatalogoImportExportTest(CatalogoTestMixin, TestCase):
+    def exportar(self, formato):
+        salida = StringIO()
+        call_command('exportar_catalogo', '--formato', formato, stdout=salida)
+        return salida.getvalue()
+
+    def importar(self, contenido, formato, lote=1000):
+        ruta = f'{self.tmp}/catalogo.{formato}'
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.write(contenido)
+        call_command('importar_catalogo', ruta, '--lote', str(lote), stdout=StringIO())
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.tmp = directorio.name
+
+    def estado(self):
+        return [
+            (p.name, str(p.price), str(p.sale_price), p.category.name, p.material.name, p.total_stock, p.etiqueta,
+             [i.image for i in p.images.all()],
+             sorted((pt.talle.name, pt.stock) for pt in p.productotalle_set.all()),
+             sorted((pc.color.name, pc.stock) for pc in p.productocolor_set.all()))
+            for p in Product.objects.order_by('name')
+        ]
+
+    def test_ida_y_vuelta(self):
+        self.crear_productos(5)
+        for formato in ('jsonl', 'csv'):
+            with self.subTest(formato=formato):
+                antes = self.estado()
+                contenido = self.exportar(formato)
+                Product.objects.all().delete()
+                self.importar(contenido, formato, lote=2)
+                self.assertEqual(self.estado(), antes)
+
+    def test_crea_auxiliares_recalcula_e_indexa(self):
+        filas = [
+            {'name': 'Buzo Canguro', 'price': '5000', 'category': 'Buzos', 'material': 'Frisa',
+             'talles': {'XL': 1}, 'colores': {'Gris': 4}, 'images': [{'image': 'https://img.test/buzo.jpg'}]},
+        ]
+        self.importar(''.join(json.dumps(fila) + '\n' for fila in filas), 'jsonl')
+        buzo = Product.objects.get(name='Buzo Canguro')
+        self.assertEqual((buzo.category.name, buzo.material.name), ('Buzos', 'Frisa'))
+        self.assertEqual((buzo.total_stock, buzo.etiqueta), (1, 'Última unidad'))
+        self.assertEqual(list(search.buscar('canguro')), [buzo.pk])
+
+    def test_actualiza_por_id(self):
+        producto = self.crear_productos(1)[0]
+        fila = {'id': producto.pk, 'name': 'Remera lisa', 'price': '1500', 'category': 'Remeras',
+                'talles': {'M': 7, 'L': 2}, 'images': [{'image': 'https://img.test/nueva.jpg'}]}
+        self.importar(json.dumps(fila) + '\n', 'jsonl')
+        producto.refresh_from_db()
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual((producto.name, producto.price, producto.total_stock), ('Remera lisa', 1500, 9))
+        self.assertEqual([i.image for i in producto.images.all()], ['https://img.test/nueva.jpg'])
+        # El color no vino en la fila: queda como estaba
+        self.assertEqual(producto.productocolor_set.get().stock, 2)
+
+    def test_actualiza_solo_las_columnas_de_la_fila(self):
+        producto = self.crear_productos(1)[0]
+        antes = timezone.now() - timedelta(days=60)
+        Product.objects.filter(pk=producto.pk).update(fecha_creacion=antes, description='Cuello redondo')
+        # Sin description, material, color, talle ni fecha_creacion
+        self.importar('id,name,price,category\n' f'{producto.pk},Remera lisa,1500,Remeras\n', 'csv')
+        producto.refresh_from_db()
+        self.assertEqual((producto.name, producto.price), ('Remera lisa', 1500))
+        self.assertEqual(producto.description, 'Cuello redondo')
+        self.assertEqual((producto.material_id, producto.color_id, producto.talle_id),
+                         (self.material.pk, self.color.pk, self.talle.pk))
+        self.assertEqual(producto.fecha_creacion, antes)
+        self.assertNotIn(producto.pk, [p['id'] for p in self.client.get('/api/products/new_arrivals/').json()['results']])
+
+    def test_stock_negativo(self):
+        fila = {'name': 'Buzo', 'price': '100', 'category': 'Remeras', 'talles': {'M': 2}, 'colores': {'Negro': -1}}
+        with self.assertRaisesMessage(CommandError, 'Línea 1: stock no puede ser negativo'):
+            self.importar(json.dumps(fila) + '\n', 'jsonl')
+        self.assertFalse(Product.objects.filter(name='Buzo').exists())
+
+    def test_fila_invalida(self):
+        filas = [{'name': f'P{i}', 'price': '100', 'category': 'Remeras'} for i in range(4)]
+        filas[3]['price'] = 'caro'
+        with self.assertRaisesMessage(CommandError, 'Línea 4'):
+            self.importar(''.join(json.dumps(fila) + '\n' for fila in filas), 'jsonl', lote=2)
+        # El primer lote quedó guardado y recalculado; el segundo no se escribió
+        self.assertEqual(sorted(Product.objects.values_list('name', flat=True)), ['P0', 'P1'])
+        self.assertFalse(Product.objects.filter(etiqueta__isnull=True).exists())
+
+    def test_linea_que_no_es_json(self):
+        lineas = [json.dumps({'name': f'P{i}', 'price': '100', 'category': 'Remeras'}) + '\n' for i in range(2)]
+        lineas.append('{"name": "P2", \n')
+        with self.assertRaisesMessage(CommandError, 'Línea 3: JSON inválido'):
+            self.importar(''.join(lineas), 'jsonl', lote=2)
+        # El lote anterior quedó guardado, recalculado e indexado
+        self.assertEqual(sorted(Product.objects.values_list('name', flat=True)), ['P0', 'P1'])
+        self.assertFalse(Product.objects.filter(etiqueta__isnull=True).exists())
+        self.assertEqual(search.buscar('p0').count(), 1)
+
+    def test_fila_que_no_es_un_objeto(self):
+        contenido = json.dumps({'name': 'P0', 'price': '100', 'category': 'Remeras'}) + '\n["P1", "100"]\n'
+        with self.assertRaisesMessage(CommandError, 'Línea 2: la fila no es un objeto'):
+            self.importar(contenido, 'jsonl', lote=1)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['P0'])
+
+    def test_consultas_por_lote(self):
+        def consultas(cantidad):
+            filas = [
+                {'name': f'P{i}', 'price': '100', 'category': 'Remeras', 'talles': {'M': 1}, 'colores': {'Negro': 1},
+                 'images': [{'image': f'https://img.test/{i}.jpg'}]}
+                for i in range(cantidad)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                self.importar(''.join(json.dumps(fila) + '\n' for fila in filas), 'jsonl')
+            return len(ctx.captured_queries)
+        self.assertEqual(consultas(5), consultas(50))
+
+    def test_admin_importar_y_exportar(self):
+        self.crear_productos(2)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'clave'))
+        response = self.client.post('/admin/products/product/', {
+            'action': 'exportar_jsonl', '_selected_action': list(Product.objects.values_list('pk', flat=True)),
+        })
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(contenido.splitlines()), 2)
+
+        archivo = SimpleUploadedFile('nuevos.jsonl', json.dumps(
+            {'name': 'Importado', 'price': '100', 'category': 'Remeras'}
+        ).encode())
+        response = self.client.post('/admin/products/product/importar/', {'archivo': archivo})
+        self.assertRedirects(response, '/admin/products/product/')
+        self.assertTrue(Product.objects.filter(name='Importado').exists())
+
+
+class ExportacionApiTest(CatalogoTestMixin, TestCase):
+    def exportar(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        self.crear_productos(3)
+        response, contenido = self.exportar('/api/products/export/')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([fila['name'] for fila in filas], ['Producto 0000', 'Producto 0001', 'Producto 0002'])
+        self.assertEqual(len(filas[0]['images']), 2)
+        self.assertEqual(filas[0]['talles_disponibles'], [{'talle': 'M', 'stock': 3}])
+
+    def test_array_json(self):
+        _, vacio = self.exportar('/api/products/export/?format=json')
+        self.assertEqual(json.loads(vacio), [])
+        self.crear_productos(2)
+        _, contenido = self.exportar('/api/products/export/', HTTP_ACCEPT='application/json')
+        self.assertEqual(len(json.loads(contenido)), 2)
+
+    def test_since_incremental(self):
+        viejo, nuevo = self.crear_productos(2)
+        Product.objects.filter(pk=viejo.pk).update(actualizado_en=timezone.now() - timedelta(days=2))
+        Product.objects.filter(pk=nuevo.pk).update(actualizado_en=timezone.now() - timedelta(hours=1))
+        desde = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response, contenido = self.exportar(f'/api/products/export/?since={desde}')
+        self.assertEqual([json.loads(linea)['id'] for linea in contenido.splitlines()], [nuevo.pk])
+
+        # Con el corte de la exportación anterior no se repite nada
+        hasta = response['X-Export-Hasta']
+        _, contenido = self.exportar('/api/products/export/', data={'since': hasta})
+        self.assertEqual(contenido, '')
+
+        response = self.client.get('/api/products/export/?since=ayer', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_consultas_por_lote(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as ctx:
+                _, contenido = self.exportar('/api/products/export/')
+            return len(contenido.splitlines()), len(ctx.captured_queries)
+
+        self.crear_productos(3)
+        _, pocos = consultas()
+        self.crear_productos(12, offset=3)
+        self.assertEqual(consultas(), (15, pocos))
+
+        # Con lotes chicos se agregan solo los prefetch de cada lote
+        with mock.patch('products.views.ProductViewSet.export_chunk_size', 5):
+            self.assertEqual(consultas(), (15, pocos + 2 * 3))
+
+
+class StockMasivoTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'clave'))
+        self.l = Talle.objects.create(name='L')
+        self.productos = self.crear_productos(3)
+
+    def enviar(self, items, batch_id='lote-1'):
+        return self.client.post('/api/stock/bulk/', {'batch_id': batch_id, 'items': items}, format='json')
+
+    def stock(self, producto, talle):
+        return ProductoTalle.objects.get(producto=producto, talle=talle).stock
+
+    def test_absoluto_delta_y_rechazos(self):
+        p0, p1, p2 = self.productos
+        response = self.enviar([
+            {'product_id': p0.pk, 'talle': 'M', 'stock': 10},
+            {'product_id': p0.pk, 'talle_id': self.talle.pk, 'delta': -4},
+            {'product_id': p1.pk, 'color': 'Negro', 'delta': 5},
+            {'product_id': p2.pk, 'talle': 'L', 'delta': 2},
+            {'product_id': p2.pk, 'talle': 'M', 'delta': -9},
+            {'product_id': 999999, 'talle': 'M', 'stock': 1},
+            {'product_id': p0.pk, 'talle': 'XXL', 'stock': 1},
+            {'product_id': p0.pk, 'talle': 'M', 'color': 'Negro', 'stock': 1},
+            {'product_id': p0.pk, 'talle': 'M', 'stock': -1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['aplicadas'], 4)
+        self.assertEqual([r['fila'] for r in data['rechazadas']], [4, 5, 6, 7, 8])
+        self.assertEqual(data['productos'], 3)
+
+        self.assertEqual(self.stock(p0, self.talle), 6)
+        self.assertEqual(ProductoColor.objects.get(producto=p1).stock, 7)
+        self.assertEqual(self.stock(p2, self.l), 2)
+        self.assertEqual(self.stock(p2, self.talle), 3)
+        # Denormalización recalculada
+        self.assertEqual(Product.objects.get(pk=p0.pk).total_stock, 6)
+        self.assertEqual(Product.objects.get(pk=p2.pk).total_stock, 5)
+
+    def test_idempotente_por_batch_id(self):
+        p0 = self.productos[0]
+        primera = self.enviar([{'product_id': p0.pk, 'talle': 'M', 'delta': 2}]).json()
+        segunda = self.enviar([{'product_id': p0.pk, 'talle': 'M', 'delta': 2}]).json()
+        self.assertFalse(primera['repetido'])
+        self.assertTrue(segunda['repetido'])
+        self.assertEqual(primera['aplicadas'], segunda['aplicadas'])
+        self.assertEqual(self.stock(p0, self.talle), 5)
+
+        self.enviar([{'product_id': p0.pk, 'talle': 'M', 'delta': 2}], batch_id='lote-2')
+        self.assertEqual(self.stock(p0, self.talle), 7)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        def consultas(cantidad, batch_id):
+            items = [
+                {'product_id': producto.pk, 'talle': 'M', 'stock': i}
+                for producto in Product.objects.all()[:cantidad] for i in (1, 2)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.enviar(items, batch_id).status_code, 200)
+            return len(ctx.captured_queries)
+
+        pocos = consultas(2, 'a')
+        self.crear_productos(20, offset=3)
+        self.assertEqual(consultas(23, 'b'), pocos)
+
+    def test_validacion_y_permisos(self):
+        self.assertEqual(self.enviar([], batch_id='').status_code, 400)
+        self.client.logout()
+        response = self.enviar([{'product_id': self.productos[0].pk, 'talle': 'M', 'stock': 1}])
+        self.assertIn(response.status_code, (401, 403))
+
+
+class MetricasTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.registro.reiniciar()
+        self.crear_productos(3)
+
+    def test_server_timing(self):
+        response = self.client.get('/api/products/')
+        partes = dict(parte.split(';', 1) for parte in response['Server-Timing'].split(', '))
+        self.assertEqual(set(partes), {'db', 'serializer', 'app', 'render', 'total'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/?page_size=1')
+        self.assertIn(f'desc="{len(ctx.captured_queries)} consultas"', response['Server-Timing'])
+
+    def test_metrics_prometheus(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        self.client.get('/no-existe/')
+        texto = self.client.get('/metrics').content.decode()
+        self.assertIn('tienda_http_requests_total{view="products-list",method="GET",status="200"} 2', texto)
+        self.assertIn('tienda_http_request_duration_seconds_count{view="products-list",method="GET"} 2', texto)
+        self.assertIn('tienda_http_request_duration_seconds_bucket{view="products-list",method="GET",le="+Inf"} 2', texto)
+        self.assertIn('status="404"', texto)
+        self.assertRegex(texto, r'tienda_db_queries_total\{view="products-list",method="GET"\} [1-9]')
+        # /metrics no se cuenta a sí mismo
+        self.assertNotIn('view="metrics"', texto)
+
+        with override_settings(METRICAS={'TOKEN': 'secreto'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+    def test_serializer_medido_aparte(self):
+        # ?fields= no sale de los documentos: el serializer corre en vivo
+        self.client.get('/api/products/?fields=id,name')
+        texto = metricas.registro.prometheus()
+        valor = re.search(r'tienda_serializer_duration_seconds_total\{view="products-list",method="GET"\} (\S+)', texto)
+        self.assertGreater(float(valor.group(1)), 0)
+
+        # El SQL del bloque no se cuenta y los bloques anidados se miden una vez
+        request = RequestFactory().get('/')
+        medicion = request._medicion = metricas.Medicion()
+        with metricas.medir_serializacion(request):
+            with metricas.medir_serializacion(request):
+                medicion.sql += 10
+        self.assertLess(medicion.serializer, 1)
+        self.assertFalse(medicion.serializando)
+
+    def test_presupuesto(self):
+        with override_settings(METRICAS={'PRESUPUESTO_CONSULTAS': {'GET products-list': 1}, 'ESTRICTO': True}):
+            with self.assertRaises(metricas.PresupuestoExcedido):
+                self.client.get('/api/products/')
+            # Otro método u otra vista: sin límite
+            self.assertEqual(self.client.get('/api/products/on_sale/').status_code, 200)
+
+        get_cache().clear()
+        with override_settings(METRICAS={'PRESUPUESTO_CONSULTAS': {'products-list': 1}}):
+            with self.assertLogs('Tienda.metricas', 'WARNING'):
+                self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertIn(
+            'tienda_query_budget_exceeded_total{view="products-list",method="GET"} 1',
+            metricas.registro.prometheus(),
+        )
+
+
+class LecturaAsyncTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.productos = self.crear_productos(5)
+
+    async def comparar(self, ruta):
+        sync = await sync_to_async(self.client.get)(f'/api/{ruta}')
+        asinc = await self.async_client.get(f'/api/async/{ruta}')
+        self.assertEqual(asinc.status_code, 200)
+        # Los links de paginación apuntan a la misma versión que se pidió
+        self.assertEqual(json.loads(asinc.content.decode().replace('/api/async/', '/api/')), sync.json())
+        return asinc
+
+    async def test_mismas_respuestas_que_la_version_sync(self):
+        producto = self.productos[0]
+        for ruta in [
+            'products/', 'products/?page_size=2', 'products/?facets=true&min_price=500',
+            'products/?fields=id,name&expand=images', f'products/{producto.pk}/',
+            'categories/', f'categories/{self.category.pk}/', f'categories/{self.category.pk}/products/',
+            'materials/', f'materials/{self.material.pk}/', f'materials/{self.material.pk}/products/',
+        ]:
+            with self.subTest(ruta=ruta):
+                await self.comparar(ruta)
+
+    async def test_paginacion_por_cursor(self):
+        pagina = (await self.comparar('products/?page_size=2')).json()
+        siguiente = pagina['next'].split('?', 1)[1]
+        self.assertIn('/api/async/products/', pagina['next'])
+        await self.comparar(f'products/?{siguiente}')
+
+    async def test_export(self):
+        response = await self.async_client.get('/api/async/products/export/')
+        contenido = b''.join([parte async for parte in response.streaming_content]).decode()
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], [p.pk for p in self.productos])
+        self.assertTrue(response['X-Export-Hasta'])
+
+        response = await self.async_client.get('/api/async/products/export/?format=json')
+        contenido = b''.join([parte async for parte in response.streaming_content]).decode()
+        self.assertEqual(len(json.loads(contenido)), 5)
+
+    async def test_errores(self):
+        self.assertEqual((await self.async_client.get('/api/async/products/999999/')).status_code, 404)
+        response = await self.async_client.get('/api/async/products/?category=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.json())
+        self.assertEqual((await self.async_client.post('/api/async/products/')).status_code, 405)
+
+    async def test_metricas_cuentan_el_orm_async(self):
+        response = await self.async_client.get(f'/api/async/products/{self.productos[0].pk}/')
+        consultas = int(re.search(r'desc="(\d+) consultas"', response['Server-Timing']).group(1))
+        self.assertGreater(consultas, 0)
+
+
+class ReferenciasTest(CatalogoTestMixin, TestCase):
+    TABLAS = ('"products_category"', '"products_material"', '"products_color"', '"products_talle"')
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_productos(1)[0]
+
+    def consultas_a_referencias(self, url):
+        with self.confirmar():
+            invalidar('products.product')
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url).json()
+        return data, [q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in self.TABLAS)]
+
+    def test_nombres_sin_join(self):
+        for url in (f'/api/products/{self.producto.pk}/', '/api/products/'):
+            with self.subTest(url=url):
+                data, consultas = self.consultas_a_referencias(url)
+                fila = data if 'id' in data else data['results'][0]
+                self.assertEqual(fila['category_name'], 'Remeras')
+                self.assertEqual(fila['talle_name'], 'M')
+                self.assertEqual(fila['talles_disponibles'], [{'talle': 'M', 'stock': 3}])
+                self.assertEqual(consultas, [])
+
+    def test_version_compartida(self):
+        detalle = f'/api/products/{self.producto.pk}/'
+        # Cambio sin señales en este proceso: sigue la copia local
+        Category.objects.filter(pk=self.category.pk).update(name='Buzos')
+        self.assertEqual(self.consultas_a_referencias(detalle)[0]['category_name'], 'Remeras')
+        # La señal de otro worker incrementa la versión compartida: se relee la tabla
+        with self.confirmar():
+            invalidar('products.category')
+        data, consultas = self.consultas_a_referencias(detalle)
+        self.assertEqual(data['category_name'], 'Buzos')
+        self.assertEqual(len(consultas), 1)
+
+    def test_senal_recarga_al_confirmar(self):
+        with self.confirmar():
+            self.talle.name = 'Mediano'
+            self.talle.save()
+            # Dentro de la transacción sigue la copia confirmada
+            self.assertEqual(referencias.Referencias.actuales().nombre(Talle, self.talle.pk), 'M')
+        data, consultas = self.consultas_a_referencias(f'/api/products/{self.producto.pk}/')
+        self.assertEqual(data['talle_name'], 'Mediano')
+        self.assertEqual(consultas, [])
+
+
+@override_settings(CATALOGO_CACHE_RESPUESTAS=False, DOCUMENTOS_PRODUCTO={'ACTIVOS': True, 'ASINCRONO': False})
+class DocumentosProductoTest(CatalogoTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.productos = self.crear_productos(3)
+        self.producto = self.productos[0]
+        self.detalle = f'/api/products/{self.producto.pk}/'
+
+    def en_vivo(self, url):
+        with override_settings(DOCUMENTOS_PRODUCTO={'ACTIVOS': False}):
+            response = self.client.get(url)
+        self.assertNotIn('X-Documento', response)
+        return response.content
+
+    def test_mismo_json_que_el_serializer(self):
+        self.assertEqual(DocumentoProducto.objects.count(), 3)
+        for url in [
+            self.detalle, '/api/products/', '/api/products/?page_size=2', '/api/products/on_sale/',
+            f'/api/products/by_category/?category={self.category.pk}', f'/api/categories/{self.category.pk}/products/',
+            f'/api/materials/{self.material.pk}/products/',
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['X-Documento'], 'HIT')
+                self.assertEqual(response.content, self.en_vivo(url))
+
+    def test_sin_serializer_ni_prefetch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(self.detalle)['X-Documento'], 'HIT')
+        self.assertFalse([q for q in ctx.captured_queries if 'products_productimage' in q['sql']])
+
+    def test_otras_representaciones_en_vivo(self):
+        for url in [f'{self.detalle}?fields=id,name', '/api/products/?expand=images']:
+            with self.subTest(url=url):
+                self.assertNotIn('X-Documento', self.client.get(url))
+        response = self.client.get(self.detalle, HTTP_ACCEPT='application/json; indent=2')
+        self.assertNotIn('X-Documento', response)
+        self.assertIn(b'\n  "id"', response.content)
+
+    def test_cambio_de_stock(self):
+        fila = ProductoTalle.objects.get(producto=self.producto)
+        fila.stock = 7
+        with self.captureOnCommitCallbacks() as regenerar:
+            fila.save()
+        # Todavía sin regenerar: el documento viejo no se sirve
+        response = self.client.get(self.detalle)
+        self.assertNotIn('X-Documento', response)
+        self.assertEqual(response.data['talles_disponibles'], [{'talle': 'M', 'stock': 7}])
+
+        for callback in regenerar:
+            callback()
+        response = self.client.get(self.detalle)
+        self.assertEqual(response['X-Documento'], 'HIT')
+        self.assertEqual(response.json()['talles_disponibles'], [{'talle': 'M', 'stock': 7}])
+
+    def test_renombrar_y_borrar_referencias(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Buzos'
+            self.category.save()
+            self.color.delete()
+        response = self.client.get(self.detalle)
+        self.assertEqual(response['X-Documento'], 'HIT')
+        data = response.json()
+        self.assertEqual(data['category_name'], 'Buzos')
+        self.assertEqual((data['color'], data['color_name'], data['colores_disponibles']), (None, None, []))
+
+    def test_etiqueta_vencida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Product.objects.create(
+                name='Nuevo', category=self.category, price=1000, fecha_creacion=timezone.now() - timedelta(days=6),
+            )
+        url = f'/api/products/{producto.pk}/'
+        self.assertEqual(self.client.get(url).json()['etiqueta'], 'Nuevo ingreso')
+        # La etiqueta cambia sin tocar actualizado_en
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.vencer_nuevos_ingresos(timezone.now() + timedelta(days=2))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Documento'], 'HIT')
+        self.assertIsNone(response.json()['etiqueta'])
+
+    def test_listado_con_documentos_faltantes(self):
+        DocumentoProducto.objects.filter(pk=self.producto.pk).delete()
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.content, self.en_vivo('/api/products/'))
+
+    def test_listado_con_results_en_cualquier_posicion(self):
+        # El envoltorio no depende de que results sea la última clave del paginador
+        class Paginador(ProductCursorPagination):
+            def get_paginated_response(self, data):
+                respuesta = super().get_paginated_response(data)
+                respuesta.data = {'results': respuesta.data['results'], 'total': 3, **respuesta.data}
+                return respuesta
+
+        with mock.patch('products.views.ProductViewSet.pagination_class', Paginador):
+            response = self.client.get('/api/products/')
+            self.assertEqual(response['X-Documento'], 'HIT')
+            self.assertEqual(response.content, self.en_vivo('/api/products/'))
+        self.assertEqual(list(response.json()), ['results', 'total', 'next', 'previous'])
+
+    async def test_vistas_async(self):
+        for ruta in [f'products/{self.producto.pk}/', 'products/', f'categories/{self.category.pk}/products/']:
+            with self.subTest(ruta=ruta):
+                response = await self.async_client.get(f'/api/async/{ruta}')
+                self.assertEqual(response['X-Documento'], 'HIT')
+
+    def test_verificar_documentos(self):
+        call_command('verificar_documentos', stdout=StringIO())
+        primero, segundo, tercero = (p.pk for p in self.productos)
+        DocumentoProducto.objects.filter(pk=primero).delete()
+        Product.objects.filter(pk=segundo).update(actualizado_en=timezone.now())
+        DocumentoProducto.objects.filter(pk=tercero).update(detalle=b'{}')
+
+        salida = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('verificar_documentos', stdout=salida)
+        self.assertIn(f'falta: 1 productos ({primero})', salida.getvalue())
+        self.assertIn(f'desactualizado: 1 productos ({segundo})', salida.getvalue())
+        self.assertIn(f'distinto: 1 productos ({tercero})', salida.getvalue())
+
+        call_command('verificar_documentos', '--reparar', stdout=StringIO())
+        call_command('verificar_documentos', stdout=StringIO())
+
+
+@override_settings(DOCUMENTOS_PRODUCTO={'ACTIVOS': True, 'ASINCRONO': True})
+class DocumentosAsincronosTest(CatalogoTestMixin, TransactionTestCase):
+    def test_se_regeneran_en_otro_hilo(self):
+        producto = self.crear_productos(1)[0]
+        documentos.esperar(timeout=10)
+        documento = DocumentoProducto.objects.get(pk=producto.pk)
+        self.assertEqual(documento.fuente, Product.objects.get(pk=producto.pk).actualizado_en)
+        self.assertEqual(self.client.get(f'/api/products/{producto.pk}/')['X-Documento'], 'HIT')
+
+
+def sincronizar_replica(alias='replica1'):
+    """Copia la primaria sobre la réplica (backup de sqlite3), como lo haría la replicación"""
+    primaria, replica = connections['default'], connections[alias]
+    primaria.ensure_connection()
+    replica.ensure_connection()
+    primaria.connection.backup(replica.connection)
+
+
+REPLICAS_TEST = {
+    'ACTIVAS': True, 'SELECCION': 'round_robin', 'RETRASO_MAXIMO': 5, 'INTERVALO_RETRASO': 0, 'FIJAR_PRIMARIA': 5,
+}
+
+
+@override_settings(
+    REPLICAS=REPLICAS_TEST, CATALOGO_CACHE_RESPUESTAS=False, DOCUMENTOS_PRODUCTO={'ACTIVOS': False},
+)
+class ReplicasTest(CatalogoTestMixin, TransactionTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_productos(1)[0]
+        self.detalle = f'/api/products/{self.producto.pk}/'
+        sincronizar_replica()
+        # Un cambio en la primaria que la réplica todavía no tiene
+        Product.objects.filter(pk=self.producto.pk).update(name='Cambiado')
+
+    def test_list_y_retrieve_leen_de_la_replica(self):
+        response = self.client.get(self.detalle)
+        self.assertEqual(response.data['name'], 'Producto 0000')
+        # Sin ETag/Last-Modified: son los de la primaria
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get('/api/products/').data['results'][0]['name'], 'Producto 0000')
+        # Las demás acciones leen de la primaria
+        self.assertEqual(self.client.get('/api/products/on_sale/').data['results'][0]['name'], 'Cambiado')
+
+    def test_read_after_write(self):
+        response = self.client.post('/api/carts/', {
+            'items': [{'product_id': self.producto.pk, 'talle_id': self.talle.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(replicas.COOKIE, response.cookies)
+        self.assertEqual(self.client.get(self.detalle).data['name'], 'Cambiado')
+
+        # Vencida la cookie, vuelve a la réplica
+        del self.client.cookies[replicas.COOKIE]
+        self.assertEqual(self.client.get(self.detalle).data['name'], 'Producto 0000')
+
+    def test_menor_retraso(self):
+        with override_settings(REPLICAS={**REPLICAS_TEST, 'SELECCION': 'menor_retraso'}):
+            # update() no toca actualizado_en: la réplica no figura atrasada
+            self.assertEqual(self.client.get(self.detalle).data['name'], 'Producto 0000')
+            Product.objects.filter(pk=self.producto.pk).update(actualizado_en=timezone.now() + timedelta(minutes=5))
+            self.assertEqual(self.client.get(self.detalle).data['name'], 'Cambiado')
+
+    def test_referencias_se_leen_de_la_primaria(self):
+        # Renombre sin señales que la réplica todavía no tiene; la versión nueva fuerza la relectura
+        Category.objects.filter(pk=self.category.pk).update(name='Buzos')
+        invalidar('products.category')
+        # La relectura ocurre en un request servido por la réplica
+        self.assertEqual(self.client.get(self.detalle).data['category_name'], 'Buzos')
+        self.assertEqual(self.client.get('/api/products/on_sale/').data['results'][0]['category_name'], 'Buzos')
+
+    def test_router(self):
+        with mock.patch.object(replicas, 'replicas', return_value=['replica1', 'replica2']):
+            self.assertEqual({replicas.elegir_replica() for _ in range(4)}, {'replica1', 'replica2'})
+        with override_settings(REPLICAS={**REPLICAS_TEST, 'ACTIVAS': False}):
+            self.assertIsNone(replicas.elegir_replica())
+
+        router = replicas.RouterReplicas()
+        self.assertFalse(router.allow_migrate('replica1', 'products'))
+        self.assertIsNone(router.allow_migrate('default', 'products'))
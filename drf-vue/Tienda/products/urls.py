@@ -1,9 +1,27 @@
 from django.urls import path
-from .views import CategoryViewSet, ProductViewSet
+from . import async_views
+from .views import CategoryViewSet, MaterialViewSet, ProductViewSet, cache_stats, stock_bulk
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
 router.register('products', ProductViewSet, basename = 'products')
 router.register('categories', CategoryViewSet, basename = 'categories')
+router.register('materials', MaterialViewSet, basename = 'materials')
 
-urlpatterns = router.urls
\ No newline at end of file
+# Lectura async del catálogo (ASGI), mismas respuestas que los GET de arriba
+async_urlpatterns = [
+    path('async/products/', async_views.product_list, name='async-products-list'),
+    path('async/products/export/', async_views.product_export, name='async-products-export'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-products-detail'),
+    path('async/categories/', async_views.category_list, name='async-categories-list'),
+    path('async/categories/<int:pk>/', async_views.category_detail, name='async-categories-detail'),
+    path('async/categories/<int:pk>/products/', async_views.category_products, name='async-categories-products'),
+    path('async/materials/', async_views.material_list, name='async-materials-list'),
+    path('async/materials/<int:pk>/', async_views.material_detail, name='async-materials-detail'),
+    path('async/materials/<int:pk>/products/', async_views.material_products, name='async-materials-products'),
+]
+
+urlpatterns = router.urls + async_urlpatterns + [
+    path('cache/stats/', cache_stats, name='cache-stats'),
+    path('stock/bulk/', stock_bulk, name='stock-bulk'),
+]
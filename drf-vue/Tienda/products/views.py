@@ -1,9 +1,27 @@
 # views.py
+import hashlib
+import json
+from datetime import datetime, time
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from django.db.models import Prefetch
-from .models import Category, Material, Product, ProductImage
+from rest_framework.utils.encoders import JSONEncoder
+from Tienda.pagination import ProductCursorPagination, StandardPageNumberPagination
+from Tienda.metricas import SerializacionMedidaMixin
+from Tienda.replicas import LecturaEnReplicaMixin
+from . import documentos, search
+from .filters import aplicar_filtros, contar_facetas, filtros_activos, VERDADERO
+from .cache import CachedResponseMixin, estadisticas, ultima_modificacion, versiones
+from .conditional import ConditionalGetMixin
+from .models import Category, Material, Product
+from .stock_masivo import MAX_FILAS, aplicar_lote
 from .serializers import (
     CategorySerializer,
     MaterialSerializer,
@@ -11,48 +29,133 @@ from .serializers import (
     ProductListSerializer
 )
 
+
+class PaginatedActionsMixin:
+    """Las @action que devuelven listas usan la misma paginación que el list"""
+
+    def paginated_response(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = serializer_class(page, many=True, context=context)
+            return self.get_paginated_response(self.serializar(serializer))
+        serializer = serializer_class(queryset, many=True, context=context)
+        return Response(self.serializar(serializer))
+
+    def paginated_products(self, queryset):
+        """Listado de productos: con la representación por defecto sale de los documentos precalculados"""
+        if self.paginator is None or not documentos.servible(self.request):
+            return self.paginated_response(queryset, ProductListSerializer)
+        return documentos.respuesta(documentos.listado(
+            self.paginator, self.request, queryset, self.get_serializer_context(), view=self,
+        ))
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Un objeto JSON por línea; los errores se devuelven como JSON común"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def parse_since(valor):
+    """?since= en ISO 8601 (fecha o fecha y hora); sin zona horaria se toma la del sitio"""
+    momento = parse_datetime(valor)
+    if momento is None:
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValidationError({'since': 'Debe ser una fecha ISO 8601 (2024-01-31 o 2024-01-31T12:00:00Z)'})
+        momento = datetime.combine(fecha, time.min)
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
 # ViewSet para productos
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ConditionalGetMixin, CachedResponseMixin, LecturaEnReplicaMixin, PaginatedActionsMixin,
+    SerializacionMedidaMixin, viewsets.ModelViewSet,
+):
     queryset = Product.objects.all()
+    pagination_class = ProductCursorPagination
+    list_actions = ['list', 'by_category', 'on_sale', 'new_arrivals', 'search']
+    cache_actions = conditional_actions = list_actions + ['retrieve']
+    # El detalle depende de su propia fila y de los nombres de las tablas auxiliares
+    detail_dependencies = ('products.category', 'products.material', 'products.color', 'products.talle')
+    # Productos por lote en /export/ (una consulta de filas + los prefetch por lote)
+    export_chunk_size = 500
+
+    def get_validadores(self, request, accion, **kwargs):
+        if accion != 'retrieve':
+            return super().get_validadores(request, accion, **kwargs)
+        try:
+            actualizado_en = Product.objects.filter(pk=kwargs.get('pk')).order_by().values_list(
+                'actualizado_en', flat=True
+            ).first()
+        except (ValueError, TypeError):
+            actualizado_en = None
+        if actualizado_en is None:
+            # Que la vista responda el 404
+            return None, None
+        partes = [request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), actualizado_en.isoformat()]
+        partes += map(str, versiones(self.detail_dependencies))
+        etag = hashlib.md5('|'.join(partes).encode()).hexdigest()
+        last_modified = max(int(actualizado_en.timestamp()), ultima_modificacion(self.detail_dependencies))
+        return etag, last_modified
     
     def get_queryset(self):
-        """Optimizar queries prefetching imágenes relacionadas"""
+        """Optimizar queries: FKs, talles/colores e imágenes prefetcheados según los campos pedidos"""
         queryset = Product.objects.all()
         
-        # Prefetch imágenes para optimizar consultas
-        if self.action in ['list', 'retrieve', 'by_category', 'on_sale', 'new_arrivals']:
-            queryset = queryset.prefetch_related(
-                Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
-            )
+        if self.action in self.list_actions + ['retrieve']:
+            queryset = queryset.for_serializer(self.get_serializer_class(), self.request)
+
+        # Filtros facetados: ?category=, ?talle=, ?min_price=, ?etiqueta=... (ver filters.py)
+        if self.action in self.list_actions:
+            queryset = aplicar_filtros(queryset, filtros_activos(self.request.query_params))
         
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Con ?facets=true agrega los conteos por categoría, material, talle, color, precio y etiqueta"""
+        if request.query_params.get('facets', '').lower() not in VERDADERO:
+            return self.paginated_products(self.filter_queryset(self.get_queryset()))
+        response = super().list(request, *args, **kwargs)
+        filtros = filtros_activos(request.query_params)
+        response.data['facets'] = contar_facetas(Product.objects.all(), filtros)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Con la representación por defecto se devuelve el documento precalculado (ver documentos.py)"""
+        if documentos.servible(request):
+            contenido = documentos.detalle(kwargs.get('pk'))
+            if contenido is not None:
+                return documentos.respuesta(contenido)
+        return super().retrieve(request, *args, **kwargs)
     
     def get_serializer_class(self):
-        # Usar ProductSerializer para todas las acciones para incluir todas las imágenes
-        # Si necesitas un serializer más ligero para listas grandes, ajusta ProductListSerializer
+        # Los listados usan la representación compacta (?expand=images agrega la galería);
+        # el detalle y las escrituras usan el serializer completo
+        if self.action in self.list_actions:
+            return ProductListSerializer
         return ProductSerializer
 
     @action(detail=False)
     def by_category(self, request):
         category = self.request.query_params.get('category', None)
         if category:
-            products = Product.objects.filter(category=category).prefetch_related(
-                Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
-            )
-            serializer = self.get_serializer(products, many=True)
-            return Response(serializer.data)
+            if ',' in category:
+                # Varias categorías van por el listado: /api/products/?category=1,2
+                raise ValidationError({'category': 'Debe ser un solo id'})
+            # get_queryset aplica ?category= con filtros_activos, como el listado: no numérico responde 400
+            return self.paginated_products(self.get_queryset())
         return Response([])
 
     @action(detail=False, methods=['get'])
     def on_sale(self, request):
         """Productos que tienen precio promocional"""
-        products = Product.objects.filter(
-            sale_price__isnull=False
-        ).prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
-        )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = self.get_queryset().filter(sale_price__isnull=False)
+        return self.paginated_products(products)
 
     @action(detail=False, methods=['get'])
     def new_arrivals(self, request):
@@ -61,52 +164,150 @@ class ProductViewSet(viewsets.ModelViewSet):
         from datetime import timedelta
         
         one_week_ago = timezone.now() - timedelta(days=7)
-        products = Product.objects.filter(
-            fecha_creacion__gte=one_week_ago
-        ).prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
+        products = self.get_queryset().filter(fecha_creacion__gte=one_week_ago)
+        return self.paginated_products(products)
+
+    @action(detail=False, methods=['get'], pagination_class=StandardPageNumberPagination)
+    def search(self, request):
+        """Búsqueda de texto completo por relevancia: ?q=remera negra (prefijos: ?q=rem)"""
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return Response([])
+        # Con filtros facetados, la búsqueda se restringe al queryset filtrado (en la misma consulta)
+        filtrados = self.get_queryset() if filtros_activos(request.query_params) else None
+        resultados = search.buscar(q, filtrados)
+        if resultados is None:
+            # Base sin índice de texto: búsqueda simple
+            products = self.get_queryset().filter(name__icontains=q)
+            return self.paginated_products(products)
+
+        # El índice cuenta el total y devuelve solo los ids de la página, por relevancia
+        page = self.paginate_queryset(resultados)
+        productos = self.get_queryset().in_bulk(page)
+        serializer = self.get_serializer([productos[pk] for pk in page if pk in productos], many=True)
+        return self.get_paginated_response(self.serializar(serializer))
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, JSONRenderer])
+    def export(self, request):
+        """
+        Catálogo completo para feeds y espejos, generado de a lotes sin armarlo en memoria.
+        NDJSON por defecto; con Accept: application/json (o ?format=json) un array JSON.
+        ?since=<ISO 8601> exporta solo lo modificado después; el header X-Export-Hasta
+        es el ?since= de la próxima exportación incremental. Acepta ?fields= y ?expand=.
+        """
+        # Corte fijo: lo que cambie mientras se exporta entra en la próxima exportación
+        hasta = timezone.now()
+        productos = productos_exportables(request, hasta)
+        serializer = ProductSerializer(context=self.get_serializer_context())
+        filas = (fila_exportada(serializer, producto)
+                 for producto in productos.iterator(chunk_size=self.export_chunk_size))
+
+        response = StreamingHttpResponse(
+            envolver_exportacion(filas, request.accepted_renderer.format),
+            content_type=request.accepted_renderer.media_type + '; charset=utf-8',
         )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        response['X-Export-Hasta'] = hasta.isoformat()
+        return response
+
+
+# -----------------------------
+# /export/ (compartido con la versión async, ver async_views.py)
+# -----------------------------
+def productos_exportables(request, hasta):
+    """Productos modificados hasta el corte (y después de ?since=), con lo que usa ProductSerializer"""
+    productos = Product.objects.for_serializer(ProductSerializer, request).filter(actualizado_en__lte=hasta)
+    since = request.query_params.get('since')
+    if since:
+        productos = productos.filter(actualizado_en__gt=parse_since(since))
+    return productos.order_by('actualizado_en', 'id')
+
+
+def fila_exportada(serializer, producto):
+    return json.dumps(serializer.to_representation(producto), cls=JSONEncoder, ensure_ascii=False)
+
+
+def envolver_exportacion(filas, formato):
+    """NDJSON (una fila por línea) o un array JSON escrito de a una fila"""
+    if formato == 'ndjson':
+        for fila in filas:
+            yield fila + '\n'
+        return
+    separador = '['
+    for fila in filas:
+        yield separador + fila
+        separador = ',\n'
+    yield ']' if separador == ',\n' else '[]'
+
 
 # ViewSet para categorías
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(
+    ConditionalGetMixin, CachedResponseMixin, LecturaEnReplicaMixin, PaginatedActionsMixin,
+    SerializacionMedidaMixin, viewsets.ModelViewSet,
+):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_actions = conditional_actions = ['list', 'retrieve', 'products', 'with_products']
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=ProductCursorPagination)
     def products(self, request, pk=None):
         category = self.get_object()
-        products = category.products.all().prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
-        )
-        serializer = ProductSerializer(products, many=True)  # Usar ProductSerializer aquí también
-        return Response(serializer.data)
+        products = category.products.for_serializer(ProductListSerializer, request)
+        return self.paginated_products(products)
 
     @action(detail=False, methods=['get'])
     def with_products(self, request):
         """Categorías que tienen productos"""
         categories = Category.objects.filter(products__isnull=False).distinct()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(categories)
 
 # ViewSet para materiales
-class MaterialViewSet(viewsets.ModelViewSet):
+class MaterialViewSet(
+    ConditionalGetMixin, CachedResponseMixin, LecturaEnReplicaMixin, PaginatedActionsMixin,
+    SerializacionMedidaMixin, viewsets.ModelViewSet,
+):
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
+    cache_actions = conditional_actions = ['list', 'retrieve', 'products', 'used_in_products']
 
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], pagination_class=ProductCursorPagination)
     def products(self, request, pk=None):
         material = self.get_object()
-        products = material.get_products.all().prefetch_related(
-            Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
-        )
-        serializer = ProductSerializer(products, many=True)  # Usar ProductSerializer aquí también
-        return Response(serializer.data)
+        products = material.get_products.for_serializer(ProductListSerializer, request)
+        return self.paginated_products(products)
 
     @action(detail=False, methods=['get'])
     def used_in_products(self, request):
         """Materiales que están siendo usados en productos"""
         materials = Material.objects.filter(get_products__isnull=False).distinct()
-        serializer = MaterialSerializer(materials, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return self.paginated_response(materials)
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Aciertos/fallos del cache de respuestas del catálogo"""
+    return Response(estadisticas())
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def stock_bulk(request):
+    """
+    Stock del depósito en lote: {"batch_id": "...", "items": [{"product_id": 1, "talle": "M", "stock": 5}, ...]}
+    Cada item lleva talle/talle_id o color/color_id y stock (absoluto) o delta (ver stock_masivo.py).
+    Reenviar un batch_id ya aplicado devuelve el mismo resultado con "repetido": true.
+    """
+    datos = request.data if isinstance(request.data, dict) else {}
+    batch_id = str(datos.get('batch_id') or '').strip()
+    items = datos.get('items')
+    errores = {}
+    if not batch_id or len(batch_id) > 100:
+        errores['batch_id'] = 'Obligatorio, de hasta 100 caracteres'
+    if not isinstance(items, list) or not items:
+        errores['items'] = 'Debe ser una lista no vacía'
+    elif len(items) > MAX_FILAS:
+        errores['items'] = f'Máximo {MAX_FILAS} filas por lote'
+    if errores:
+        raise ValidationError(errores)
+
+    resultado, repetido = aplicar_lote(batch_id, items)
+    return Response({**resultado, 'repetido': repetido})
@@ -0,0 +1,25 @@
+from django.contrib import admin
+from .models import VentaDiaria, VentaProductoDiaria
+
+
+class SoloLecturaAdmin(admin.ModelAdmin):
+    """Los rollups se escriben solos (señales / reconstruir_reportes)"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(SoloLecturaAdmin):
+    list_display = ['fecha', 'pedidos', 'unidades', 'ingresos', 'costo']
+    date_hierarchy = 'fecha'
+
+
+@admin.register(VentaProductoDiaria)
+class VentaProductoDiariaAdmin(SoloLecturaAdmin):
+    list_display = ['fecha', 'producto_nombre', 'talle_nombre', 'color_nombre', 'unidades', 'ingresos']
+    list_filter = ['categoria']
+    date_hierarchy = 'fecha'
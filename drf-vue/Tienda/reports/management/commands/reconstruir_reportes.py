@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from reports.rollups import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye las tablas de resumen de los reportes (ventas por día y por producto) '
+        'a partir de las líneas de los pedidos completados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        dias, productos = reconstruir(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{dias} días y {productos} filas por producto reconstruidas'))
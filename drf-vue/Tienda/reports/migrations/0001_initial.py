@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+
+
+def construir_rollups(apps, schema_editor):
+    # Los pedidos completados antes de existir los reportes. Copia de
+    # reports.rollups.reconstruir en este momento: no depende de cómo cambie después
+    OrderLine = apps.get_model('order', 'OrderLine')
+    VentaDiaria = apps.get_model('reports', 'VentaDiaria')
+    VentaProductoDiaria = apps.get_model('reports', 'VentaProductoDiaria')
+    lineas = OrderLine.objects.filter(pedido__completado=True).annotate(fecha=TruncDate('creado_en'))
+    totales = dict(
+        unidades=Sum('cantidad'),
+        ingresos=Sum('subtotal'),
+        costo=Sum(F('costo_unitario') * F('cantidad'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    )
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(**fila)
+        for fila in lineas.values('fecha').annotate(pedidos=Count('pedido', distinct=True), **totales).order_by('fecha')
+    ], batch_size=1000)
+    VentaProductoDiaria.objects.bulk_create([
+        VentaProductoDiaria(
+            fecha=fila['fecha'], producto_id=fila['producto'], producto_nombre=fila['nombre'],
+            categoria_id=fila['categoria_id'], talle_nombre=fila['talle_nombre'], color_nombre=fila['color_nombre'],
+            unidades=fila['unidades'], ingresos=fila['ingresos'], costo=fila['costo'],
+        )
+        for fila in lineas.values('fecha', 'producto', 'talle_nombre', 'color_nombre').annotate(
+            nombre=Max('producto_nombre'), categoria_id=Max('producto__category'), **totales
+        ).order_by('fecha', 'producto')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('order', '0004_costo_unitario'),
+        ('products', '0009_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('pedidos', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venta diaria',
+                'verbose_name_plural': 'Ventas diarias',
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaProductoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('producto_nombre', models.CharField(max_length=255)),
+                ('talle_nombre', models.CharField(blank=True, max_length=255)),
+                ('color_nombre', models.CharField(blank=True, max_length=255)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.category')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por producto',
+                'verbose_name_plural': 'Ventas diarias por producto',
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='ventaproducto_producto_idx'), models.Index(fields=['categoria', 'fecha'], name='ventaproducto_categoria_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'talle_nombre', 'color_nombre'), name='ventaproducto_clave_unica')],
+            },
+        ),
+        migrations.RunPython(construir_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:59
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+CLAVE = ('fecha', 'producto_nombre', 'talle_nombre', 'color_nombre')
+
+
+def unir_filas_repetidas(apps, schema_editor):
+    # Filas con la misma clave nueva (productos borrados o con el mismo nombre): se suman en una
+    VentaProductoDiaria = apps.get_model('reports', 'VentaProductoDiaria')
+    repetidas = VentaProductoDiaria.objects.values(*CLAVE).annotate(
+        filas=Count('id'), primera=Min('id'), id_producto=Max('producto'), id_categoria=Max('categoria'),
+        total_unidades=Sum('unidades'), total_ingresos=Sum('ingresos'), total_costo=Sum('costo'),
+    ).filter(filas__gt=1).order_by()
+    for fila in repetidas:
+        VentaProductoDiaria.objects.filter(**{campo: fila[campo] for campo in CLAVE}).exclude(
+            pk=fila['primera']
+        ).delete()
+        VentaProductoDiaria.objects.filter(pk=fila['primera']).update(
+            producto_id=fila['id_producto'], categoria_id=fila['id_categoria'], unidades=fila['total_unidades'],
+            ingresos=fila['total_ingresos'], costo=fila['total_costo'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ventaproductodiaria',
+            name='ventaproducto_clave_unica',
+        ),
+        migrations.RunPython(unir_filas_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ventaproductodiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto_nombre', 'talle_nombre', 'color_nombre'), name='ventaproducto_clave_unica'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+"""
+Tablas de resumen (rollups) para los reportes.
+
+Se actualizan de a un pedido cuando se marca completado (ver rollups.py) y se
+pueden reconstruir con el comando reconstruir_reportes. Los reportes leen solo
+estas tablas, sin recorrer Order -> Cart -> CartItem -> Product.
+"""
+from django.db import models
+
+
+class VentaDiaria(models.Model):
+    """Totales de los pedidos completados por día (fecha de creación del pedido)"""
+    fecha = models.DateField(unique=True)
+    pedidos = models.IntegerField(default=0)
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venta diaria'
+        verbose_name_plural = 'Ventas diarias'
+
+    def __str__(self):
+        return f'{self.fecha}: {self.ingresos}'
+
+
+class VentaProductoDiaria(models.Model):
+    """Unidades e ingresos por día, producto, talle y color"""
+    fecha = models.DateField()
+    producto = models.ForeignKey('products.Product', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    producto_nombre = models.CharField(max_length=255)
+    categoria = models.ForeignKey('products.Category', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    talle_nombre = models.CharField(max_length=255, blank=True)
+    color_nombre = models.CharField(max_length=255, blank=True)
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venta diaria por producto'
+        verbose_name_plural = 'Ventas diarias por producto'
+        constraints = [
+            # Con el nombre congelado y no con producto, que queda en NULL si se borra el producto
+            models.UniqueConstraint(
+                fields=['fecha', 'producto_nombre', 'talle_nombre', 'color_nombre'], name='ventaproducto_clave_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='ventaproducto_producto_idx'),
+            models.Index(fields=['categoria', 'fecha'], name='ventaproducto_categoria_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.fecha} {self.producto_nombre}: {self.unidades}'
@@ -0,0 +1,131 @@
+"""
+Mantenimiento de las tablas de resumen.
+
+Un pedido suma a los rollups cuando pasa a completado y resta si deja de
+estarlo o se borra. Los cambios por queryset.update() no disparan señales:
+para esos casos (o para corregir diferencias) está reconstruir_reportes.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import pre_save, post_save, pre_delete
+
+from cart.models import MONTO
+from order.models import Order, OrderLine
+from .models import VentaDiaria, VentaProductoDiaria
+
+TOTALES_DIARIOS = ('pedidos', 'unidades', 'ingresos', 'costo')
+TOTALES_PRODUCTO = ('unidades', 'ingresos', 'costo')
+
+
+def _totales():
+    return dict(
+        unidades=Sum('cantidad'),
+        ingresos=Sum('subtotal'),
+        costo=Sum(F('costo_unitario') * F('cantidad'), output_field=MONTO),
+    )
+
+
+def por_dia(lineas):
+    """Líneas agrupadas por día: filas de VentaDiaria"""
+    return lineas.annotate(fecha=TruncDate('creado_en')).values('fecha').annotate(
+        pedidos=Count('pedido', distinct=True), **_totales()
+    ).order_by('fecha')
+
+
+def por_producto(lineas):
+    """Líneas agrupadas por día, producto (nombre congelado), talle y color: filas de VentaProductoDiaria"""
+    return lineas.annotate(fecha=TruncDate('creado_en')).values(
+        'fecha', 'producto_nombre', 'talle_nombre', 'color_nombre'
+    ).annotate(
+        id_producto=Max('producto'), categoria_id=Max('producto__category'), **_totales()
+    ).order_by('fecha', 'producto_nombre')
+
+
+def _sumar(modelo, clave, deltas, datos=None):
+    """UPDATE ... SET x = x + delta; si la fila no existe, se crea"""
+    incrementos = {campo: F(campo) + valor for campo, valor in deltas.items()}
+    if modelo.objects.filter(**clave).update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**clave, **deltas, **(datos or {}))
+    except IntegrityError:
+        # Otro pedido del mismo día creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**clave).update(**incrementos)
+
+
+def registrar_pedidos(pedidos, signo=1):
+    """Suma (signo=1) o resta (signo=-1) las líneas de los pedidos a los rollups"""
+    lineas = OrderLine.objects.filter(pedido__in=pedidos)
+    with transaction.atomic():
+        for fila in por_dia(lineas):
+            _sumar(VentaDiaria, {'fecha': fila['fecha']}, {c: fila[c] * signo for c in TOTALES_DIARIOS})
+        for fila in por_producto(lineas):
+            _sumar(
+                VentaProductoDiaria,
+                {'fecha': fila['fecha'], 'producto_nombre': fila['producto_nombre'],
+                 'talle_nombre': fila['talle_nombre'], 'color_nombre': fila['color_nombre']},
+                {c: fila[c] * signo for c in TOTALES_PRODUCTO},
+                {'producto_id': fila['id_producto'], 'categoria_id': fila['categoria_id']},
+            )
+        if signo < 0:
+            VentaDiaria.objects.filter(pedidos__lte=0).delete()
+            VentaProductoDiaria.objects.filter(unidades__lte=0).delete()
+
+
+def reconstruir(lote=1000):
+    """Recalcula los rollups desde cero con las líneas de todos los pedidos completados"""
+    lineas = OrderLine.objects.filter(pedido__completado=True)
+    with transaction.atomic():
+        VentaDiaria.objects.all().delete()
+        VentaProductoDiaria.objects.all().delete()
+        dias = VentaDiaria.objects.bulk_create(
+            [VentaDiaria(**fila) for fila in por_dia(lineas)], batch_size=lote
+        )
+        productos = VentaProductoDiaria.objects.bulk_create([
+            VentaProductoDiaria(
+                fecha=fila['fecha'], producto_id=fila['id_producto'], producto_nombre=fila['producto_nombre'],
+                categoria_id=fila['categoria_id'], talle_nombre=fila['talle_nombre'],
+                color_nombre=fila['color_nombre'], **{c: fila[c] for c in TOTALES_PRODUCTO},
+            )
+            for fila in por_producto(lineas)
+        ], batch_size=lote)
+    return len(dias), len(productos)
+
+
+# -----------------------------
+# Señales de Order
+# -----------------------------
+def _recordar_estado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._completado_anterior = bool(instance.pk) and Order.objects.filter(
+        pk=instance.pk, completado=True
+    ).exists()
+
+
+def _pedido_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_completado_anterior', False)
+    if instance.completado == anterior:
+        return
+    pedidos = Order.objects.filter(pk=instance.pk)
+    if instance.completado:
+        # Un pedido cargado a mano (sin pasar por el checkout) se congela al completarlo
+        pedidos.congelar()
+    registrar_pedidos(pedidos, 1 if instance.completado else -1)
+
+
+def _pedido_borrado(sender, instance, **kwargs):
+    # pre_delete: las líneas todavía existen. El estado se lee de la base por si la instancia está vieja
+    pedidos = Order.objects.filter(pk=instance.pk)
+    if pedidos.filter(completado=True).exists():
+        registrar_pedidos(pedidos, -1)
+
+
+def conectar_senales():
+    pre_save.connect(_recordar_estado, sender=Order, dispatch_uid='reportes-estado')
+    post_save.connect(_pedido_guardado, sender=Order, dispatch_uid='reportes-guardado')
+    pre_delete.connect(_pedido_borrado, sender=Order, dispatch_uid='reportes-borrado')
@@ -0,0 +1,184 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from order.models import Order
+from products.models import Category, Color, Material, Product, ProductoColor, ProductoTalle, Talle
+from .models import VentaDiaria, VentaProductoDiaria
+
+
+class ReportesTestMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        self.m, self.l = Talle.objects.create(name='M'), Talle.objects.create(name='L')
+        self.negro = Color.objects.create(name='Negro')
+        self.remeras = Category.objects.create(name='Remeras')
+        self.buzos = Category.objects.create(name='Buzos')
+        material = Material.objects.create(name='Algodón')
+        self.remera = self.crear_producto('Remera', self.remeras, material, price=1000, price_cost=400)
+        self.buzo = self.crear_producto('Buzo', self.buzos, material, price=3000, price_cost=2000, sale_price=2500)
+
+    def crear_producto(self, nombre, categoria, material, **precios):
+        producto = Product.objects.create(name=nombre, category=categoria, material=material, **precios)
+        for talle in (self.m, self.l):
+            ProductoTalle.objects.create(producto=producto, talle=talle, stock=10)
+        ProductoColor.objects.create(producto=producto, color=self.negro, stock=100)
+        return producto
+
+    def comprar(self, *lineas, completar=True, hace_dias=0):
+        carrito = Cart.objects.create()
+        carrito.items.set([
+            CartItem.objects.create(product=producto, talle=talle, color=self.negro, quantity=cantidad)
+            for producto, talle, cantidad in lineas
+        ])
+        response = self.client.post('/api/orders/', {
+            'cliente_nombre': 'Cliente', 'metodo_envio': 'olmos',
+            'metodo_pago': 'efectivo', 'carrito_id': carrito.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        pedido = Order.objects.get(pk=response.json()['id'])
+        if hace_dias:
+            creado_en = timezone.now() - timedelta(days=hace_dias)
+            Order.objects.filter(pk=pedido.pk).update(creado_en=creado_en)
+            pedido.lineas.update(creado_en=creado_en)
+        if completar:
+            self.completar(pedido)
+        return pedido
+
+    def completar(self, pedido, completado=True):
+        response = self.client.patch(f'/api/orders/{pedido.pk}/', {'completado': completado}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def rollups(self):
+        return (
+            sorted(VentaDiaria.objects.values_list('fecha', 'pedidos', 'unidades', 'ingresos', 'costo')),
+            sorted(VentaProductoDiaria.objects.values_list(
+                'fecha', 'producto', 'categoria', 'talle_nombre', 'color_nombre', 'unidades', 'ingresos', 'costo'
+            )),
+        )
+
+
+class RollupsTest(ReportesTestMixin, TestCase):
+    def test_solo_cuentan_los_completados(self):
+        self.comprar((self.remera, self.m, 2), completar=False)
+        self.assertFalse(VentaDiaria.objects.exists())
+
+        self.comprar((self.remera, self.m, 2), (self.buzo, self.l, 1))
+        dia = VentaDiaria.objects.get()
+        self.assertEqual(
+            (dia.pedidos, dia.unidades, dia.ingresos, dia.costo),
+            (1, 3, Decimal('4500.00'), Decimal('2800.00')),
+        )
+
+    def test_incremental_igual_a_reconstruir(self):
+        self.comprar((self.remera, self.m, 2), hace_dias=8)
+        self.comprar((self.remera, self.m, 1), (self.remera, self.l, 1), hace_dias=8)
+        self.comprar((self.buzo, self.l, 3))
+        pendiente = self.comprar((self.buzo, self.m, 1), completar=False)
+        self.completar(pendiente)
+        incremental = self.rollups()
+
+        call_command('reconstruir_reportes', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_descompletar_y_borrar_restan(self):
+        pedido = self.comprar((self.remera, self.m, 2))
+        otro = self.comprar((self.buzo, self.m, 1))
+        self.completar(pedido, completado=False)
+        self.assertEqual(VentaDiaria.objects.get().pedidos, 1)
+        self.assertFalse(VentaProductoDiaria.objects.filter(producto=self.remera).exists())
+
+        otro.delete()
+        self.assertFalse(VentaDiaria.objects.exists())
+        self.assertFalse(VentaProductoDiaria.objects.exists())
+
+    def test_productos_borrados_no_comparten_fila(self):
+        pedido = self.comprar((self.remera, self.m, 2))
+        self.comprar((self.buzo, self.m, 1))
+        self.remera.delete()
+        self.buzo.delete()
+        # Las dos filas quedan con producto NULL: restar una no toca la otra
+        self.completar(pedido, completado=False)
+        self.assertEqual(
+            list(VentaProductoDiaria.objects.values_list('producto', 'producto_nombre', 'unidades')), [(None, 'Buzo', 1)]
+        )
+
+    def test_cambio_de_precio_no_altera_reportes(self):
+        self.comprar((self.remera, self.m, 1))
+        Product.objects.filter(pk=self.remera.pk).update(price=9999, price_cost=1)
+        call_command('reconstruir_reportes', stdout=StringIO())
+        self.assertEqual(VentaDiaria.objects.get().ingresos, Decimal('1000.00'))
+
+
+class ReportesApiTest(ReportesTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.comprar((self.remera, self.m, 2), (self.buzo, self.l, 1), hace_dias=8)
+        self.comprar((self.remera, self.l, 4))
+
+    def test_requiere_staff(self):
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/reports/revenue/').status_code, (401, 403))
+
+    def test_indice(self):
+        data = self.client.get('/api/reports/').json()
+        self.assertEqual(set(data), {'revenue', 'units', 'margin', 'sell-through', 'low-stock'})
+
+    def test_ingresos_por_dia_y_semana(self):
+        hoy = timezone.localdate()
+        por_dia = self.client.get('/api/reports/revenue/').json()
+        self.assertEqual([fila['ingresos'] for fila in por_dia], ['4500.00', '4000.00'])
+        self.assertEqual(por_dia[-1]['periodo'], hoy.isoformat())
+
+        solo_hoy = self.client.get(f'/api/reports/revenue/?desde={hoy.isoformat()}').json()
+        self.assertEqual(len(solo_hoy), 1)
+
+        por_semana = self.client.get('/api/reports/revenue/?period=week').json()
+        self.assertEqual(sum(Decimal(fila['ingresos']) for fila in por_semana), Decimal('8500.00'))
+        self.assertEqual(self.client.get('/api/reports/revenue/?period=mes').status_code, 400)
+
+    def test_unidades(self):
+        productos = self.client.get('/api/reports/units/').json()
+        self.assertEqual(productos[0], {'id': self.remera.pk, 'nombre': 'Remera', 'unidades': 6, 'ingresos': '6000.00'})
+        talles = self.client.get('/api/reports/units/?by=talle').json()
+        self.assertEqual([(t['nombre'], t['unidades']) for t in talles], [('L', 5), ('M', 2)])
+        self.assertEqual(self.client.get('/api/reports/units/?by=precio').status_code, 400)
+
+    def test_margen_por_categoria(self):
+        data = self.client.get('/api/reports/margin/').json()
+        remeras = next(fila for fila in data if fila['nombre'] == 'Remeras')
+        self.assertEqual((remeras['ingresos'], remeras['costo'], remeras['margen']), ('6000.00', '2400.00', '3600.00'))
+        self.assertEqual(remeras['margen_porcentaje'], 60.0)
+
+    def test_sell_through_y_stock_bajo(self):
+        data = self.client.get('/api/reports/sell-through/').json()
+        remera = next(fila for fila in data if fila['id'] == self.remera.pk)
+        # 6 vendidas, quedan 20 - 6 = 14
+        self.assertEqual((remera['vendidos'], remera['stock'], remera['sell_through']), (6, 14, 0.3))
+
+        ProductoTalle.objects.filter(producto=self.buzo).update(stock=1)
+        bajo = self.client.get('/api/reports/low-stock/').json()
+        self.assertEqual([(p['name'], p['total_stock']) for p in bajo], [('Buzo', 2)])
+
+    def test_no_leen_pedidos_ni_carritos(self):
+        urls = [
+            '/api/reports/revenue/', '/api/reports/revenue/?period=week', '/api/reports/units/?by=color',
+            '/api/reports/margin/', '/api/reports/sell-through/', '/api/reports/low-stock/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+                self.assertNotIn('"order_', sql)
+                self.assertNotIn('"cart_', sql)
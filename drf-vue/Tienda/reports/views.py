@@ -0,0 +1,159 @@
+"""
+Reportes de ventas e inventario: /api/reports/...
+
+Todos leen las tablas de resumen (models.py) y, para el stock, la columna
+desnormalizada Product.total_stock. Filtros de fecha: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD
+"""
+from datetime import timedelta
+
+from django.db.models import FloatField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from products.models import Product
+from .models import VentaDiaria, VentaProductoDiaria
+
+LIMITE_POR_DEFECTO = 50
+UMBRAL_STOCK_BAJO = 3
+DIAS_VENTAS_RECIENTES = 30
+
+# ?by= -> columna de VentaProductoDiaria por la que se agrupa
+AGRUPAR_UNIDADES = {'product': 'producto', 'talle': 'talle_nombre', 'color': 'color_nombre'}
+
+
+def _monto(valor):
+    # Mismo formato que los precios de la API ("1000.00")
+    return f'{valor or 0:.2f}'
+
+
+def _entero(params, nombre, defecto):
+    try:
+        valor = int(params.get(nombre, defecto))
+    except (TypeError, ValueError):
+        raise ValidationError({nombre: 'Debe ser un número entero'})
+    if valor < 0:
+        raise ValidationError({nombre: 'No puede ser negativo'})
+    return valor
+
+
+def _rango(params, queryset):
+    for nombre, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+        valor = params.get(nombre)
+        if not valor:
+            continue
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValidationError({nombre: 'Fecha inválida, usar AAAA-MM-DD'})
+        queryset = queryset.filter(**{lookup: fecha})
+    return queryset
+
+
+class ReportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        nombres = ['revenue', 'units', 'margin', 'sell-through', 'low-stock']
+        return Response({nombre: reverse(f'reports-{nombre}', request=request) for nombre in nombres})
+
+    @action(detail=False)
+    def revenue(self, request):
+        """Ingresos por día o por semana (?period=day|week)"""
+        periodo = request.query_params.get('period', 'day')
+        if periodo not in ('day', 'week'):
+            raise ValidationError({'period': 'Valores posibles: day, week'})
+        dias = _rango(request.query_params, VentaDiaria.objects.all())
+        if periodo == 'week':
+            dias = dias.annotate(semana=TruncWeek('fecha'))
+        campo = 'semana' if periodo == 'week' else 'fecha'
+
+        filas = dias.values(campo).annotate(
+            total_pedidos=Sum('pedidos'), total_unidades=Sum('unidades'),
+            total_ingresos=Sum('ingresos'), total_costo=Sum('costo'),
+        ).order_by(campo)
+        return Response([
+            {
+                'periodo': fila[campo], 'pedidos': fila['total_pedidos'], 'unidades': fila['total_unidades'],
+                'ingresos': _monto(fila['total_ingresos']), 'costo': _monto(fila['total_costo']),
+            }
+            for fila in filas
+        ])
+
+    @action(detail=False)
+    def units(self, request):
+        """Unidades vendidas por producto, talle o color (?by=product|talle|color), de mayor a menor"""
+        agrupar = request.query_params.get('by', 'product')
+        if agrupar not in AGRUPAR_UNIDADES:
+            raise ValidationError({'by': f'Valores posibles: {", ".join(AGRUPAR_UNIDADES)}'})
+        campo = AGRUPAR_UNIDADES[agrupar]
+        limite = _entero(request.query_params, 'limit', LIMITE_POR_DEFECTO)
+
+        filas = _rango(request.query_params, VentaProductoDiaria.objects.all()).values(campo).annotate(
+            nombre=Max('producto_nombre'), total_unidades=Sum('unidades'), total_ingresos=Sum('ingresos'),
+        ).order_by('-total_unidades', campo)[:limite]
+        resultado = []
+        for fila in filas:
+            if agrupar == 'product':
+                clave = {'id': fila[campo], 'nombre': fila['nombre']}
+            else:
+                clave = {'nombre': fila[campo]}
+            resultado.append({**clave, 'unidades': fila['total_unidades'], 'ingresos': _monto(fila['total_ingresos'])})
+        return Response(resultado)
+
+    @action(detail=False)
+    def margin(self, request):
+        """Ingresos, costo (price_cost al momento de la venta) y margen por categoría"""
+        filas = _rango(request.query_params, VentaProductoDiaria.objects.all()).values(
+            'categoria', 'categoria__name'
+        ).annotate(
+            total_ingresos=Sum('ingresos'), total_costo=Sum('costo'),
+        ).order_by('-total_ingresos')
+        resultado = []
+        for fila in filas:
+            ingresos, costo = fila['total_ingresos'] or 0, fila['total_costo'] or 0
+            resultado.append({
+                'categoria': fila['categoria'], 'nombre': fila['categoria__name'],
+                'ingresos': _monto(ingresos), 'costo': _monto(costo), 'margen': _monto(ingresos - costo),
+                'margen_porcentaje': round(float((ingresos - costo) / ingresos * 100), 2) if ingresos else None,
+            })
+        return Response(resultado)
+
+    @action(detail=False, url_path='sell-through', url_name='sell-through')
+    def sell_through(self, request):
+        """Vendido / (vendido + stock actual) por producto, de mayor a menor"""
+        limite = _entero(request.query_params, 'limit', LIMITE_POR_DEFECTO)
+        vendidos, stock = Sum('unidades'), Max('producto__total_stock')
+        filas = _rango(request.query_params, VentaProductoDiaria.objects.exclude(producto=None)).values(
+            'producto'
+        ).annotate(
+            nombre=Max('producto__name'), total_vendidos=vendidos, stock=stock,
+            tasa=Cast(vendidos, FloatField()) / (vendidos + stock),
+        ).filter(total_vendidos__gt=0).order_by('-tasa', 'producto')[:limite]
+        return Response([
+            {
+                'id': fila['producto'], 'nombre': fila['nombre'], 'vendidos': fila['total_vendidos'],
+                'stock': fila['stock'], 'sell_through': round(fila['tasa'], 4),
+            }
+            for fila in filas
+        ])
+
+    @action(detail=False, url_path='low-stock', url_name='low-stock')
+    def low_stock(self, request):
+        """Productos con total_stock <= ?umbral= (3), con lo vendido en los últimos 30 días"""
+        umbral = _entero(request.query_params, 'umbral', UMBRAL_STOCK_BAJO)
+        limite = _entero(request.query_params, 'limit', LIMITE_POR_DEFECTO)
+        desde = timezone.localdate() - timedelta(days=DIAS_VENTAS_RECIENTES)
+        recientes = VentaProductoDiaria.objects.filter(
+            producto=OuterRef('pk'), fecha__gte=desde
+        ).order_by().values('producto').annotate(total=Sum('unidades')).values('total')
+
+        productos = Product.objects.filter(total_stock__lte=umbral).annotate(
+            vendidos_recientes=Coalesce(Subquery(recientes), Value(0))
+        ).order_by('total_stock', 'name').values('id', 'name', 'total_stock', 'etiqueta', 'vendidos_recientes')
+        return Response(list(productos[:limite]))